@@ -1,18 +1,72 @@
-from urllib.parse import urljoin, urlparse
-from bs4 import BeautifulSoup
 from colorama import Fore, Style
-from utils import fetch_page_content, check_link_status, normalize_url, get_base_domain
+from utils import fetch_page_content, fetch_page_if_modified, check_link_status, check_links_status, normalize_url, \
+	get_base_domain, get_hostname, fetch_robots_txt, get_host_scheduler, get_timeout_policy, get_redirect_chain, \
+	get_redirect_cache_stats, USER_AGENT, DEFAULT_CONCURRENCY
+from redirects import REDIRECT_ERROR_MESSAGES
+from cache import LinkStatusCache, StylesheetCache
+from extractor import extract_page_urls, extract_and_normalize_links, extract_css_urls, DEFAULT_EXTRACTOR_BACKEND
+from checkpoint import save_checkpoint, DEFAULT_CHECKPOINT_INTERVAL
+from crawl_state import CrawlState
+from sitemap import get_sitemap_urls, iter_sitemap_page_urls
+from metrics import get_metrics
+import logging
 import time
 import signal
+import functools
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# Default number of pages fetched at the same time during a deep crawl
+DEFAULT_PAGE_WORKERS = 4
+
+# Seconds the final pass over links with connection errors may take when the crawl budget is spent
+RETRY_PASS_GRACE = 10
+
+logger = logging.getLogger(__name__)
+
+
+def _fetch_stylesheet_urls(url: str, deadline: float | None = None) -> list:
+	css = fetch_page_content(url, deadline)
+	return extract_css_urls(css, url) if css else []
+
+
+def _expand_assets(assets: list, stylesheet_cache: StylesheetCache, deadline: float | None = None) -> list:
+	"""
+	Returns the URLs of a page's assets ((URL, is stylesheet) pairs), each stylesheet followed
+	by the URLs it references. Stylesheets are fetched once per `stylesheet_cache`, giving up
+	at `deadline` like the pages.
+	"""
+	fetch_stylesheet_urls = functools.partial(_fetch_stylesheet_urls, deadline=deadline)
+	asset_urls = []
+	for asset_url, is_stylesheet in assets:
+		asset_urls.append(asset_url)
+		if is_stylesheet:
+			asset_urls.extend(stylesheet_cache.get_urls(asset_url, fetch_stylesheet_urls))
+	return asset_urls
+
+
+def _get_status_message(status_code: int, redirect_chain: dict | None) -> str:
+	# Status message of a broken link; redirect loops and overlong chains end with status code 0 too
+	if status_code >= 400:
+		return "Broken"
+	if redirect_chain is not None and "error" in redirect_chain:
+		return REDIRECT_ERROR_MESSAGES[redirect_chain["error"]]
+	return "Connection Error"
 
 
 # --- Single-page audit function ---
-def check_broken_links(url: str, output_format: str = 'text'):
+def check_broken_links(url: str, output_format: str = 'text', concurrency: int = DEFAULT_CONCURRENCY,
+					   persistent_cache=None, extractor_backend: str = DEFAULT_EXTRACTOR_BACKEND, status_cache=None,
+					   asset_attributes: dict | None = None):
 	"""
 	Finds broken (internal and external) links on a specified URL.
+	Links are checked concurrently, limited by `concurrency` and the per-host scheduler.
+	Statuses still valid in `persistent_cache` (see cache.PersistentStatusCache) are reused.
+	A `status_cache` (cache.LinkStatusCache) shared with other audits replaces the per-call one.
+	With `asset_attributes` (see extractor.DEFAULT_ASSET_ATTRIBUTES), the page's assets and the
+	url() references of its stylesheets are checked too, and reported with "asset": true.
+	The redirect chains of the links checked in this process are reported in "redirect_chains".
 	Returns results as a list of dictionaries for JSON output, or prints text output.
 	"""
-	links = []
 	broken_links_results = []
 
 	if output_format == 'text':
@@ -31,38 +85,43 @@ def check_broken_links(url: str, output_format: str = 'text'):
 			}
 		return None
 
-	soup = BeautifulSoup(content, 'html.parser')
-
-	for a_tag in soup.find_all('a', href=True):
-		href = a_tag['href']
-		if href.startswith('http://') or href.startswith('https://'):
-			full_url = href
-		else:
-			try:
-				full_url = urljoin(url, href)
-				if not full_url.startswith(('http://', 'https://')):
-					continue
-			except ValueError:
-				continue
-		links.append(full_url)
-
-	checked_urls_for_status = set()
-
-	for link in links:
-		if link in checked_urls_for_status:
-			continue
-		checked_urls_for_status.add(link)
-
-		status_code = check_link_status(link)
+	links, assets = extract_page_urls(content, url, extractor_backend, asset_attributes)
+	asset_urls = _expand_assets(assets, StylesheetCache())
+
+	# Each unique link is checked once; results are reported in page order.
+	unique_links = list(dict.fromkeys(links))
+	# Assets that are also links of the page are reported as links
+	unique_link_set = set(unique_links)
+	unique_assets = [asset_url for asset_url in dict.fromkeys(asset_urls) if asset_url not in unique_link_set]
+	if status_cache is None:
+		status_cache = LinkStatusCache(persistent_cache)
+	link_statuses = check_links_status(unique_links + unique_assets, concurrency=concurrency,
+									   status_cache=status_cache)
+
+	redirect_chains = []
+	for link_index, link in enumerate(unique_links + unique_assets):
+		status_code = link_statuses[link]
+		is_asset = link_index >= len(unique_links)
+		link_label = "asset" if is_asset else "link"
+
+		redirect_chain = get_redirect_chain(link)
+		if redirect_chain is not None:
+			redirect_chains.append({"link": link, **redirect_chain, "status_code": status_code})
+			if output_format == 'text':
+				print(f"  {Fore.YELLOW}Redirected {link_label}: {' -> '.join(hop['url'] for hop in redirect_chain['hops'])}"
+					  f" -> {redirect_chain['final_url']}{Style.RESET_ALL}")
 
 		if status_code >= 400 or status_code == 0:
-			broken_links_results.append({
+			broken_link_info = {
 				"link": link,
 				"status_code": status_code,
-				"status_message": "Broken" if status_code >= 400 else "Connection Error"
-			})
+				"status_message": _get_status_message(status_code, redirect_chain)
+			}
+			if is_asset:
+				broken_link_info["asset"] = True
+			broken_links_results.append(broken_link_info)
 			if output_format == 'text':
-				print(f"  {Fore.RED}Broken link found: {link} (Code: {status_code}){Style.RESET_ALL}")
+				print(f"  {Fore.RED}Broken {link_label} found: {link} (Code: {status_code}){Style.RESET_ALL}")
 		else:
 			if output_format == 'text':
 				print(f"  {Fore.GREEN}OK: {link} (Code: {status_code}){Style.RESET_ALL}")
@@ -71,19 +130,24 @@ def check_broken_links(url: str, output_format: str = 'text'):
 		if broken_links_results:
 			print(f"\n{Fore.YELLOW}Summary: {len(broken_links_results)} broken links found:{Style.RESET_ALL}")
 			for bl in broken_links_results:
-				print(f"- {bl['link']} (Code: {bl['status_code']})")
+				print(f"- {bl['link']} (Code: {bl['status_code']}){' [asset]' if bl.get('asset') else ''}")
 		else:
 			print(f"\n{Fore.GREEN}No broken links found. Excellent!{Style.RESET_ALL}")
 		return None
 
 	elif output_format == 'json':
-		return {
+		results = {
 			"audited_url": url,
 			"scan_type": "single_page",
 			"total_links_found": len(links),
 			"total_broken_links": len(broken_links_results),
-			"broken_links": broken_links_results
+			"broken_links": broken_links_results,
+			"total_redirect_hops": sum(len(redirect_chain["hops"]) for redirect_chain in redirect_chains),
+			"redirect_chains": redirect_chains
 		}
+		if asset_attributes:
+			results["total_assets_found"] = len(asset_urls)
+		return results
 
 
 # --- Global variable for soft stop control ---
@@ -100,18 +164,75 @@ def signal_handler(sig, frame):
 signal.signal(signal.SIGINT, signal_handler)
 
 
+def _init_parse_worker():
+	# Ctrl+C is handled by the crawling process; parsing processes just finish their current page
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
 # --- Deep site crawl function ---
 def crawl_site_for_broken_links(start_url: str, max_depth: int, max_pages: int, timeout: int,
-								output_format: str = 'json'):
+								output_format: str = 'json', concurrency: int = DEFAULT_CONCURRENCY,
+								page_workers: int = DEFAULT_PAGE_WORKERS,
+								persistent_cache=None, checkpoint_path: str | None = None,
+								checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL, resume_state: dict | None = None,
+								page_cache=None, extractor_backend: str = DEFAULT_EXTRACTOR_BACKEND, parse_workers: int = 0,
+								report_sinks: list | None = None, keep_results: bool = True,
+								seed_sitemaps: bool = False, respect_robots: bool = True, page_fetcher=None,
+								bloom_capacity: int | None = None, status_cache=None, asset_attributes: dict | None = None,
+								reset_stop: bool = True, replay: bool = False):
+	"""
+	Crawls a site from `start_url` and checks every link found on the crawled pages.
+	If `checkpoint_path` is given, the crawl state is saved there every `checkpoint_interval`
+	seconds and when the crawl stops. Passing a state loaded with checkpoint.load_checkpoint
+	as `resume_state` continues that crawl where it stopped.
+	If a `page_cache` (see cache.PageCache) is given, pages are requested conditionally and
+	the links stored from the previous run are reused for pages that have not changed.
+	If `parse_workers` is above 0, link extraction and normalization run in a pool of that
+	many processes, so parsing is not limited to one core.
+	Page records, broken links and the final totals are streamed to `report_sinks` (see
+	reports.py) as the crawl progresses. With `keep_results` set to False, the returned report
+	only contains the totals and memory use does not grow with the number of pages.
+	Requests are paced per host by the shared host scheduler (see scheduler.py), which also
+	honors the Crawl-delay of the site's robots.txt.
+	With `seed_sitemaps`, the frontier is filled up front with the internal pages listed in the
+	site's sitemaps (from robots.txt, or /sitemap.xml). With `respect_robots`, pages disallowed
+	by robots.txt are not crawled; links to them are still checked.
+	If a `page_fetcher` is given, it is asked for the (links, normalized links) of each page
+	before the page is fetched (see distributed.SharedCrawlStore.get_page_links); pages it
+	returns None for are fetched as usual.
+	With `replay`, pages only come from `page_fetcher`: pages it returns None for are skipped,
+	the crawl does not stop at the timeout, which only bounds the checks of links without a
+	status in `persistent_cache`, and there is no retry pass.
+	With `bloom_capacity`, visited pages are kept in a Bloom filter sized for that many pages
+	(see crawl_state.CrawlState) so memory stays flat on crawls of millions of URLs.
+	A `status_cache` (cache.LinkStatusCache) shared with other crawls replaces the crawl-scoped
+	one, so links common to several sites are checked once.
+	With `asset_attributes` (see extractor.DEFAULT_ASSET_ATTRIBUTES), the assets of each page and
+	the url() references of its stylesheets are checked along with its links, but never crawled.
+	Each stylesheet is fetched once per crawl, and assets shared by many pages are checked once.
+	The remaining `timeout` budget is spread over the pages queued so far (up to `max_pages`):
+	each page gets an equal share as the deadline of its link checks (see timeouts.TimeoutPolicy),
+	so slow hosts cannot use up the whole crawl. Page fetches are only cut short by the end of
+	the crawl, never by the share of their page. Links that failed with a connection error or timeout
+	are checked once more after the crawl, within what is left of the budget (at least
+	RETRY_PASS_GRACE seconds); results already streamed to `report_sinks` are not corrected.
+	The redirect chain of each redirected link is reported once, with the first page it was
+	found on, and pages count the redirect hops of their links in "redirect_hops_on_page".
+	Chains are only known for links checked in this process (not for statuses reused from
+	`persistent_cache` or checked by distributed workers).
+	The report's metrics cover everything recorded since the last metrics.get_metrics().reset().
+	Crawls running next to others (batch mode) pass `reset_stop` as False, so starting one does
+	not cancel a Ctrl+C meant for all of them.
+	"""
 	global STOP_CRAWL
-	STOP_CRAWL = False  # Reset stop flag for each new crawl run
+	if reset_stop:
+		STOP_CRAWL = False  # Reset stop flag for each new crawl run
 
 	# Normalize the starting URL and its domain
 	normalized_start_url = normalize_url(start_url)
-	print(f"DEBUG_NORM_START: Original: {start_url} -> Normalized Start: {normalized_start_url}")
+	logger.debug("Original start URL: %s -> Normalized: %s", start_url, normalized_start_url)
 	base_domain_of_start_url = get_base_domain(normalized_start_url)
-	print(
-		f"DEBUG_DOMAIN_START: Normalized Start URL: {normalized_start_url} -> Base Domain: {base_domain_of_start_url}")
+	logger.debug("Normalized start URL: %s -> Base domain: %s", normalized_start_url, base_domain_of_start_url)
 
 	if not base_domain_of_start_url:
 		print(
@@ -128,171 +249,405 @@ def crawl_site_for_broken_links(start_url: str, max_depth: int, max_pages: int,
 		}
 
 	# Data structures for crawling
-	queue = [(normalized_start_url, 0)]
-	visited_urls = {normalized_start_url}  # Initialize with normalized start_url as visited
-
-	all_broken_links_detailed = []
-	crawled_pages_summary = []
-	total_unique_links_checked = 0
+	if status_cache is None:
+		status_cache = LinkStatusCache(persistent_cache)  # Each unique link is checked once per crawl
+	stylesheet_cache = StylesheetCache()
 
-	THROTTLE_TIME = 0.1  # Reduced throttle time for faster crawling
+	if resume_state:
+		state = CrawlState.from_checkpoint(resume_state, normalize_url, report_sinks, keep_results, bloom_capacity)
+		status_cache.load(resume_state["link_statuses"])
+		print(
+			f"{Fore.MAGENTA}Resuming crawl: {state.pages_crawled} pages already crawled, {len(state.queue)} pages queued.{Style.RESET_ALL}")
+	else:
+		state = CrawlState(report_sinks, keep_results, bloom_capacity)
+		state.enqueue(normalized_start_url, 0)  # The start URL is marked as visited
+
+	# Pace requests to the crawled site as its robots.txt asks
+	robots = fetch_robots_txt(normalized_start_url)
+	crawl_delay = robots.crawl_delay(USER_AGENT) if robots else None
+	if crawl_delay:
+		get_host_scheduler().set_crawl_delay(normalized_start_url, float(crawl_delay))
+		logger.info("Honoring Crawl-delay of %ss for %s", crawl_delay, base_domain_of_start_url)
+
+	def is_crawl_allowed(url):
+		return not respect_robots or robots is None or robots.can_fetch(USER_AGENT, url)
+
+	if seed_sitemaps and not resume_state and max_depth >= 1:
+		# Sitemap pages are queued as if linked from the start page, so workers start at full width
+		pages_seeded = 0
+		for page_url in iter_sitemap_page_urls(get_sitemap_urls(normalized_start_url, robots)):
+			if len(state.queue) >= max_pages:
+				break
+			normalized_page_url = normalize_url(page_url)
+			if (normalized_page_url in state.visited_urls
+					or get_base_domain(normalized_page_url) != base_domain_of_start_url
+					or not is_crawl_allowed(normalized_page_url)):
+				continue
+			state.enqueue(normalized_page_url, 1)
+			pages_seeded += 1
+		print(f"{Fore.MAGENTA}Seeded {pages_seeded} pages from sitemaps.{Style.RESET_ALL}")
 
 	start_time = time.time()
+	last_checkpoint_time = start_time
+	metrics = get_metrics()
+	timeout_policy = get_timeout_policy()
+	connection_error_links = {}  # Normalized link -> raw link, for the final retry pass
+	log_debug = logger.isEnabledFor(logging.DEBUG)  # Checked once, the per-link messages are in the hot loop
 
 	print(f"{Fore.MAGENTA}Starting deep crawl...{Style.RESET_ALL}")
 
-	while queue and len(crawled_pages_summary) < max_pages:
-		# --- Overall timeout check (re-enabled) ---
-		if time.time() - start_time > timeout:
-			print(f"{Fore.RED}Crawl stopped due to timeout ({timeout} seconds).{Style.RESET_ALL}")
-			break
-		# --- End of timeout check ---
-
-		# Check for user-initiated stop
-		if STOP_CRAWL:
-			print(f"{Fore.RED}Crawl stopped by user.{Style.RESET_ALL}")
-			break
-
-		current_normalized_url, current_depth = queue.pop(0)
-
-		# DEBUG_REPROCESS_ERROR: Check if the URL being processed has already been recorded in summary.
-		# This indicates a failure in visited_urls or normalize_url if it occurs.
-		if any(s['url'] == current_normalized_url for s in crawled_pages_summary):
-			print(
-				f"DEBUG_REPROCESS_ERROR: {current_normalized_url} is being re-processed. This indicates an issue and should be investigated.")  # DEBUG
-			# If this error occurs, we should skip processing this URL to prevent infinite loops.
-			continue
-
-		if current_depth > max_depth:
-			print(
-				f"DEBUG_DEPTH_SKIP: Skipping {current_normalized_url} due to depth {current_depth} > max_depth {max_depth}")
-			continue
+	def save_crawl_checkpoint():
+		# Only called between batches, when every page is either queued or fully recorded
+		try:
+			save_checkpoint(checkpoint_path, dict(
+				state.to_checkpoint(),
+				start_url=start_url,
+				max_depth=max_depth,
+				max_pages=max_pages,
+				link_statuses=status_cache.export()
+			))
+			logger.debug("Saved crawl state to %s", checkpoint_path)
+		except Exception as e:
+			print(f"{Fore.YELLOW}Warning: Unable to save checkpoint to '{checkpoint_path}': {e}{Style.RESET_ALL}")
+
+	parse_executor = None
+	if parse_workers > 0:
+		parse_executor = ProcessPoolExecutor(max_workers=parse_workers, initializer=_init_parse_worker)
+
+	def fetch_and_extract(page_url, deadline):
+		"""
+		Fetches a page (giving up at `deadline`) and extracts its links.
+		Returns (links, normalized links, asset URLs, not modified); links is None if the page could
+		not be fetched.
+		"""
+		if page_fetcher is not None:
+			stored_page = page_fetcher(page_url)
+			if stored_page is not None:
+				return stored_page[0], stored_page[1], [], False
+			if replay:
+				return None  # Not crawled
+
+		etag = last_modified = None
+		if page_cache is None:
+			content = fetch_page_content(page_url, deadline)
+		else:
+			stored_etag, stored_last_modified, stored_links, stored_assets = \
+				page_cache.get(page_url) or (None, None, None, None)
+			if asset_attributes and stored_assets is None:
+				stored_etag = stored_last_modified = None  # Stored without its assets: fetch it in full
+			status_code, content, etag, last_modified = fetch_page_if_modified(page_url, stored_etag, stored_last_modified,
+																			   deadline)
+			if status_code == 304:
+				# Not modified since the previous run: reuse its links instead of parsing it again
+				stored_asset_urls = _expand_assets(stored_assets, stylesheet_cache, deadline) if asset_attributes else []
+				return stored_links, [normalize_url(link) for link in stored_links], stored_asset_urls, True
 
-		print(
-			f"{Fore.BLUE}Crawling (Depth {current_depth}, Page {len(crawled_pages_summary) + 1} of {max_pages}): {current_normalized_url}{Style.RESET_ALL}")
+		if not content:
+			return None, None, [], False
 
-		time.sleep(THROTTLE_TIME)  # Apply throttle
+		if parse_executor is not None:
+			links, normalized_links, assets, (parse_seconds, normalize_seconds) = parse_executor.submit(
+				extract_and_normalize_links, content, page_url, extractor_backend, asset_attributes).result()
+		else:
+			links, normalized_links, assets, (parse_seconds, normalize_seconds) = extract_and_normalize_links(
+				content, page_url, extractor_backend, asset_attributes)
+		metrics.observe('parse', parse_seconds)
+		metrics.observe('normalize', normalize_seconds)
+
+		if page_cache is not None:
+			page_cache.set(page_url, etag, last_modified, links, assets if asset_attributes else None)
+		return links, normalized_links, _expand_assets(assets, stylesheet_cache, deadline), False
+
+	crawl_deadline = time.monotonic() + timeout - (time.time() - start_time)
+	pages_not_replayed = 0
+
+	# Pages are fetched `page_workers` at a time, but processed in queue order so that
+	# link discovery (and therefore the report) matches a sequential crawl.
+	with ThreadPoolExecutor(max_workers=max(1, page_workers)) as fetch_executor:
+		while state.queue and state.pages_crawled < max_pages:
+			# --- Overall timeout check (re-enabled) ---
+			if time.time() - start_time > timeout and not replay:
+				print(f"{Fore.RED}Crawl stopped due to timeout ({timeout} seconds).{Style.RESET_ALL}")
+				break
+			# --- End of timeout check ---
+
+			# Check for user-initiated stop
+			if STOP_CRAWL:
+				print(f"{Fore.RED}Crawl stopped by user.{Style.RESET_ALL}")
+				break
+
+			if checkpoint_path and time.time() - last_checkpoint_time >= checkpoint_interval:
+				save_crawl_checkpoint()
+				last_checkpoint_time = time.time()
+
+			# Take the next batch of pages from the front of the queue
+			batch = []
+			while state.queue and len(batch) < page_workers and state.pages_crawled + len(batch) < max_pages:
+				current_normalized_url, current_depth = state.pop()
+
+				# Check if the URL being processed has already been recorded in summary.
+				# This indicates a failure in visited_urls or normalize_url if it occurs.
+				if state.is_summarized(current_normalized_url):
+					logger.error("%s is being re-processed. This indicates an issue and should be investigated.",
+								 current_normalized_url)
+					# If this error occurs, we should skip processing this URL to prevent infinite loops.
+					continue
 
-		content = fetch_page_content(current_normalized_url)
-		if not content:
-			crawled_pages_summary.append({
-				"url": current_normalized_url,
-				"depth": current_depth,
-				"status_code": 0,
-				"links_found_on_page": 0,
-				"broken_links_on_page": [],
-				"note": "Failed to fetch content or connection error."
-			})
-			continue
-
-		soup = BeautifulSoup(content, 'html.parser')
-		links_on_current_page = []
-		broken_links_on_current_page = []
-
-		unique_normalized_links_on_this_page = set()
-
-		for a_tag in soup.find_all('a', href=True):
-			href = a_tag['href']
-
-			full_link_raw = None
-			if href.startswith('http://') or href.startswith('https://'):
-				full_link_raw = href
-			else:
-				try:
-					full_link_raw = urljoin(current_normalized_url, href)
-					if not full_link_raw.startswith(('http://', 'https://')):
-						continue
-				except ValueError:
+				if current_depth > max_depth:
+					logger.debug("Skipping %s due to depth %s > max_depth %s", current_normalized_url, current_depth,
+								 max_depth)
 					continue
 
-			if full_link_raw:
-				links_on_current_page.append(full_link_raw)
+				batch.append((current_normalized_url, current_depth))
 
-				normalized_current_link = normalize_url(full_link_raw)
-				print(f"DEBUG_NORM_LINK: Original: {full_link_raw} -> Normalized: {normalized_current_link}")
+			metrics.set_queue_depth(len(state.queue))
+			if not batch:
+				continue
 
-				if normalized_current_link in unique_normalized_links_on_this_page:
-					print(f"DEBUG_DUPE_ON_PAGE: {normalized_current_link} is duplicate on current page.")
-					continue
-				unique_normalized_links_on_this_page.add(normalized_current_link)
+			fetched_pages = fetch_executor.map(fetch_and_extract, [page_url for page_url, _ in batch],
+											   [crawl_deadline] * len(batch))
 
-				link_base_domain = get_base_domain(normalized_current_link)
-				is_internal_link = (link_base_domain == base_domain_of_start_url)
+			for batch_index, ((current_normalized_url, current_depth), fetched_page) in enumerate(zip(batch, fetched_pages)):
+				if fetched_page is None:
+					pages_not_replayed += 1
+					continue
+				links_on_current_page, normalized_links_on_current_page, assets_on_current_page, not_modified = fetched_page
+				# Pages of this batch not processed yet still count towards max_pages
+				pages_pending_in_batch = len(batch) - batch_index - 1
 				print(
-					f"DEBUG_LINK_TYPE: {normalized_current_link} (Domain: {link_base_domain}) is Internal: {is_internal_link}")
+					f"{Fore.BLUE}Crawling (Depth {current_depth}, Page {state.pages_crawled + 1} of {max_pages}): {current_normalized_url}{Style.RESET_ALL}")
+
+				if links_on_current_page is None:
+					state.add_page_summary({
+						"url": current_normalized_url,
+						"depth": current_depth,
+						"status_code": 0,
+						"links_found_on_page": 0,
+						"broken_links_on_page": [],
+						"note": "Failed to fetch content or connection error."
+					})
+					metrics.count_page()
+					continue
 
-				if is_internal_link and normalized_current_link not in visited_urls and current_depth + 1 <= max_depth:
-					if len(crawled_pages_summary) + len(queue) + 1 <= max_pages:
-						queue.append((normalized_current_link, current_depth + 1))
-						visited_urls.add(normalized_current_link)
-						print(
-							f"DEBUG_QUEUE_ADD: Added {normalized_current_link} (depth {current_depth + 1}) to queue. Visited size: {len(visited_urls)}, Queue size: {len(queue)}")
+				if not_modified:
+					logger.debug("%s has not changed, reusing %s stored links.", current_normalized_url,
+								 len(links_on_current_page))
+					state.total_pages_not_modified += 1
+
+				broken_links_on_current_page = []
+
+				unique_normalized_links_on_this_page = set()
+				links_to_check = []  # (raw link, normalized link, is asset), one per unique link on this page
+
+				for full_link_raw, normalized_current_link in zip(links_on_current_page, normalized_links_on_current_page):
+					if log_debug:
+						logger.debug("Original link: %s -> Normalized: %s", full_link_raw, normalized_current_link)
+
+					if normalized_current_link in unique_normalized_links_on_this_page:
+						if log_debug:
+							logger.debug("%s is duplicate on current page.", normalized_current_link)
+						continue
+					unique_normalized_links_on_this_page.add(normalized_current_link)
+
+					link_base_domain = get_base_domain(normalized_current_link)
+					is_internal_link = (link_base_domain == base_domain_of_start_url)
+					if log_debug:
+						logger.debug("%s (Domain: %s) is Internal: %s", normalized_current_link, link_base_domain,
+									 is_internal_link)
+
+					if (is_internal_link and normalized_current_link not in state.visited_urls
+							and current_depth + 1 <= max_depth and is_crawl_allowed(normalized_current_link)):
+						if state.pages_crawled + len(state.queue) + pages_pending_in_batch + 1 <= max_pages:
+							state.enqueue(normalized_current_link, current_depth + 1)
+							if log_debug:
+								logger.debug("Added %s (depth %s) to queue. Queue size: %s", normalized_current_link,
+											 current_depth + 1, len(state.queue))
+						else:
+							print(
+								f"{Fore.YELLOW}Skipping {normalized_current_link} (as new page) due to max pages limit ({max_pages}).{Style.RESET_ALL}")
+					elif log_debug:
+						if not is_internal_link:
+							logger.debug("Skipping %s (external).", normalized_current_link)
+						elif normalized_current_link in state.visited_urls:
+							logger.debug("Skipping %s (already visited/queued).", normalized_current_link)
+						elif current_depth + 1 > max_depth:
+							logger.debug("Skipping %s (exceeds max depth).", normalized_current_link)
+						else:
+							logger.debug("Skipping %s (disallowed by robots.txt).", normalized_current_link)
+
+					links_to_check.append((full_link_raw, normalized_current_link, False))
+
+				# Assets are checked with the links but never queued; one that is also a link counts as a link
+				for asset_url in assets_on_current_page:
+					normalized_asset_url = normalize_url(asset_url)
+					if normalized_asset_url not in unique_normalized_links_on_this_page:
+						unique_normalized_links_on_this_page.add(normalized_asset_url)
+						links_to_check.append((asset_url, normalized_asset_url, True))
+
+				# The link checks of each page still to crawl (this one, the rest of the batch and the queue, which
+				# already holds the pages this one links to) get an equal share of the remaining time, so the
+				# pages crawled first cannot spend the budget of the pages after them
+				pages_outstanding = min(max_pages - state.pages_crawled, len(state.queue) + pages_pending_in_batch + 1)
+				check_deadline = time.monotonic() + (timeout - (time.time() - start_time)) / max(1, pages_outstanding)
+
+				# Check all unique links of this page concurrently, then record results in page order
+				link_statuses = check_links_status([raw for raw, _, _ in links_to_check], concurrency=concurrency,
+												   status_cache=status_cache, deadline=check_deadline)
+
+				redirect_hops_on_current_page = 0
+				for full_link_raw, normalized_current_link, is_asset in links_to_check:
+					status_code = link_statuses[full_link_raw]
+					if is_asset:
+						state.total_unique_assets_checked += 1
 					else:
-						print(
-							f"{Fore.YELLOW}Skipping {normalized_current_link} (as new page) due to max pages limit ({max_pages}).{Style.RESET_ALL}")
-				else:
-					if not is_internal_link:
-						print(f"DEBUG_QUEUE_SKIP: Skipping {normalized_current_link} (external).")
-					elif normalized_current_link in visited_urls:
-						print(f"DEBUG_QUEUE_SKIP: Skipping {normalized_current_link} (already visited/queued).")
-					elif current_depth + 1 > max_depth:
-						print(f"DEBUG_QUEUE_SKIP: Skipping {normalized_current_link} (exceeds max depth).")
-
-				status_code = check_link_status(full_link_raw)
-				total_unique_links_checked += 1
-
-				if status_code >= 400 or status_code == 0:
-					broken_link_info = {
-						"link": full_link_raw,
-						"status_code": status_code,
-						"status_message": "Broken" if status_code >= 400 else "Connection Error"
-					}
-					broken_links_on_current_page.append(broken_link_info)
-
-					is_already_recorded_broken = False
-					for entry in all_broken_links_detailed:
-						if normalize_url(entry["link"]) == normalized_current_link and entry[
-							"status_code"] == status_code:
-							is_already_recorded_broken = True
-							break
-
-					if not is_already_recorded_broken:
-						all_broken_links_detailed.append({
+						state.total_unique_links_checked += 1
+
+					redirect_chain = get_redirect_chain(full_link_raw)
+					if redirect_chain is not None:
+						redirect_hops_on_current_page += len(redirect_chain["hops"])
+						redirect_chain["status_code"] = status_code
+						state.record_redirect_chain(full_link_raw, normalized_current_link, redirect_chain,
+													current_normalized_url)
+
+					if status_code >= 400 or status_code == 0:
+						# Redirect loops and overlong chains would end the same way again
+						if status_code == 0 and (redirect_chain is None or "error" not in redirect_chain):
+							connection_error_links[normalized_current_link] = full_link_raw
+						broken_link_info = {
 							"link": full_link_raw,
 							"status_code": status_code,
-							"status_message": broken_link_info["status_message"],
-							"source_page": current_normalized_url,
-							"depth_found": current_depth
-						})
+							"status_message": _get_status_message(status_code, redirect_chain)
+						}
+						if is_asset:
+							broken_link_info["asset"] = True
+						broken_links_on_current_page.append(broken_link_info)
+
+						# Every page the broken link appears on is kept in its source_pages
+						is_new_broken_link = state.record_broken_link(
+							full_link_raw, normalized_current_link, status_code, broken_link_info["status_message"],
+							current_normalized_url, current_depth, is_asset)
+
+						if is_new_broken_link:
+							print(
+								f"  {Fore.RED}Broken {'asset' if is_asset else 'link'} found: {full_link_raw} (Code: {status_code}) from {current_normalized_url}{Style.RESET_ALL}")
+					else:
 						print(
-							f"  {Fore.RED}Broken link found: {full_link_raw} (Code: {status_code}) from {current_normalized_url}{Style.RESET_ALL}")
-				else:
-					print(
-						f"  {Fore.GREEN}OK: {full_link_raw} (Code: {status_code}) from {current_normalized_url}{Style.RESET_ALL}")
-
-		crawled_pages_summary.append({
-			"url": current_normalized_url,
-			"depth": current_depth,
-			"links_found_on_page": len(links_on_current_page),
-			"broken_links_on_page": broken_links_on_current_page
-		})
+							f"  {Fore.GREEN}OK: {full_link_raw} (Code: {status_code}) from {current_normalized_url}{Style.RESET_ALL}")
+
+				page_summary = {
+					"url": current_normalized_url,
+					"depth": current_depth,
+					"links_found_on_page": len(links_on_current_page),
+					"broken_links_on_page": broken_links_on_current_page
+				}
+				if asset_attributes:
+					page_summary["assets_found_on_page"] = len(assets_on_current_page)
+				if redirect_hops_on_current_page:
+					page_summary["redirect_hops_on_page"] = redirect_hops_on_current_page
+				if not_modified:
+					page_summary["not_modified"] = True
+				state.add_page_summary(page_summary)
+				metrics.count_page(len(links_to_check))
+
+	if parse_executor is not None:
+		parse_executor.shutdown()
 
 	crawl_status_message = "Crawl completed."
-	if time.time() - start_time > timeout:
+	if replay and pages_not_replayed:
+		# The pages the crawl did not get to before its deadline
+		crawl_status_message = f"Crawl stopped due to timeout ({pages_not_replayed} queued pages were not crawled)."
+	elif time.time() - start_time > timeout and not replay:
 		crawl_status_message = f"Crawl stopped due to timeout ({timeout} seconds)."
 	elif STOP_CRAWL:
 		crawl_status_message = "Crawl stopped by user."
 
+	# Links to hosts that did not resolve would fail the same way again
+	retry_links = {normalized_link: link for normalized_link, link in connection_error_links.items()
+				   if not timeout_policy.is_dns_failed(link)}
+	retry_pass = None
+	if timeout_policy.enabled and retry_links and not STOP_CRAWL and not replay:
+		print(f"{Fore.MAGENTA}Checking {len(retry_links)} links with connection errors again...{Style.RESET_ALL}")
+		timeout_policy.close_circuits(retry_links.values())
+		retry_deadline = time.monotonic() + max(RETRY_PASS_GRACE, timeout - (time.time() - start_time))
+
+		# Hosts are retried in parallel, but the links of a host one at a time: once one of them fails
+		# again, the host's other links keep their connection error without costing another timeout
+		retry_links_by_host = {}
+		for normalized_link, link in retry_links.items():
+			retry_links_by_host.setdefault(get_hostname(link), []).append((normalized_link, link))
+
+		def retry_host_links(host_links):
+			host_statuses = {}
+			for normalized_link, link in host_links:
+				if time.monotonic() >= retry_deadline:
+					break  # Out of time: the remaining links keep their connection error
+				host_statuses[normalized_link] = check_link_status(link, retry_deadline)
+				if host_statuses[normalized_link] == 0:
+					break
+			return host_statuses
+
+		retry_statuses = {}
+		with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(retry_links_by_host)))) as retry_executor:
+			for host_statuses in retry_executor.map(retry_host_links, retry_links_by_host.values()):
+				retry_statuses.update(host_statuses)
+		new_statuses = {}
+		for normalized_link, link in retry_links.items():
+			status_code = retry_statuses.get(normalized_link, 0)
+			if status_code == 0:
+				continue
+			new_statuses[normalized_link] = status_code
+			state.update_broken_link(normalized_link, 0, status_code, "Broken" if status_code >= 400 else None,
+									 normalize_url)
+			if status_code >= 400:
+				print(f"  {Fore.RED}Broken link on retry: {link} (Code: {status_code}){Style.RESET_ALL}")
+			else:
+				print(f"  {Fore.GREEN}OK on retry: {link} (Code: {status_code}){Style.RESET_ALL}")
+		status_cache.update(new_statuses)
+		retry_pass = {
+			"links_retried": len(retry_links),
+			"links_recovered": sum(1 for status_code in new_statuses.values() if status_code < 400)
+		}
+
+	# Always leave a checkpoint behind, so a stopped or timed-out crawl can be resumed
+	if checkpoint_path:
+		save_crawl_checkpoint()
+
 	print(
-		f"{Fore.MAGENTA}{crawl_status_message} Pages crawled: {len(crawled_pages_summary)}, Broken links found: {len(all_broken_links_detailed)}{Style.RESET_ALL}")
+		f"{Fore.MAGENTA}{crawl_status_message} Pages crawled: {state.pages_crawled}, Broken links found: {state.broken_links_found}{Style.RESET_ALL}")
 
-	return {
+	report = {
 		"audited_url": start_url,
 		"scan_type": "deep_crawl",
-		"total_pages_crawled": len(crawled_pages_summary),
-		"total_unique_links_checked": total_unique_links_checked,
-		"total_broken_links_across_site": len(all_broken_links_detailed),
-		"crawled_pages_summary": crawled_pages_summary,
-		"all_broken_links_detailed": all_broken_links_detailed,
+		"total_pages_crawled": state.pages_crawled,
+		"total_pages_not_modified": state.total_pages_not_modified,
+		"total_unique_links_checked": state.total_unique_links_checked,
+		"total_broken_links_across_site": state.broken_links_found,
+		"crawled_pages_summary": state.crawled_pages_summary,
+		"all_broken_links_detailed": state.all_broken_links_detailed,
+		"total_redirected_links": state.total_redirected_links,
+		"redirect_chains": state.redirect_chains,
+		"link_status_cache": status_cache.stats(),
+		"redirect_cache": get_redirect_cache_stats(),
+		"metrics": metrics.snapshot(),
 		"crawl_completion_status": crawl_status_message
-	}
\ No newline at end of file
+	}
+
+	if asset_attributes:
+		report["total_unique_assets_checked"] = state.total_unique_assets_checked
+	if timeout_policy.enabled:
+		report["timeout_policy"] = timeout_policy.stats()
+	if retry_pass is not None:
+		report["retry_pass"] = retry_pass
+
+	if state.report_sinks:
+		summary = {key: value for key, value in report.items()
+				   if key not in ("crawled_pages_summary", "all_broken_links_detailed", "redirect_chains")}
+		for sink in state.report_sinks:
+			sink.write_summary(summary)
+
+	if not keep_results:
+		del report["crawled_pages_summary"]
+		del report["all_broken_links_detailed"]
+		del report["redirect_chains"]
+
+	return report
\ No newline at end of file
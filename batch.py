@@ -0,0 +1,126 @@
+from concurrent.futures import ThreadPoolExecutor
+from colorama import Fore, Style
+import audit
+from audit import check_broken_links, crawl_site_for_broken_links, DEFAULT_PAGE_WORKERS
+from cache import LinkStatusCache
+from extractor import DEFAULT_EXTRACTOR_BACKEND
+from metrics import get_metrics
+from utils import DEFAULT_CONCURRENCY, get_timeout_policy, get_redirect_cache_stats
+
+# Sites audited at the same time in batch mode
+DEFAULT_PARALLEL_SITES = 4
+
+# Report entries shared by the whole batch, reported once in the combined summary
+SHARED_REPORT_KEYS = ("link_status_cache", "redirect_cache", "metrics", "timeout_policy")
+
+
+def read_url_file(path: str) -> list:
+	"""
+	Returns the start URLs listed in a text file, one per line, in file order and without
+	duplicates. Blank lines and lines starting with '#' are skipped.
+	"""
+	with open(path, encoding='utf-8') as f:
+		urls = [line.strip() for line in f]
+	return list(dict.fromkeys(url for url in urls if url and not url.startswith('#')))
+
+
+def run_batch(urls: list, scan_type: int, max_depth: int, max_pages: int, timeout: int,
+			  concurrency: int = DEFAULT_CONCURRENCY, page_workers: int = DEFAULT_PAGE_WORKERS,
+			  parallel_sites: int = DEFAULT_PARALLEL_SITES, persistent_cache=None,
+			  extractor_backend: str = DEFAULT_EXTRACTOR_BACKEND, asset_attributes: dict | None = None,
+			  open_report_sinks=None, save_report=None, **crawl_options) -> dict:
+	"""
+	Audits several sites in this process, `parallel_sites` at a time (scan type 0: start page
+	only, 1: deep crawl).
+	`concurrency` and `page_workers` are split evenly between the sites audited at the same
+	time, and all sites share one LinkStatusCache, so a link found on several sites (typically
+	an external one) is checked once for the whole batch.
+	`open_report_sinks(url)` returns the streaming report sinks of a site's crawl, and
+	`save_report(url, report)` is called as each site finishes and returns where its report was
+	saved. Other keyword arguments are passed to crawl_site_for_broken_links.
+	Returns the combined summary of the batch.
+	"""
+	audit.STOP_CRAWL = False  # Reset once: the sites' crawls leave the stop flag to the batch
+	parallel_sites = max(1, min(parallel_sites, len(urls)))
+	site_concurrency = max(1, concurrency // parallel_sites)
+	site_page_workers = max(1, page_workers // parallel_sites)
+	status_cache = LinkStatusCache(persistent_cache)
+
+	print(f"{Fore.MAGENTA}Auditing {len(urls)} sites, {parallel_sites} at a time "
+		  f"(link checks per site: {site_concurrency}, page workers per site: {site_page_workers}).{Style.RESET_ALL}")
+
+	def audit_site(site_index, url):
+		site_summary = {"url": url}
+		if audit.STOP_CRAWL:
+			site_summary["status"] = "Skipped: batch stopped by user."
+			return site_summary
+
+		print(f"{Fore.CYAN}[{site_index + 1}/{len(urls)}] Auditing {url}{Style.RESET_ALL}")
+		report_sinks = open_report_sinks(url) if open_report_sinks is not None else []
+		try:
+			if scan_type == 0:
+				report = check_broken_links(url, output_format='json', concurrency=site_concurrency,
+											persistent_cache=persistent_cache, extractor_backend=extractor_backend,
+											status_cache=status_cache, asset_attributes=asset_attributes)
+				for sink in report_sinks:
+					for broken_link in report["broken_links"]:
+						sink.write_broken_link(broken_link)
+					sink.write_summary({key: value for key, value in report.items() if key != "broken_links"})
+				site_summary.update(status="Completed.", pages_crawled=1, links_checked=report["total_links_found"],
+									broken_links=report["total_broken_links"])
+			else:
+				report = crawl_site_for_broken_links(
+					start_url=url,
+					max_depth=max_depth,
+					max_pages=max_pages,
+					timeout=timeout,
+					concurrency=site_concurrency,
+					page_workers=site_page_workers,
+					persistent_cache=persistent_cache,
+					extractor_backend=extractor_backend,
+					report_sinks=report_sinks,
+					status_cache=status_cache,
+					asset_attributes=asset_attributes,
+					reset_stop=False,
+					**crawl_options
+				)
+				site_summary.update(status=report.get("crawl_completion_status", report.get("error")),
+									pages_crawled=report["total_pages_crawled"],
+									links_checked=report["total_unique_links_checked"],
+									broken_links=report["total_broken_links_across_site"])
+		except Exception as e:
+			print(f"{Fore.RED}Error: Audit of {url} failed: {e}{Style.RESET_ALL}")
+			site_summary["status"] = f"Failed: {e}"
+			return site_summary
+		finally:
+			for sink in report_sinks:
+				sink.close()
+
+		for key in SHARED_REPORT_KEYS:
+			report.pop(key, None)
+		if save_report is not None:
+			site_summary["report_file"] = save_report(url, report)
+		if report_sinks:
+			site_summary["report_sinks"] = [sink.filename for sink in report_sinks]
+		print(f"{Fore.CYAN}[{site_index + 1}/{len(urls)}] Finished {url}: {site_summary['broken_links']} broken links."
+			  f"{Style.RESET_ALL}")
+		return site_summary
+
+	with ThreadPoolExecutor(max_workers=parallel_sites) as executor:
+		sites = list(executor.map(audit_site, range(len(urls)), urls))
+
+	summary = {
+		"scan_type": "batch_" + ("single_page" if scan_type == 0 else "deep_crawl"),
+		"total_sites": len(sites),
+		"total_sites_completed": sum(1 for site in sites if "broken_links" in site),
+		"total_pages_crawled": sum(site.get("pages_crawled", 0) for site in sites),
+		"total_unique_links_checked": sum(site.get("links_checked", 0) for site in sites),
+		"total_broken_links": sum(site.get("broken_links", 0) for site in sites),
+		"sites": sites,
+		"link_status_cache": status_cache.stats(),
+		"redirect_cache": get_redirect_cache_stats(),
+		"metrics": get_metrics().snapshot()
+	}
+	if get_timeout_policy().enabled:
+		summary["timeout_policy"] = get_timeout_policy().stats()
+	return summary
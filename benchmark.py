@@ -0,0 +1,551 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlparse, urlunparse, parse_qs, urlencode
+from crawl_state import CrawlState
+from extractor import extract_page_urls, EXTRACTOR_BACKENDS, DEFAULT_ASSET_ATTRIBUTES
+from utils import normalize_url, get_base_domain, DEFAULT_CONCURRENCY
+from mock_site import SyntheticSite, SyntheticSiteServer
+
+# Page counts used by the crawl bookkeeping benchmark
+CRAWL_STATE_SIZES = [100, 1000, 10000, 100000]
+LINKS_PER_PAGE = 20
+BROKEN_LINKS_PER_PAGE = 2
+
+# Page counts used by the crawl state memory benchmark
+MEMORY_SIZES = [10000, 50000]
+
+# Saved pages the link extraction backends are checked against BeautifulSoup on, and the URL they are resolved against
+EXTRACTOR_CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "extractor_corpus")
+EXTRACTOR_CORPUS_URL = "https://example.com/blog/2024/page.html"
+# Corpus pages where the lxml backend follows the HTML spec and BeautifulSoup does not (see extractor.EXTRACTOR_BACKENDS)
+LXML_DIVERGENT_PAGES = frozenset(['tokenizer_quirks.html'])
+
+# Synthetic sites of the end-to-end benchmark (see mock_site.SyntheticSite for the parameters).
+# Changing a scenario makes its results incomparable with earlier ones: add a new one instead.
+SITE_SCENARIOS = {
+	'baseline': dict(pages=300, fan_out=10, duplicate_ratio=0.3, broken_ratio=0.05, external_links=3),
+	'wide': dict(pages=300, fan_out=60, duplicate_ratio=0.5, broken_ratio=0.05, external_links=10),
+	'latency': dict(pages=200, fan_out=10, duplicate_ratio=0.3, broken_ratio=0.05, external_links=3, latency=0.02),
+	'slow-hosts': dict(pages=200, fan_out=10, duplicate_ratio=0.3, broken_ratio=0.05, external_links=6, slow_hosts=3,
+					   slow_latency=0.5),
+	'head-hostile': dict(pages=200, fan_out=10, duplicate_ratio=0.3, broken_ratio=0.05, external_links=6,
+						 head_hostile_ratio=0.5)
+}
+SITE_MODES = ('page', 'crawl')
+DEFAULT_RESULTS_PATH = "benchmark-results.jsonl"
+# Politeness limits high enough for the benchmark to measure the crawler, not the scheduler
+BENCH_HOST_RATE = 1000.0
+BENCH_HOST_CONCURRENCY = 16
+
+
+class ParityError(Exception):
+	"""
+	Raised when an optimized implementation does not give the output of its reference.
+	"""
+
+
+def _simulated_page_links(page_index: int) -> list:
+	"""
+	Returns (normalized link, status code) pairs for a synthetic page: a shared header/footer,
+	a few new internal pages, and broken links that are partly shared between pages.
+	"""
+	links = [(f"https://example.com/nav/{i}/", 200) for i in range(LINKS_PER_PAGE - 5 - BROKEN_LINKS_PER_PAGE)]
+	links += [(f"https://example.com/page/{page_index * 5 + i}/", 200) for i in range(5)]
+	links.append(("https://example.com/footer-dead-link/", 404))  # Same broken link on every page
+	links.append((f"https://example.com/dead/{page_index}/", 404))
+	return links
+
+
+def _run_crawl_bookkeeping(state, page_count: int) -> int:
+	"""
+	Runs the per-page bookkeeping of the crawl loop on `state` over `page_count` synthetic pages.
+	Returns the number of pages processed.
+	"""
+	state.enqueue("https://example.com/page/0/", 0)
+	pages_done = 0
+	while state.queue and pages_done < page_count:
+		page_url, depth = state.pop()
+		if state.is_summarized(page_url):
+			continue
+		broken_links_on_page = []
+		for link, status_code in _simulated_page_links(pages_done):
+			if link not in state.visited_urls and state.pages_crawled + len(state.queue) + 1 <= page_count:
+				state.enqueue(link, depth + 1)
+			state.total_unique_links_checked += 1
+			if status_code >= 400:
+				broken_links_on_page.append({"link": link, "status_code": status_code, "status_message": "Broken"})
+				state.record_broken_link(link, link, status_code, "Broken", page_url, depth)
+		state.add_page_summary({
+			"url": page_url,
+			"depth": depth,
+			"links_found_on_page": LINKS_PER_PAGE,
+			"broken_links_on_page": broken_links_on_page
+		})
+		pages_done += 1
+	return pages_done
+
+
+def bench_crawl_state(page_count: int) -> float:
+	"""
+	Runs the per-page bookkeeping of the crawl loop over `page_count` synthetic pages.
+	Returns the average time per page in microseconds.
+	"""
+	start = time.perf_counter()
+	pages_done = _run_crawl_bookkeeping(CrawlState(), page_count)
+	elapsed = time.perf_counter() - start
+
+	return elapsed / max(1, pages_done) * 1e6
+
+
+class _ReferenceCrawlState:
+	"""
+	The crawl state before the compact layer: sets of URL strings, a deque of tuples and
+	one dict per page and broken link. Kept to compare memory use and report output.
+	"""
+
+	def __init__(self):
+		self.queue = deque()
+		self.visited_urls = set()
+		self.crawled_pages_summary = []
+		self.summarized_urls = set()
+		self.all_broken_links_detailed = []
+		self._broken_links_index = {}
+		self.pages_crawled = 0
+		self.total_unique_links_checked = 0
+
+	def enqueue(self, url: str, depth: int):
+		self.queue.append((url, depth))
+		self.visited_urls.add(url)
+
+	def pop(self) -> tuple:
+		return self.queue.popleft()
+
+	def is_summarized(self, url: str) -> bool:
+		return url in self.summarized_urls
+
+	def add_page_summary(self, page_summary: dict):
+		self.pages_crawled += 1
+		self.summarized_urls.add(page_summary["url"])
+		self.crawled_pages_summary.append(page_summary)
+
+	def record_broken_link(self, link: str, normalized_link: str, status_code: int, status_message: str,
+						   source_page: str, depth: int) -> bool:
+		key = (normalized_link, status_code)
+		if key in self._broken_links_index:
+			entry = self._broken_links_index[key]
+			if entry["source_pages"][-1] != source_page:
+				entry["source_pages"].append(source_page)
+			return False
+		entry = {
+			"link": link,
+			"status_code": status_code,
+			"status_message": status_message,
+			"source_page": source_page,
+			"depth_found": depth,
+			"source_pages": [source_page]
+		}
+		self.all_broken_links_detailed.append(entry)
+		self._broken_links_index[key] = entry
+		return True
+
+
+def bench_memory(page_count: int) -> dict:
+	"""
+	Checks that the compact crawl state reports the same pages and broken links as the
+	reference dict-and-list state, then measures the memory each holds after `page_count`
+	synthetic pages (traced Python allocations, in bytes).
+	"""
+	reference_state, compact_state = _ReferenceCrawlState(), CrawlState()
+	_run_crawl_bookkeeping(reference_state, page_count)
+	_run_crawl_bookkeeping(compact_state, page_count)
+	if compact_state.crawled_pages_summary != reference_state.crawled_pages_summary:
+		raise ParityError("The compact crawl state reports different pages than the reference layout")
+	if compact_state.all_broken_links_detailed != reference_state.all_broken_links_detailed:
+		raise ParityError("The compact crawl state reports different broken links than the reference layout")
+	del reference_state, compact_state
+
+	results = {}
+	for name, create_state in (("reference", _ReferenceCrawlState),
+							   ("compact", CrawlState),
+							   ("compact+bloom", lambda: CrawlState(bloom_capacity=page_count * 5))):
+		tracemalloc.start()
+		state = create_state()
+		_run_crawl_bookkeeping(state, page_count)
+		results[name] = tracemalloc.get_traced_memory()[0]
+		tracemalloc.stop()
+		del state
+	return results
+
+
+def _peak_rss_mb() -> float | None:
+	try:
+		import resource
+	except ImportError:
+		return None  # Not available on Windows
+	peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# Bytes on macOS, kilobytes elsewhere
+	return round(peak_rss / (1e6 if sys.platform == 'darwin' else 1e3), 1)
+
+
+def _run_site_benchmark(site_settings: dict, port: int, mode: str, settings: dict) -> dict:
+	"""
+	Audits the synthetic site served on `port`, in a fresh process so that caches, connection
+	pools and peak RSS start from zero. `mode` is 'page' (check_broken_links on the start page)
+	or 'crawl' (crawl_site_for_broken_links over the whole site).
+	"""
+	from audit import check_broken_links, crawl_site_for_broken_links
+	from metrics import get_metrics
+	from mock_site import install_loopback
+	from utils import configure_http_client, configure_host_scheduler
+
+	site = SyntheticSite(**site_settings)
+	session = configure_http_client(pool_maxsize=max(20, settings["per_host_limit"]))
+	install_loopback(session, site, port)
+	configure_host_scheduler(rate=settings["host_rate"], max_concurrency=settings["per_host_limit"])
+	get_metrics().reset()
+
+	start = time.perf_counter()
+	with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+		if mode == 'page':
+			report = check_broken_links(site.start_url, output_format='json', concurrency=settings["concurrency"])
+			pages, links, broken_links = 1, report["total_links_found"], report["total_broken_links"]
+		else:
+			report = crawl_site_for_broken_links(site.start_url, max_depth=1000, max_pages=site.pages, timeout=3600,
+												 concurrency=settings["concurrency"],
+												 page_workers=settings["page_workers"])
+			pages, links = report["total_pages_crawled"], report["total_unique_links_checked"]
+			broken_links = report["total_broken_links_across_site"]
+	elapsed = time.perf_counter() - start
+
+	phases = get_metrics().snapshot()["phases"]
+	return {
+		"pages": pages,
+		"links": links,
+		"broken_links": broken_links,
+		"elapsed_seconds": round(elapsed, 3),
+		"pages_per_second": round(pages / elapsed, 2),
+		"links_per_second": round(links / elapsed, 2),
+		"peak_rss_mb": _peak_rss_mb(),
+		# Upper bounds of the histogram buckets (see metrics.LATENCY_BUCKETS)
+		"p95_fetch_seconds": phases["fetch"]["p95_seconds"],
+		"p95_status_check_seconds": phases["status_check"]["p95_seconds"]
+	}
+
+
+def _get_commit() -> str | None:
+	try:
+		return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True, check=True,
+							  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def bench_site(scenarios: list, modes: list, settings: dict, repeat: int = 1, seed: int = 0):
+	"""
+	Runs check_broken_links and/or crawl_site_for_broken_links against local synthetic sites.
+	Yields one result per scenario, mode and repetition, with the site and crawler settings,
+	the commit and the Python version, so results from different commits can be compared.
+	"""
+	environment = {
+		"commit": _get_commit(),
+		"python": platform.python_version(),
+		"platform": platform.platform()
+	}
+	with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as warm_up:
+		warm_up.submit(_peak_rss_mb).result()  # Pay the first spawn before timing anything
+
+	for scenario in scenarios:
+		site_settings = dict(SITE_SCENARIOS[scenario], seed=seed)
+		server = SyntheticSiteServer(SyntheticSite(**site_settings))
+		try:
+			for mode in modes:
+				for run in range(repeat):
+					server.reset_request_count()
+					with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+						result = executor.submit(_run_site_benchmark, site_settings, server.port, mode, settings).result()
+					yield dict(
+						environment,
+						timestamp=datetime.now(timezone.utc).isoformat(timespec='seconds'),
+						scenario=scenario,
+						mode=mode,
+						run=run,
+						site=site_settings,
+						settings=settings,
+						requests_served=server.reset_request_count(),
+						**result
+					)
+		finally:
+			server.shutdown()
+			server.server_close()
+
+
+def _reference_normalize_url(url: str) -> str:
+	"""
+	The unmemoized normalize_url before its fast path, kept to prove both give identical output.
+	"""
+	try:
+		parsed_url = urlparse(url)
+		netloc = parsed_url.netloc.lower()
+		if netloc.startswith('www.'):
+			netloc = netloc[4:]
+		path = parsed_url.path
+		if not path:
+			path = '/'
+		if not path.endswith('/'):
+			path += '/'
+		query_params = parse_qs(parsed_url.query, keep_blank_values=True)
+		tracking_params = ['utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content', 'gclid', 'fbclid',
+						   'ref', '_ga']
+		filtered_query_params = {}
+		for key, value in query_params.items():
+			if key not in tracking_params:
+				filtered_query_params[key] = value
+		sorted_query = urlencode(sorted(filtered_query_params.items(), key=lambda x: x[0]), doseq=True)
+		return urlunparse(('https', netloc, path, parsed_url.params, sorted_query, ''))
+	except Exception:
+		return url
+
+
+def _reference_get_base_domain(url: str) -> str | None:
+	"""
+	The unmemoized get_base_domain, kept to prove both give identical output.
+	"""
+	try:
+		netloc = urlparse(url).netloc
+		if ':' in netloc:
+			netloc = netloc.split(':')[0]
+		parts = netloc.split('.')
+		base_domain = ".".join(parts[-2:]) if len(parts) >= 2 else netloc
+		return base_domain if base_domain else None
+	except Exception:
+		return None
+
+
+def _random_urls(count: int, seed: int = 0) -> list:
+	"""
+	Generates URLs covering the cases normalize_url handles: scheme and host case, www.,
+	ports, missing or trailing slashes, path parameters, tracking and repeated query
+	parameters, blank values, fragments and a few malformed or non-http links.
+	"""
+	rng = random.Random(seed)
+	schemes = ['http', 'https', 'HTTPS', '']
+	hosts = ['example.com', 'www.Example.com', 'blog.example.co.uk:8080', 'WWW.shop.example.com', 'localhost', '']
+	paths = ['', '/', '/about', '/about/', '/a/b/c.html', '/a;param', '/%7Euser/', '//double']
+	queries = ['', 'a=1', 'b=2&a=1', 'utm_source=news&id=7', 'a=1&a=2', 'flag', 'x=&y', 'gclid=abc', 'q=a%20b+c',
+			   '&&', 'ref=home&_ga=1']
+	fragments = ['', 'section', 'top?x=1']
+	oddities = ['mailto:someone@example.com', 'http://[invalid', 'relative/path?b=1&a=2', 'javascript:void(0)']
+
+	urls = []
+	for _ in range(count):
+		if rng.random() < 0.02:
+			urls.append(rng.choice(oddities))
+			continue
+		scheme, host = rng.choice(schemes), rng.choice(hosts)
+		url = f"{scheme}://{host}" if scheme else (f"//{host}" if host else "")
+		url += rng.choice(paths)
+		query = '&'.join(rng.sample(queries, rng.randint(0, 3)))
+		if query or rng.random() < 0.05:
+			url += '?' + query
+		fragment = rng.choice(fragments)
+		if fragment:
+			url += '#' + fragment
+		urls.append(url)
+	return urls
+
+
+def bench_normalize(count: int, unique_ratio: float) -> dict:
+	"""
+	Checks that normalize_url and get_base_domain match their reference implementations on
+	generated URLs, then times both on a workload where each URL repeats 1 / unique_ratio times.
+	Returns the time per call in microseconds of the reference and the memoized functions.
+	"""
+	unique_urls = _random_urls(max(1, int(count * unique_ratio)))
+	for url in unique_urls:
+		if normalize_url(url) != _reference_normalize_url(url):
+			raise ParityError(f"normalize_url({url!r}) differs from the reference: {normalize_url(url)!r}")
+		if get_base_domain(url) != _reference_get_base_domain(url):
+			raise ParityError(f"get_base_domain({url!r}) differs from the reference: {get_base_domain(url)!r}")
+
+	rng = random.Random(1)
+	workload = [rng.choice(unique_urls) for _ in range(count)]
+
+	normalize_url.cache_clear()
+	get_base_domain.cache_clear()
+	results = {}
+	for name, normalize, base_domain in (("reference", _reference_normalize_url, _reference_get_base_domain),
+										 ("memoized", normalize_url, get_base_domain)):
+		start = time.perf_counter()
+		for url in workload:
+			base_domain(normalize(url))
+		results[name] = (time.perf_counter() - start) / count * 1e6
+	return results
+
+
+def _load_saved_pages(paths: list) -> list:
+	"""
+	Returns the (file name, content) of the .html files in `paths` (files or directories), sorted by name.
+	"""
+	files = []
+	for path in paths:
+		if os.path.isdir(path):
+			files.extend(os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith('.html'))
+		else:
+			files.append(path)
+	pages = []
+	for file in sorted(files, key=os.path.basename):
+		with open(file, encoding='utf-8', errors='replace') as page_file:
+			pages.append((os.path.basename(file), page_file.read()))
+	return pages
+
+
+def bench_extract(paths: list, repeat: int) -> dict:
+	"""
+	Checks that every link extraction backend finds the links and assets the BeautifulSoup
+	backend finds on the saved pages in `paths`, then times each backend on them.
+	Returns the time per page in milliseconds of each backend.
+	"""
+	pages = _load_saved_pages(paths)
+	if not pages:
+		raise ValueError(f"No saved .html pages in {', '.join(paths)}")
+	for name, content in pages:
+		for asset_attributes in (None, DEFAULT_ASSET_ATTRIBUTES):
+			expected = extract_page_urls(content, EXTRACTOR_CORPUS_URL, 'bs4', asset_attributes)
+			for backend in EXTRACTOR_BACKENDS:
+				if backend == 'bs4' or (backend == 'lxml' and name in LXML_DIVERGENT_PAGES):
+					continue
+				for kind, urls, expected_urls in zip(("links", "assets"),
+													extract_page_urls(content, EXTRACTOR_CORPUS_URL, backend, asset_attributes),
+													expected):
+					if urls != expected_urls:
+						missing = [url for url in expected_urls if url not in urls]
+						unexpected = [url for url in urls if url not in expected_urls]
+						raise ParityError(f"{name}: the '{backend}' backend {kind} differ from BeautifulSoup "
+										  f"(missing: {missing}, unexpected: {unexpected}, same URLs in another order "
+										  f"if both are empty)")
+
+	results = {}
+	for backend in EXTRACTOR_BACKENDS:
+		start = time.perf_counter()
+		for _ in range(repeat):
+			for _, content in pages:
+				extract_page_urls(content, EXTRACTOR_CORPUS_URL, backend, DEFAULT_ASSET_ATTRIBUTES)
+		results[backend] = (time.perf_counter() - start) / (repeat * len(pages)) * 1e3
+	return results
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmarks for BrokenLinkFinder.")
+	subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+	crawl_state_parser = subparsers.add_parser(
+		'crawl-state', help='Per-page overhead of the crawl frontier and result bookkeeping.')
+	crawl_state_parser.add_argument(
+		'--sizes', type=int, nargs='+', default=CRAWL_STATE_SIZES,
+		help=f'Page counts to benchmark. (Default: {" ".join(map(str, CRAWL_STATE_SIZES))})')
+
+	memory_parser = subparsers.add_parser(
+		'memory', help='Memory held by the crawl state: reference dict-and-list layout versus the compact layer.')
+	memory_parser.add_argument(
+		'--sizes', type=int, nargs='+', default=MEMORY_SIZES,
+		help=f'Page counts to benchmark. (Default: {" ".join(map(str, MEMORY_SIZES))})')
+
+	normalize_parser = subparsers.add_parser(
+		'normalize', help='normalize_url/get_base_domain: equivalence check and time per link.')
+	normalize_parser.add_argument('--count', type=int, default=200000, help='Number of links. (Default: 200000)')
+	normalize_parser.add_argument(
+		'--unique-ratio', type=float, default=0.05,
+		help='Share of distinct URLs among the links; sites repeat the same links on every page. (Default: 0.05)')
+
+	extract_parser = subparsers.add_parser(
+		'extract', help='Link extraction backends: parity with BeautifulSoup on saved pages and time per page.')
+	extract_parser.add_argument(
+		'--pages', nargs='+', default=[EXTRACTOR_CORPUS_DIR],
+		help='Saved .html pages, or directories of them. (Default: the extractor_corpus directory)')
+	extract_parser.add_argument('--repeat', type=int, default=200, help='Passes over the pages. (Default: 200)')
+
+	site_parser = subparsers.add_parser(
+		'site', help='End-to-end audits of local synthetic sites: throughput, peak RSS and p95 latency.')
+	site_parser.add_argument(
+		'--scenarios', nargs='+', choices=list(SITE_SCENARIOS), default=list(SITE_SCENARIOS),
+		help='Synthetic sites to audit. (Default: all)')
+	site_parser.add_argument(
+		'--modes', nargs='+', choices=SITE_MODES, default=list(SITE_MODES),
+		help='page: single-page check of the start page, crawl: deep crawl of the site. (Default: both)')
+	site_parser.add_argument('--repeat', type=int, default=1, help='Runs of each scenario and mode. (Default: 1)')
+	site_parser.add_argument('--seed', type=int, default=0, help='Seed of the generated sites. (Default: 0)')
+	site_parser.add_argument(
+		'--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+		help=f'Link checks in flight at once. (Default: {DEFAULT_CONCURRENCY})')
+	site_parser.add_argument(
+		'--page-workers', type=int, default=4, help='Pages fetched at the same time during the crawl. (Default: 4)')
+	site_parser.add_argument(
+		'--host-rate', type=float, default=BENCH_HOST_RATE,
+		help=f'Requests per second per host. (Default: {BENCH_HOST_RATE})')
+	site_parser.add_argument(
+		'--per-host-limit', type=int, default=BENCH_HOST_CONCURRENCY,
+		help=f'Requests in flight per host. (Default: {BENCH_HOST_CONCURRENCY})')
+	site_parser.add_argument(
+		'--results', type=str, default=DEFAULT_RESULTS_PATH,
+		help=f'JSON Lines file the results are appended to. (Default: {DEFAULT_RESULTS_PATH})')
+
+	args = parser.parse_args()
+
+	if args.benchmark == 'crawl-state':
+		print(f"{'Pages':>10}  {'Per page (us)':>14}")
+		for page_count in args.sizes:
+			print(f"{page_count:>10}  {bench_crawl_state(page_count):>14.2f}")
+
+	elif args.benchmark == 'memory':
+		print(f"{'Pages':>10}  {'Layout':>14}  {'Memory (MB)':>12}  {'Per page (B)':>12}")
+		for page_count in args.sizes:
+			for name, size in bench_memory(page_count).items():
+				print(f"{page_count:>10}  {name:>14}  {size / 1e6:>12.2f}  {size / page_count:>12.0f}")
+		print("Reports identical to the reference layout.")
+
+	elif args.benchmark == 'normalize':
+		results = bench_normalize(args.count, args.unique_ratio)
+		print("Output identical to the reference implementation.")
+		for name, per_link in results.items():
+			print(f"{name:>10}  {per_link:>8.2f} us per link")
+
+	elif args.benchmark == 'extract':
+		results = bench_extract(args.pages, args.repeat)
+		print("Links and assets identical to the BeautifulSoup backend.")
+		for backend, per_page in results.items():
+			print(f"{backend:>10}  {per_page:>8.3f} ms per page")
+
+	elif args.benchmark == 'site':
+		settings = {
+			"concurrency": args.concurrency,
+			"page_workers": args.page_workers,
+			"host_rate": args.host_rate,
+			"per_host_limit": args.per_host_limit
+		}
+		print(f"{'Scenario':>12}  {'Mode':>5}  {'Pages/s':>8}  {'Links/s':>8}  {'Peak RSS (MB)':>13}  "
+			  f"{'p95 fetch (s)':>13}  {'p95 check (s)':>13}  {'Requests':>8}")
+		with open(args.results, 'a', encoding='utf-8') as results_file:
+			for result in bench_site(args.scenarios, args.modes, settings, args.repeat, args.seed):
+				results_file.write(json.dumps(result) + "\n")
+				results_file.flush()
+				print(f"{result['scenario']:>12}  {result['mode']:>5}  {result['pages_per_second']:>8.1f}  "
+					  f"{result['links_per_second']:>8.1f}  {result['peak_rss_mb'] or 0:>13.1f}  "
+					  f"{result['p95_fetch_seconds']:>13.3f}  {result['p95_status_check_seconds']:>13.3f}  "
+					  f"{result['requests_served']:>8}")
+		print(f"Results appended to '{args.results}'.")
+
+
+if __name__ == '__main__':
+	main()
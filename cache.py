@@ -0,0 +1,277 @@
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from utils import normalize_url
+
+# Default location of the persistent link status cache
+DEFAULT_CACHE_PATH = ".link_status_cache.sqlite"
+
+# How long (in seconds) a status is reused across runs, per status class.
+# A TTL of 0 means results of that class are never stored and always rechecked.
+DEFAULT_STATUS_TTLS = {
+	"2xx": 7 * 24 * 3600,  # One week
+	"3xx": 24 * 3600,  # One day
+	"4xx": 0,
+	"5xx": 0,
+	"error": 0  # Connection errors and timeouts (status code 0)
+}
+
+DEFAULT_MAX_CACHE_ENTRIES = 200000
+
+
+def get_status_class(status_code: int) -> str:
+	"""
+	Returns the status class ('2xx', '3xx', ..., or 'error') of a status code.
+	"""
+	if 200 <= status_code < 600:
+		return f"{status_code // 100}xx"
+	return "error"
+
+
+class PersistentStatusCache:
+	"""
+	On-disk (SQLite) cache of link status codes shared between runs.
+	Entries expire according to the TTL of their status class, and the oldest
+	entries are evicted once the cache grows beyond `max_entries`.
+	"""
+
+	def __init__(self, path: str = DEFAULT_CACHE_PATH, ttls: dict | None = None,
+				 max_entries: int = DEFAULT_MAX_CACHE_ENTRIES):
+		self.path = path
+		self.ttls = dict(DEFAULT_STATUS_TTLS, **(ttls or {}))
+		self.max_entries = max_entries
+		self._lock = threading.Lock()
+		self._writes_since_eviction = 0
+		self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+		self._connection.execute("PRAGMA journal_mode=WAL")
+		self._connection.execute("PRAGMA synchronous=NORMAL")
+		self._connection.execute(
+			"CREATE TABLE IF NOT EXISTS link_status ("
+			"url TEXT PRIMARY KEY, status_code INTEGER NOT NULL, "
+			"checked_at REAL NOT NULL, expires_at REAL NOT NULL)")
+		self._connection.execute("CREATE INDEX IF NOT EXISTS link_status_checked_at ON link_status (checked_at)")
+
+	def get(self, key: str) -> int | None:
+		"""
+		Returns the cached status code of a normalized URL, or None if missing or expired.
+		"""
+		with self._lock:
+			row = self._connection.execute(
+				"SELECT status_code FROM link_status WHERE url = ? AND expires_at > ?", (key, time.time())).fetchone()
+		return row[0] if row else None
+
+	def set(self, key: str, status_code: int):
+		"""
+		Stores the status code of a normalized URL if its status class has a TTL.
+		"""
+		ttl = self.ttls.get(get_status_class(status_code), 0)
+		if ttl <= 0:
+			return
+		now = time.time()
+		with self._lock:
+			self._connection.execute(
+				"INSERT OR REPLACE INTO link_status (url, status_code, checked_at, expires_at) VALUES (?, ?, ?, ?)",
+				(key, status_code, now, now + ttl))
+			self._writes_since_eviction += 1
+			# Counting rows on every write is wasteful, so eviction runs periodically
+			if self._writes_since_eviction >= 1000:
+				self._evict()
+
+	def _evict(self):
+		"""
+		Removes expired entries, then the oldest entries above `max_entries`.
+		Must be called with the lock held.
+		"""
+		self._writes_since_eviction = 0
+		self._connection.execute("DELETE FROM link_status WHERE expires_at <= ?", (time.time(),))
+		(count,) = self._connection.execute("SELECT COUNT(*) FROM link_status").fetchone()
+		if count > self.max_entries:
+			self._connection.execute(
+				"DELETE FROM link_status WHERE url IN "
+				"(SELECT url FROM link_status ORDER BY checked_at LIMIT ?)", (count - self.max_entries,))
+
+	def close(self):
+		with self._lock:
+			self._evict()
+			self._connection.close()
+
+
+class PageCache:
+	"""
+	On-disk (SQLite) store of the ETag/Last-Modified validators and extracted links of
+	crawled pages. Used by incremental crawls to skip pages that have not changed since
+	the previous run.
+	"""
+
+	def __init__(self, path: str = DEFAULT_CACHE_PATH):
+		self.path = path
+		self._lock = threading.Lock()
+		self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+		self._connection.execute("PRAGMA journal_mode=WAL")
+		self._connection.execute("PRAGMA synchronous=NORMAL")
+		self._connection.execute(
+			"CREATE TABLE IF NOT EXISTS page_validators ("
+			"url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, links TEXT NOT NULL, fetched_at REAL NOT NULL, "
+			"assets TEXT)")
+		columns = {row[1] for row in self._connection.execute("PRAGMA table_info(page_validators)")}
+		if "assets" not in columns:  # Cache written before assets were extracted
+			self._connection.execute("ALTER TABLE page_validators ADD COLUMN assets TEXT")
+
+	def get(self, url: str) -> tuple | None:
+		"""
+		Returns (etag, last_modified, links, assets) stored for a normalized page URL, or None.
+		assets is None if the page was stored without extracting its assets.
+		"""
+		with self._lock:
+			row = self._connection.execute(
+				"SELECT etag, last_modified, links, assets FROM page_validators WHERE url = ?", (url,)).fetchone()
+		if row is None:
+			return None
+		assets = [tuple(asset) for asset in json.loads(row[3])] if row[3] is not None else None
+		return row[0], row[1], json.loads(row[2]), assets
+
+	def set(self, url: str, etag: str | None, last_modified: str | None, links: list, assets: list | None = None):
+		"""
+		Stores the validators and extracted links (and assets, if they were extracted) of a page.
+		Pages without any validator cannot be requested conditionally, so they are not stored.
+		"""
+		if not etag and not last_modified:
+			return
+		with self._lock:
+			self._connection.execute(
+				"INSERT OR REPLACE INTO page_validators (url, etag, last_modified, links, fetched_at, assets) "
+				"VALUES (?, ?, ?, ?, ?, ?)",
+				(url, etag, last_modified, json.dumps(links), time.time(),
+				 json.dumps(assets) if assets is not None else None))
+
+	def close(self):
+		with self._lock:
+			self._connection.close()
+
+
+class LinkStatusCache:
+	"""
+	Crawl-scoped cache of link status codes, keyed on the normalized URL.
+	Concurrent lookups of the same URL wait on a single in-flight request
+	instead of each sending their own. An optional PersistentStatusCache is
+	consulted before a link is actually checked.
+	"""
+
+	def __init__(self, persistent_cache: PersistentStatusCache | None = None):
+		self._results = {}  # normalized URL -> Future holding the status code
+		self._lock = threading.Lock()
+		self.persistent_cache = persistent_cache
+		self.hits = 0
+		self.misses = 0
+		self.persistent_hits = 0
+
+	def get_status(self, url: str, checker) -> int:
+		"""
+		Returns the status code of a URL, calling `checker(url)` only if no
+		other lookup for the same normalized URL has been made yet.
+		"""
+		key = normalize_url(url)
+		with self._lock:
+			future = self._results.get(key)
+			if future is None:
+				future = Future()
+				self._results[key] = future
+				self.misses += 1
+				is_owner = True
+			else:
+				self.hits += 1
+				is_owner = False
+
+		if is_owner:
+			future.set_result(self._check(key, url, checker))
+		return future.result()
+
+	def _check(self, key: str, url: str, checker) -> int:
+		if self.persistent_cache is not None:
+			status_code = self.persistent_cache.get(key)
+			if status_code is not None:
+				with self._lock:
+					self.persistent_hits += 1
+				return status_code
+		try:
+			status_code = checker(url)
+		except Exception:
+			return 0
+		if self.persistent_cache is not None:
+			self.persistent_cache.set(key, status_code)
+		return status_code
+
+	def export(self) -> dict:
+		"""
+		Returns the finished lookups as a {normalized URL: status code} dictionary.
+		"""
+		with self._lock:
+			return {key: future.result() for key, future in self._results.items() if future.done()}
+
+	def load(self, statuses: dict):
+		"""
+		Preloads statuses previously returned by export(), e.g. from a checkpoint.
+		"""
+		with self._lock:
+			for key, status_code in statuses.items():
+				future = Future()
+				future.set_result(status_code)
+				self._results.setdefault(key, future)
+
+	def update(self, statuses: dict):
+		"""
+		Replaces the statuses of finished lookups with new ones ({normalized URL: status code}),
+		e.g. after links were checked again.
+		"""
+		with self._lock:
+			for key, status_code in statuses.items():
+				future = Future()
+				future.set_result(status_code)
+				self._results[key] = future
+		if self.persistent_cache is not None:
+			for key, status_code in statuses.items():
+				self.persistent_cache.set(key, status_code)
+
+	def stats(self) -> dict:
+		"""
+		Returns hit and miss counts for the JSON report.
+		"""
+		with self._lock:
+			return {
+				"hits": self.hits,
+				"misses": self.misses,
+				"persistent_hits": self.persistent_hits,
+				"cached_urls": len(self._results)
+			}
+
+
+class StylesheetCache:
+	"""
+	Crawl-scoped cache of the URLs referenced by stylesheets, keyed on the normalized
+	stylesheet URL. Each stylesheet is fetched once per crawl, however many pages use it;
+	concurrent lookups of the same stylesheet wait for the first one.
+	"""
+
+	def __init__(self):
+		self._results = {}  # normalized stylesheet URL -> Future holding the referenced URLs
+		self._lock = threading.Lock()
+
+	def get_urls(self, url: str, fetcher) -> list:
+		"""
+		Returns the URLs referenced by a stylesheet, calling `fetcher(url)` only for the first lookup.
+		"""
+		key = normalize_url(url)
+		with self._lock:
+			future = self._results.get(key)
+			is_owner = future is None
+			if is_owner:
+				future = self._results[key] = Future()
+
+		if is_owner:
+			try:
+				future.set_result(fetcher(url))
+			except Exception:
+				future.set_result([])
+		return future.result()
\ No newline at end of file
@@ -0,0 +1,38 @@
+import json
+import os
+
+CHECKPOINT_VERSION = 1
+
+# Default number of seconds between two checkpoints of a running crawl
+DEFAULT_CHECKPOINT_INTERVAL = 30
+
+
+def save_checkpoint(path: str, state: dict):
+	"""
+	Writes the crawl state to a checkpoint file.
+	The file is written to a temporary path first and then renamed, so an
+	interrupted write never leaves a truncated checkpoint behind.
+	"""
+	directory = os.path.dirname(os.path.abspath(path))
+	os.makedirs(directory, exist_ok=True)
+
+	temporary_path = f"{path}.tmp"
+	with open(temporary_path, 'w', encoding='utf-8') as f:
+		json.dump(dict(state, version=CHECKPOINT_VERSION), f, ensure_ascii=False)
+	os.replace(temporary_path, path)
+
+
+def load_checkpoint(path: str) -> dict:
+	"""
+	Reads a crawl state written by save_checkpoint.
+	Raises ValueError if the file is not a checkpoint this version can resume.
+	"""
+	with open(path, 'r', encoding='utf-8') as f:
+		state = json.load(f)
+
+	if not isinstance(state, dict) or state.get("version") != CHECKPOINT_VERSION:
+		raise ValueError(f"Unsupported checkpoint file: {path}")
+
+	# JSON has no tuples; the frontier stores (url, depth) pairs
+	state["queue"] = [(url, depth) for url, depth in state["queue"]]
+	return state
@@ -0,0 +1,492 @@
+import base64
+import hashlib
+import math
+from array import array
+from collections import deque
+
+# False positive rate of the optional Bloom filter holding the visited pages
+DEFAULT_BLOOM_ERROR_RATE = 0.0001
+
+_record_shapes = {}  # Key tuple -> the same tuple, shared by every record with those keys
+
+
+def _compact_value(value):
+	# Lists become tuples and dictionaries CompactRecords; report data contains no tuples of its own
+	if isinstance(value, dict):
+		return CompactRecord(value)
+	if isinstance(value, list):
+		return tuple(_compact_value(item) for item in value)
+	return value
+
+
+def _expand_value(value):
+	if isinstance(value, CompactRecord):
+		return value.to_dict()
+	if isinstance(value, tuple):
+		return [_expand_value(item) for item in value]
+	return value
+
+
+class CompactRecord(tuple):
+	"""
+	A report dictionary stored as one tuple: a key tuple shared by all records of the same
+	shape, followed by the values. Several times smaller than the dictionary. Nested lists
+	and dictionaries are compacted too. to_dict() returns an equal dictionary, keys in order.
+	"""
+	__slots__ = ()
+
+	def __new__(cls, data: dict):
+		keys = tuple(data)
+		keys = _record_shapes.setdefault(keys, keys)
+		return super().__new__(cls, (keys,) + tuple(_compact_value(value) for value in data.values()))
+
+	def to_dict(self) -> dict:
+		return {key: _expand_value(value) for key, value in zip(self[0], self[1:])}
+
+
+class BrokenLinkRecord:
+	"""
+	A broken link of the report. Its source pages are kept as indexes of the crawled pages:
+	a single int while there is one, an array once there are more.
+	"""
+	__slots__ = ('link', 'status_code', 'status_message', 'source_page', 'depth_found', 'source_page_ids', 'is_asset')
+
+	def __init__(self, link: str, status_code: int, status_message: str, source_page: str, depth_found: int,
+				 source_page_id: int, is_asset: bool = False):
+		self.link = link
+		self.status_code = status_code
+		self.status_message = status_message
+		self.source_page = source_page
+		self.depth_found = depth_found
+		self.source_page_ids = source_page_id
+		self.is_asset = is_asset
+
+	@property
+	def last_source_page_id(self) -> int:
+		if isinstance(self.source_page_ids, int):
+			return self.source_page_ids
+		return self.source_page_ids[-1]
+
+	def add_source_page_id(self, source_page_id: int):
+		if isinstance(self.source_page_ids, int):
+			self.source_page_ids = array('I', [self.source_page_ids])
+		self.source_page_ids.append(source_page_id)
+
+	def to_dict(self, page_urls: list) -> dict:
+		source_page_ids = [self.source_page_ids] if isinstance(self.source_page_ids, int) else self.source_page_ids
+		broken_link = {
+			"link": self.link,
+			"status_code": self.status_code,
+			"status_message": self.status_message,
+			"source_page": self.source_page,
+			"depth_found": self.depth_found,
+			"source_pages": [page_urls[page_id] for page_id in source_page_ids]
+		}
+		if self.is_asset:
+			broken_link["asset"] = True
+		return broken_link
+
+
+class UrlTable:
+	"""
+	Interns URLs to consecutive integer IDs, in the order they are added.
+	"""
+	__slots__ = ('_ids', 'urls')
+
+	def __init__(self):
+		self._ids = {}
+		self.urls = []
+
+	def add(self, url: str) -> int:
+		url_id = self._ids.get(url)
+		if url_id is None:
+			url_id = len(self.urls)
+			self._ids[url] = url_id
+			self.urls.append(url)
+		return url_id
+
+	def get_id(self, url: str) -> int | None:
+		return self._ids.get(url)
+
+	def __contains__(self, url: str) -> bool:
+		return url in self._ids
+
+	def __len__(self) -> int:
+		return len(self.urls)
+
+	def __iter__(self):
+		return iter(self.urls)
+
+
+class BloomFilter:
+	"""
+	Fixed-size set of strings that may report an item it does not hold (with probability
+	`error_rate` once `capacity` items are added), but never misses one it holds.
+	"""
+
+	def __init__(self, capacity: int, error_rate: float = DEFAULT_BLOOM_ERROR_RATE):
+		self.capacity = max(1, capacity)
+		self.error_rate = error_rate
+		self.size = max(8, int(math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)))
+		# One 32-bit digest word per hash function; blake2b digests are at most 64 bytes
+		self.hash_count = min(16, max(1, round(self.size / self.capacity * math.log(2))))
+		self.bits = bytearray((self.size + 7) // 8)
+		self.count = 0  # Items added; an approximate size since duplicates cannot always be told apart
+
+	def _positions(self, item: str):
+		digest = hashlib.blake2b(item.encode('utf-8'), digest_size=4 * self.hash_count).digest()
+		size = self.size
+		return [word % size for word in memoryview(digest).cast('I')]
+
+	def add(self, item: str):
+		for position in self._positions(item):
+			self.bits[position >> 3] |= 1 << (position & 7)
+		self.count += 1
+
+	def __contains__(self, item: str) -> bool:
+		bits = self.bits
+		for position in self._positions(item):
+			if not bits[position >> 3] & (1 << (position & 7)):
+				return False
+		return True
+
+	def __len__(self) -> int:
+		return self.count
+
+	def to_dict(self) -> dict:
+		return {
+			"capacity": self.capacity,
+			"error_rate": self.error_rate,
+			"count": self.count,
+			"bits": base64.b64encode(bytes(self.bits)).decode('ascii')
+		}
+
+	@classmethod
+	def from_dict(cls, data: dict) -> 'BloomFilter':
+		bloom_filter = cls(data["capacity"], data["error_rate"])
+		bloom_filter.bits = bytearray(base64.b64decode(data["bits"]))
+		bloom_filter.count = data["count"]
+		return bloom_filter
+
+
+class _TableQueue:
+	"""
+	Frontier of a CrawlState without a Bloom filter. Pages are interned in the order they are
+	queued, so the frontier is the range of URL IDs from `head` to the end of the table.
+	"""
+	__slots__ = ('table', 'depths', 'head')
+
+	def __init__(self, table: UrlTable):
+		self.table = table
+		self.depths = array('H')  # Depth of each queued or crawled page, by URL ID
+		self.head = 0
+
+	def append(self, url_id: int, depth: int):
+		self.depths.append(depth)
+
+	def popleft(self) -> tuple:
+		url_id = self.head
+		self.head += 1
+		return self.table.urls[url_id], self.depths[url_id]
+
+	def __len__(self) -> int:
+		return len(self.table) - self.head
+
+	def __iter__(self):
+		return ((self.table.urls[url_id], self.depths[url_id]) for url_id in range(self.head, len(self.table)))
+
+
+class CrawlState:
+	"""
+	Frontier and results of a deep crawl.
+	Every operation the crawl loop performs per page or per link is O(1): visited pages,
+	summarized pages and broken links are indexed.
+	Page summaries and new broken links are passed to `report_sinks` (see reports.py) as
+	they are recorded. With `keep_results` set to False they are not kept in memory.
+	Memory is kept compact for large crawls: page URLs are interned to integer IDs, the
+	frontier is a range of those IDs, and results are stored as CompactRecord and
+	BrokenLinkRecord objects until the report asks for them. With `bloom_capacity`, the
+	visited pages are kept in a Bloom filter sized for that many pages instead: memory no
+	longer grows with the number of URLs, but a false positive skips a page.
+	"""
+
+	def __init__(self, report_sinks: list | None = None, keep_results: bool = True,
+				 bloom_capacity: int | None = None):
+		if bloom_capacity:
+			self.visited_urls = BloomFilter(bloom_capacity)  # Pages crawled or queued
+			self.queue = deque()  # (normalized URL, depth) pairs waiting to be crawled
+			self._summarized = None  # Each URL is queued only once, so pages cannot be summarized twice
+		else:
+			self.visited_urls = UrlTable()
+			self.queue = _TableQueue(self.visited_urls)
+			self._summarized = bytearray()  # One flag per URL ID
+		self._pages = []  # CompactRecord of each page summary, in crawl order
+		self._page_urls = []  # URL of each summarized page, by page index
+		self._broken_links = []  # BrokenLinkRecord of each broken link, in the order found
+		# (normalized link, status code) -> BrokenLinkRecord, or None if results are not kept
+		self._broken_links_index = {}
+		# Normalized link -> CompactRecord of its redirect chain, or None if results are not kept
+		self._redirect_chains = {}
+		self.report_sinks = report_sinks or []
+		self.keep_results = keep_results
+		self.pages_crawled = 0
+		self.broken_links_found = 0
+		self.total_unique_links_checked = 0
+		self.total_unique_assets_checked = 0
+		self.total_pages_not_modified = 0
+
+	def enqueue(self, url: str, depth: int):
+		"""
+		Adds a normalized page URL to the end of the frontier and marks it as visited.
+		"""
+		if self._summarized is None:
+			self.visited_urls.add(url)
+			self.queue.append((url, depth))
+		else:
+			self.queue.append(self.visited_urls.add(url), depth)
+			self._summarized.append(0)
+
+	def pop(self) -> tuple:
+		"""
+		Removes and returns the (url, depth) pair at the front of the frontier.
+		"""
+		return self.queue.popleft()
+
+	def is_summarized(self, url: str) -> bool:
+		"""
+		Returns True if a summary of the page has already been recorded.
+		"""
+		if self._summarized is None:
+			return False
+		url_id = self.visited_urls.get_id(url)
+		return url_id is not None and self._summarized[url_id] == 1
+
+	@property
+	def summarized_urls(self) -> list:
+		if self._summarized is None:
+			return []
+		return [url for url, summarized in zip(self.visited_urls.urls, self._summarized) if summarized]
+
+	@property
+	def crawled_pages_summary(self) -> list:
+		return [page.to_dict() for page in self._pages]
+
+	@property
+	def all_broken_links_detailed(self) -> list:
+		return [broken_link.to_dict(self._page_urls) for broken_link in self._broken_links]
+
+	@property
+	def redirect_chains(self) -> list:
+		return [chain.to_dict() for chain in self._redirect_chains.values() if chain is not None]
+
+	@property
+	def total_redirected_links(self) -> int:
+		return len(self._redirect_chains)
+
+	def add_page_summary(self, page_summary: dict):
+		self.pages_crawled += 1
+		if self._summarized is not None:
+			url_id = self.visited_urls.get_id(page_summary["url"])
+			if url_id is not None:
+				self._summarized[url_id] = 1
+		if self.keep_results:
+			self._pages.append(CompactRecord(page_summary))
+			self._page_urls.append(page_summary["url"])
+		for sink in self.report_sinks:
+			sink.write_page(page_summary)
+
+	def record_broken_link(self, link: str, normalized_link: str, status_code: int, status_message: str,
+						   source_page: str, depth: int, is_asset: bool = False) -> bool:
+		"""
+		Records a broken link (or asset) found on `source_page`, the page being processed.
+		Returns True if this (normalized link, status code) pair had not been recorded yet;
+		otherwise only adds `source_page` to the existing entry's source pages.
+		"""
+		# The page being processed gets the next page index once its summary is added
+		source_page_id = len(self._pages)
+		key = (normalized_link, status_code)
+		if key in self._broken_links_index:
+			record = self._broken_links_index[key]
+			# Pages are processed one at a time, so a repeated source page can only be the last one
+			if record is not None and record.last_source_page_id != source_page_id:
+				record.add_source_page_id(source_page_id)
+			return False
+
+		self.broken_links_found += 1
+		# Streamed records only know the first source page; the page records list the others
+		if self.report_sinks:
+			broken_link = {
+				"link": link,
+				"status_code": status_code,
+				"status_message": status_message,
+				"source_page": source_page,
+				"depth_found": depth
+			}
+			if is_asset:
+				broken_link["asset"] = True
+			for sink in self.report_sinks:
+				sink.write_broken_link(broken_link)
+
+		if self.keep_results:
+			record = BrokenLinkRecord(link, status_code, status_message, source_page, depth, source_page_id, is_asset)
+			self._broken_links.append(record)
+			self._broken_links_index[key] = record
+		else:
+			self._broken_links_index[key] = None
+		return True
+
+	def record_redirect_chain(self, link: str, normalized_link: str, chain: dict, source_page: str):
+		"""
+		Records the redirect chain (see redirects.RedirectCache.resolve) of a link found on
+		`source_page`. Only the first page a link is found on is kept, and streamed.
+		"""
+		if normalized_link in self._redirect_chains:
+			return
+		redirect_chain = {"link": link, "source_page": source_page}
+		redirect_chain.update(chain)
+		for sink in self.report_sinks:
+			sink.write_redirect_chain(redirect_chain)
+		self._redirect_chains[normalized_link] = CompactRecord(redirect_chain) if self.keep_results else None
+
+	def update_broken_link(self, normalized_link: str, status_code: int, new_status_code: int,
+						   new_status_message: str | None, normalize):
+		"""
+		Applies the result of checking a broken link again: the (normalized link, status code)
+		entry is removed if the link now works (`new_status_message` is None), otherwise it takes
+		the new status. The records of its source pages are updated the same way.
+		`normalize` is the URL normalization function used to match the page records' links.
+		Results already passed to the report sinks are not sent again.
+		"""
+		key = (normalized_link, status_code)
+		if key not in self._broken_links_index:
+			return
+		record = self._broken_links_index.pop(key)
+		new_key = (normalized_link, new_status_code)
+		# A link that now fails like an entry already recorded is merged into that entry
+		removed = new_status_message is None or new_key in self._broken_links_index
+		if removed:
+			self.broken_links_found -= 1
+		else:
+			self._broken_links_index[new_key] = record
+		if record is None:
+			return
+
+		source_page_ids = [record.source_page_ids] if isinstance(record.source_page_ids, int) else record.source_page_ids
+		for page_id in source_page_ids:
+			page_summary = self._pages[page_id].to_dict()
+			broken_links_on_page = []
+			for broken_link in page_summary["broken_links_on_page"]:
+				if broken_link["status_code"] == status_code and normalize(broken_link["link"]) == normalized_link:
+					if new_status_message is None:
+						continue
+					broken_link.update(status_code=new_status_code, status_message=new_status_message)
+				broken_links_on_page.append(broken_link)
+			page_summary["broken_links_on_page"] = broken_links_on_page
+			self._pages[page_id] = CompactRecord(page_summary)
+
+		if removed:
+			self._broken_links.remove(record)
+			merged_record = self._broken_links_index.get(new_key)
+			if merged_record is not None:
+				merged_page_ids = [merged_record.source_page_ids] if isinstance(merged_record.source_page_ids, int) \
+					else merged_record.source_page_ids
+				for page_id in source_page_ids:
+					if page_id not in merged_page_ids:
+						merged_record.add_source_page_id(page_id)
+		else:
+			record.status_code = new_status_code
+			record.status_message = new_status_message
+
+	def to_checkpoint(self) -> dict:
+		"""
+		Returns the state as a JSON-serializable dictionary for checkpoint.save_checkpoint.
+		"""
+		checkpoint = {
+			"queue": list(self.queue),
+			"crawled_pages_summary": self.crawled_pages_summary,
+			"all_broken_links_detailed": self.all_broken_links_detailed,
+			"redirect_chains": self.redirect_chains,
+			"pages_crawled": self.pages_crawled,
+			"broken_links_found": self.broken_links_found,
+			"total_unique_links_checked": self.total_unique_links_checked,
+			"total_unique_assets_checked": self.total_unique_assets_checked,
+			"total_pages_not_modified": self.total_pages_not_modified
+		}
+		if self._summarized is None:
+			checkpoint["visited_bloom"] = self.visited_urls.to_dict()
+		else:
+			checkpoint["visited_urls"] = list(self.visited_urls)
+		if not self.keep_results:
+			# The indexes cannot be rebuilt from results that were not kept
+			checkpoint["summarized_urls"] = self.summarized_urls
+			checkpoint["broken_link_keys"] = list(self._broken_links_index)
+			checkpoint["redirected_links"] = list(self._redirect_chains)
+		return checkpoint
+
+	@classmethod
+	def from_checkpoint(cls, checkpoint: dict, normalize, report_sinks: list | None = None,
+						keep_results: bool = True, bloom_capacity: int | None = None) -> 'CrawlState':
+		"""
+		Rebuilds a state, including its indexes, from a dictionary returned by to_checkpoint.
+		`normalize` is the URL normalization function used to index broken links.
+		Results recorded before the checkpoint are not sent to `report_sinks` again.
+		"""
+		if "visited_bloom" in checkpoint:
+			state = cls(report_sinks, keep_results, bloom_capacity=checkpoint["visited_bloom"]["capacity"])
+			state.visited_urls = BloomFilter.from_dict(checkpoint["visited_bloom"])
+			state.queue.extend((url, depth) for url, depth in checkpoint["queue"])
+		else:
+			state = cls(report_sinks, keep_results, bloom_capacity)
+			queued_urls = set(url for url, _ in checkpoint["queue"])
+			if bloom_capacity:
+				for url in checkpoint["visited_urls"]:
+					state.visited_urls.add(url)
+				state.queue.extend((url, depth) for url, depth in checkpoint["queue"])
+			else:
+				# Pages no longer queued come first, so the queued pages form the end of the URL table
+				for url in checkpoint["visited_urls"]:
+					if url not in queued_urls:
+						state.enqueue(url, 0)
+				state.queue.head = len(state.visited_urls)
+				for url, depth in checkpoint["queue"]:
+					state.enqueue(url, depth)
+
+		summarized_urls = checkpoint.get("summarized_urls") or \
+			[page_summary["url"] for page_summary in checkpoint["crawled_pages_summary"]]
+		if state._summarized is not None:
+			for url in summarized_urls:
+				url_id = state.visited_urls.get_id(url)
+				if url_id is not None:
+					state._summarized[url_id] = 1
+
+		page_ids = {}
+		if keep_results:
+			for page_summary in checkpoint["crawled_pages_summary"]:
+				page_ids[page_summary["url"]] = len(state._pages)
+				state._pages.append(CompactRecord(page_summary))
+				state._page_urls.append(page_summary["url"])
+		if "broken_link_keys" in checkpoint:
+			state._broken_links_index = {(link, status_code): None for link, status_code in checkpoint["broken_link_keys"]}
+		for entry in checkpoint["all_broken_links_detailed"]:
+			record = None
+			if keep_results:
+				source_page_ids = [page_ids[page] for page in entry.get("source_pages", [entry["source_page"]])]
+				record = BrokenLinkRecord(entry["link"], entry["status_code"], entry["status_message"],
+										  entry["source_page"], entry["depth_found"], source_page_ids[0],
+										  entry.get("asset", False))
+				for source_page_id in source_page_ids[1:]:
+					record.add_source_page_id(source_page_id)
+				state._broken_links.append(record)
+			state._broken_links_index[(normalize(entry["link"]), entry["status_code"])] = record
+		for normalized_link in checkpoint.get("redirected_links", []):
+			state._redirect_chains[normalized_link] = None
+		if keep_results:
+			for entry in checkpoint.get("redirect_chains", []):
+				state._redirect_chains[normalize(entry["link"])] = CompactRecord(entry)
+
+		state.pages_crawled = checkpoint.get("pages_crawled", len(checkpoint["crawled_pages_summary"]))
+		state.broken_links_found = checkpoint.get("broken_links_found", len(checkpoint["all_broken_links_detailed"]))
+		state.total_unique_links_checked = checkpoint["total_unique_links_checked"]
+		state.total_unique_assets_checked = checkpoint.get("total_unique_assets_checked", 0)
+		state.total_pages_not_modified = checkpoint.get("total_pages_not_modified", 0)
+		return state
@@ -0,0 +1,412 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from colorama import Fore, Style
+from cache import LinkStatusCache
+from extractor import extract_and_normalize_links, DEFAULT_EXTRACTOR_BACKEND
+from metrics import get_metrics
+from sitemap import get_sitemap_urls, iter_sitemap_page_urls
+from utils import fetch_page_content, check_links_status, fetch_robots_txt, get_host_scheduler, normalize_url, \
+	get_base_domain, USER_AGENT, DEFAULT_CONCURRENCY
+
+# Seconds a leased page stays assigned to a worker without a heartbeat before it goes back to the pool
+DEFAULT_LEASE_SECONDS = 120
+# Pages leased by a worker at a time
+DEFAULT_LEASE_BATCH = 20
+# Seconds an idle worker waits before looking for work again while other workers hold leases
+IDLE_POLL_SECONDS = 2.0
+
+
+def get_sort_key(depth: int, path: tuple) -> str:
+	"""
+	Encodes the position a page takes in a single-process (breadth-first) crawl.
+	`path` holds the link index on each page leading to the page: (0, i) for the i-th sitemap
+	page, (1, j, ...) for pages found from the start page, and () for the start page itself.
+	Keys compare as strings in the order a single-process crawl queues the pages.
+	"""
+	return f"{depth:04d}" + "".join(f"{index:08x}" for index in path)
+
+
+class SharedCrawlStore:
+	"""
+	Shared state of a distributed deep crawl, kept in a SQLite file all workers can open.
+	Holds the frontier (with worker leases), the links extracted from every crawled page and
+	the link statuses. It also serves as the persistent cache of each worker's LinkStatusCache,
+	so every link is checked once across all workers.
+	"""
+
+	def __init__(self, path: str):
+		self.path = path
+		self._lock = threading.Lock()
+		self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=60)
+		self._connection.execute("PRAGMA journal_mode=WAL")
+		self._connection.execute("PRAGMA synchronous=NORMAL")
+		self._connection.execute("CREATE TABLE IF NOT EXISTS crawl_settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+		self._connection.execute(
+			"CREATE TABLE IF NOT EXISTS frontier ("
+			"url TEXT PRIMARY KEY, depth INTEGER NOT NULL, sort_key TEXT NOT NULL, "
+			"state TEXT NOT NULL, lease_owner TEXT, lease_expires REAL)")
+		self._connection.execute("CREATE INDEX IF NOT EXISTS frontier_sort_key ON frontier (sort_key)")
+		self._connection.execute("CREATE INDEX IF NOT EXISTS frontier_state ON frontier (state, sort_key)")
+		# Frontier size and sort key of the last page within max_pages (NULL while the frontier is smaller),
+		# kept up to date as pages are queued and moved so leasing does not count pages
+		self._connection.execute("CREATE TABLE IF NOT EXISTS frontier_rank (size INTEGER NOT NULL, cutoff TEXT)")
+		self._connection.execute("CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, links TEXT)")
+		self._connection.execute(
+			"CREATE TABLE IF NOT EXISTS link_status (url TEXT PRIMARY KEY, status_code INTEGER NOT NULL)")
+		self.settings = self._load_settings()
+		self.is_crawlable = None  # Set by configure_filter(): decides which discovered pages are crawled
+
+	def _load_settings(self) -> dict:
+		with self._lock:
+			rows = self._connection.execute("SELECT key, value FROM crawl_settings").fetchall()
+		return {key: json.loads(value) for key, value in rows}
+
+	def initialize(self, start_url: str, max_depth: int, max_pages: int, timeout: int, respect_robots: bool):
+		"""
+		Stores the crawl settings and queues the start page. Initializing a store that already
+		holds the same crawl continues it, with a new deadline.
+		"""
+		if self.settings and self.settings["start_url"] != start_url:
+			raise ValueError(f"'{self.path}' belongs to a crawl of {self.settings['start_url']}")
+		settings = {
+			"start_url": start_url,
+			"max_depth": max_depth,
+			"max_pages": max_pages,
+			"deadline": time.time() + timeout,
+			"respect_robots": respect_robots
+		}
+		normalized_start_url = normalize_url(start_url)
+		with self._lock:
+			self._connection.execute("BEGIN IMMEDIATE")
+			self._connection.executemany(
+				"INSERT OR REPLACE INTO crawl_settings (key, value) VALUES (?, ?)",
+				[(key, json.dumps(value)) for key, value in settings.items()])
+			self._connection.execute(
+				"INSERT OR IGNORE INTO frontier (url, depth, sort_key, state) VALUES (?, 0, ?, 'pending')",
+				(normalized_start_url, get_sort_key(0, ())))
+			# max_pages may differ from the crawl being continued
+			(size,) = self._connection.execute("SELECT COUNT(*) FROM frontier").fetchone()
+			cutoff_row = self._connection.execute(
+				"SELECT sort_key FROM frontier ORDER BY sort_key LIMIT 1 OFFSET ?", (max_pages - 1,)).fetchone()
+			self._connection.execute("DELETE FROM frontier_rank")
+			self._connection.execute(
+				"INSERT INTO frontier_rank (size, cutoff) VALUES (?, ?)", (size, cutoff_row[0] if cutoff_row else None))
+			self._connection.execute("COMMIT")
+		self.settings = settings
+
+	def configure_filter(self, is_crawlable):
+		"""
+		Sets the function deciding whether a discovered normalized URL is a page of the crawl.
+		"""
+		self.is_crawlable = is_crawlable
+
+	def add_seed_pages(self, page_urls: list):
+		"""
+		Queues sitemap pages (normalized URLs) at depth 1, ahead of the pages linked from the start page.
+		"""
+		with self._lock:
+			self._connection.execute("BEGIN IMMEDIATE")
+			for index, page_url in enumerate(page_urls):
+				self._offer_page(page_url, 1, (0, index))
+			self._connection.execute("COMMIT")
+
+	def _offer_page(self, url: str, depth: int, path: tuple):
+		"""
+		Queues a page, or moves an already known page to an earlier position. When a crawled page
+		moves, the pages it links to move with it. Must be called with the lock held, in a transaction.
+		"""
+		pending = [(url, depth, path)]
+		while pending:
+			url, depth, path = pending.pop()
+			sort_key = get_sort_key(depth, path)
+			row = self._connection.execute("SELECT sort_key, state FROM frontier WHERE url = ?", (url,)).fetchone()
+			if row is None:
+				self._connection.execute(
+					"INSERT INTO frontier (url, depth, sort_key, state) VALUES (?, ?, ?, 'pending')",
+					(url, depth, sort_key))
+				self._update_rank(sort_key)
+				continue
+			if sort_key >= row[0]:
+				continue
+			self._connection.execute("UPDATE frontier SET depth = ?, sort_key = ? WHERE url = ?", (depth, sort_key, url))
+			self._update_rank(sort_key, row[0])
+			if row[1] == 'done':
+				links_row = self._connection.execute("SELECT links FROM pages WHERE url = ?", (url,)).fetchone()
+				if links_row and links_row[0] is not None:
+					pending.extend(self._get_linked_pages(json.loads(links_row[0]), depth, path))
+
+	def _update_rank(self, sort_key: str, old_sort_key: str | None = None):
+		"""
+		Updates frontier_rank after a page was queued at `sort_key`, or moved there from
+		`old_sort_key`. Must be called with the lock held, in a transaction.
+		"""
+		size, cutoff = self._connection.execute("SELECT size, cutoff FROM frontier_rank").fetchone()
+		if old_sort_key is None:
+			size += 1
+		if cutoff is None:
+			if size >= self.settings["max_pages"]:
+				(cutoff,) = self._connection.execute("SELECT MAX(sort_key) FROM frontier").fetchone()
+		elif sort_key < cutoff and (old_sort_key is None or old_sort_key >= cutoff):
+			# One more page comes before the cutoff, so the page just before it becomes the last one within max_pages
+			(cutoff,) = self._connection.execute(
+				"SELECT MAX(sort_key) FROM frontier WHERE sort_key < ?", (cutoff,)).fetchone()
+		self._connection.execute("UPDATE frontier_rank SET size = ?, cutoff = ?", (size, cutoff))
+
+	def _get_linked_pages(self, links: list, depth: int, path: tuple) -> list:
+		"""
+		Returns the (url, depth, path) entries of the crawl pages linked from a page.
+		"""
+		if depth + 1 > self.settings["max_depth"]:
+			return []
+		linked_pages = []
+		for index, link in enumerate(links):
+			normalized_link = normalize_url(link)
+			if self.is_crawlable(normalized_link):
+				# Pages linked from the start page come after the sitemap pages, see get_sort_key()
+				linked_pages.append((normalized_link, depth + 1, path + (index,) if path else (1, index)))
+		return linked_pages
+
+	def lease_pages(self, owner: str, count: int, lease_seconds: float) -> list:
+		"""
+		Assigns up to `count` pages to a worker and returns their (url, depth, sort_key) entries.
+		Pages are leased in crawl order, including pages whose lease has expired. Pages that
+		cannot be among the first `max_pages` pages of the crawl are not leased.
+		"""
+		now = time.time()
+		with self._lock:
+			self._connection.execute("BEGIN IMMEDIATE")
+			candidates = self._connection.execute(
+				"SELECT url, depth, sort_key FROM frontier WHERE state = 'leased' AND lease_expires < ? "
+				"ORDER BY sort_key LIMIT ?", (now, count)).fetchall()
+			candidates += self._connection.execute(
+				"SELECT url, depth, sort_key FROM frontier WHERE state = 'pending' ORDER BY sort_key LIMIT ?",
+				(count,)).fetchall()
+			candidates.sort(key=lambda candidate: candidate[2])
+			(cutoff,) = self._connection.execute("SELECT cutoff FROM frontier_rank").fetchone()
+			leased = []
+			for url, depth, sort_key in candidates[:count]:
+				# Known pages only move forward, so a page with max_pages pages before it stays outside the crawl
+				if cutoff is not None and sort_key > cutoff:
+					break
+				self._connection.execute(
+					"UPDATE frontier SET state = 'leased', lease_owner = ?, lease_expires = ? WHERE url = ?",
+					(owner, now + lease_seconds, url))
+				leased.append((url, depth, sort_key))
+			self._connection.execute("COMMIT")
+		return leased
+
+	def renew_leases(self, owner: str, lease_seconds: float):
+		"""
+		Heartbeat: extends the leases a worker holds.
+		"""
+		with self._lock:
+			self._connection.execute(
+				"UPDATE frontier SET lease_expires = ? WHERE state = 'leased' AND lease_owner = ?",
+				(time.time() + lease_seconds, owner))
+
+	def has_active_leases(self) -> bool:
+		with self._lock:
+			row = self._connection.execute(
+				"SELECT 1 FROM frontier WHERE state = 'leased' AND lease_expires >= ? LIMIT 1", (time.time(),)).fetchone()
+		return row is not None
+
+	def commit_page(self, url: str, links: list | None):
+		"""
+		Stores the links extracted from a crawled page (None if it could not be fetched),
+		marks it as done and queues the crawl pages it links to.
+		"""
+		with self._lock:
+			self._connection.execute("BEGIN IMMEDIATE")
+			self._connection.execute(
+				"INSERT OR IGNORE INTO pages (url, links) VALUES (?, ?)",
+				(url, json.dumps(links) if links is not None else None))
+			row = self._connection.execute("SELECT depth, sort_key FROM frontier WHERE url = ?", (url,)).fetchone()
+			self._connection.execute(
+				"UPDATE frontier SET state = 'done', lease_owner = NULL, lease_expires = NULL WHERE url = ?", (url,))
+			if links is not None:
+				depth, sort_key = row
+				for linked_url, linked_depth, linked_path in self._get_linked_pages(links, depth, _decode_path(sort_key)):
+					self._offer_page(linked_url, linked_depth, linked_path)
+			self._connection.execute("COMMIT")
+
+	def get_page_links(self, url: str) -> tuple | None:
+		"""
+		Returns (links, normalized links) stored for a crawled page, with links set to None if the
+		page could not be fetched, or None if the page has not been crawled.
+		"""
+		with self._lock:
+			row = self._connection.execute("SELECT links FROM pages WHERE url = ?", (url,)).fetchone()
+		if row is None:
+			return None
+		if row[0] is None:
+			return None, None
+		links = json.loads(row[0])
+		return links, [normalize_url(link) for link in links]
+
+	def get(self, key: str) -> int | None:
+		"""
+		Returns the status code stored for a normalized URL, or None.
+		"""
+		with self._lock:
+			row = self._connection.execute("SELECT status_code FROM link_status WHERE url = ?", (key,)).fetchone()
+		return row[0] if row else None
+
+	def set(self, key: str, status_code: int):
+		"""
+		Stores the status code of a normalized URL. The first stored status wins.
+		"""
+		with self._lock:
+			self._connection.execute(
+				"INSERT OR IGNORE INTO link_status (url, status_code) VALUES (?, ?)", (key, status_code))
+
+	def close(self):
+		with self._lock:
+			self._connection.close()
+
+
+def _decode_path(sort_key: str) -> tuple:
+	# Inverse of get_sort_key(), without the depth
+	return tuple(int(sort_key[i:i + 8], 16) for i in range(4, len(sort_key), 8))
+
+
+def _configure_page_filter(store: SharedCrawlStore):
+	"""
+	Applies the crawl's page rules (same site, robots.txt, Crawl-delay) to a store and returns the robots.txt.
+	"""
+	normalized_start_url = normalize_url(store.settings["start_url"])
+	base_domain = get_base_domain(normalized_start_url)
+	robots = fetch_robots_txt(normalized_start_url)
+	crawl_delay = robots.crawl_delay(USER_AGENT) if robots else None
+	if crawl_delay:
+		get_host_scheduler().set_crawl_delay(normalized_start_url, float(crawl_delay))
+	respect_robots = store.settings["respect_robots"] and robots is not None
+
+	def is_crawlable(url):
+		return get_base_domain(url) == base_domain and (not respect_robots or robots.can_fetch(USER_AGENT, url))
+
+	store.configure_filter(is_crawlable)
+	return robots
+
+
+def run_worker(store: SharedCrawlStore, page_workers: int, concurrency: int = DEFAULT_CONCURRENCY,
+			   extractor_backend: str = DEFAULT_EXTRACTOR_BACKEND, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+			   lease_batch: int = DEFAULT_LEASE_BATCH) -> int:
+	"""
+	Crawls pages of a distributed crawl until no page is left or the crawl's deadline passes.
+	Leased pages are fetched `page_workers` at a time, their links are checked and the results
+	are committed to the store. Leases are renewed by a heartbeat thread, so they only expire
+	(and go back to the pool) if the worker dies. Returns the number of pages this worker crawled.
+	"""
+	if not store.settings:
+		raise ValueError(f"'{store.path}' does not hold a crawl; start the coordinator first")
+	if store.is_crawlable is None:
+		_configure_page_filter(store)
+
+	owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+	metrics = get_metrics()
+	metrics.reset()
+	stop_heartbeat = threading.Event()
+
+	def heartbeat():
+		while not stop_heartbeat.wait(lease_seconds / 3):
+			store.renew_leases(owner, lease_seconds)
+
+	def fetch_and_extract(page_url):
+		content = fetch_page_content(page_url)
+		if not content:
+			return None
+		links, _, _, (parse_seconds, normalize_seconds) = extract_and_normalize_links(content, page_url, extractor_backend)
+		metrics.observe('parse', parse_seconds)
+		metrics.observe('normalize', normalize_seconds)
+		return links
+
+	print(f"{Fore.MAGENTA}Worker {owner} joined the crawl of {store.settings['start_url']}.{Style.RESET_ALL}")
+	pages_crawled = 0
+	heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+	heartbeat_thread.start()
+	try:
+		with ThreadPoolExecutor(max_workers=max(1, page_workers)) as fetch_executor:
+			while time.time() < store.settings["deadline"]:
+				leased_pages = store.lease_pages(owner, lease_batch, lease_seconds)
+				if not leased_pages:
+					if not store.has_active_leases():
+						break  # Nothing queued and nobody crawling: the crawl is complete
+					time.sleep(IDLE_POLL_SECONDS)  # Other workers may still find new pages
+					continue
+
+				page_urls = [page_url for page_url, _, _ in leased_pages]
+				for page_url, links in zip(page_urls, fetch_executor.map(fetch_and_extract, page_urls)):
+					if links is not None:
+						# Statuses end up in the store, where the coordinator's report reads them
+						unique_links = list({normalize_url(link): link for link in reversed(links)}.values())
+						check_links_status(unique_links, concurrency=concurrency, status_cache=LinkStatusCache(store))
+					store.commit_page(page_url, links)
+					metrics.count_page(len(links) if links is not None else 0)
+					pages_crawled += 1
+					print(f"{Fore.BLUE}Worker {owner} crawled: {page_url}{Style.RESET_ALL}")
+	finally:
+		stop_heartbeat.set()
+		heartbeat_thread.join()
+
+	print(f"{Fore.MAGENTA}Worker {owner} finished after crawling {pages_crawled} pages.{Style.RESET_ALL}")
+	return pages_crawled
+
+
+def run_coordinator(store: SharedCrawlStore, start_url: str, max_depth: int, max_pages: int, timeout: int,
+					page_workers: int, concurrency: int = DEFAULT_CONCURRENCY,
+					extractor_backend: str = DEFAULT_EXTRACTOR_BACKEND, seed_sitemaps: bool = False,
+					respect_robots: bool = True, report_sinks: list | None = None, keep_results: bool = True) -> dict:
+	"""
+	Runs a distributed deep crawl: sets up the shared store, crawls as one of its workers until
+	all workers are done, then builds the report.
+	The report is built by replaying the regular crawl over the stored pages and link statuses,
+	so it is identical to the report of a single-process crawl. The replay fetches no pages: pages
+	missing from the store (after the deadline) are left out, and links without a stored status
+	are only checked within what is left before the deadline.
+	"""
+	from audit import crawl_site_for_broken_links
+
+	store.initialize(start_url, max_depth, max_pages, timeout, respect_robots)
+	robots = _configure_page_filter(store)
+
+	if seed_sitemaps and max_depth >= 1:
+		normalized_start_url = normalize_url(start_url)
+		seed_pages = {normalized_start_url: None}
+		for page_url in iter_sitemap_page_urls(get_sitemap_urls(normalized_start_url, robots)):
+			if len(seed_pages) >= max_pages:
+				break
+			normalized_page_url = normalize_url(page_url)
+			if normalized_page_url not in seed_pages and store.is_crawlable(normalized_page_url):
+				seed_pages[normalized_page_url] = None
+		store.add_seed_pages(list(seed_pages)[1:])
+		print(f"{Fore.MAGENTA}Seeded {len(seed_pages) - 1} pages from sitemaps.{Style.RESET_ALL}")
+
+	run_worker(store, page_workers, concurrency, extractor_backend)
+
+	print(f"{Fore.MAGENTA}All workers finished. Building the report from '{store.path}'...{Style.RESET_ALL}")
+	crawl_metrics = get_metrics().snapshot()
+	report = crawl_site_for_broken_links(
+		start_url=start_url,
+		max_depth=max_depth,
+		max_pages=max_pages,
+		timeout=max(0, store.settings["deadline"] - time.time()),
+		concurrency=concurrency,
+		page_workers=page_workers,
+		persistent_cache=store,
+		extractor_backend=extractor_backend,
+		report_sinks=report_sinks,
+		keep_results=keep_results,
+		seed_sitemaps=seed_sitemaps,
+		respect_robots=respect_robots,
+		page_fetcher=store.get_page_links,
+		replay=True
+	)
+	# The replay fetches nothing, so report the metrics of this process's share of the crawl instead
+	report["metrics"] = crawl_metrics
+	return report
@@ -0,0 +1,314 @@
+import re
+import time
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+from utils import normalize_url
+
+try:
+	from lxml import etree
+except ImportError:  # lxml is optional; only the 'lxml' backend needs it
+	etree = None
+
+# Available link extraction backends:
+# - 'stream': single pass over the HTML with the standard library tokenizer, no tree is built (default)
+# - 'lxml':   single pass with lxml's C parser feeding events to a target, no tree is built (requires lxml).
+#             Follows the HTML spec more closely, so a few malformed pages differ from the other
+#             backends (e.g. the first of duplicate href attributes wins, <textarea> content is text).
+# - 'bs4':    full BeautifulSoup tree, as used before the streaming extractor existed
+# Without lxml installed, the 'lxml' backend is not offered.
+EXTRACTOR_BACKENDS = ('stream', 'lxml', 'bs4') if etree is not None else ('stream', 'bs4')
+DEFAULT_EXTRACTOR_BACKEND = 'stream'
+
+# Tag attributes holding the URL of an asset: assets are checked but never crawled.
+# Attributes named srcset hold a list of image candidates.
+DEFAULT_ASSET_ATTRIBUTES = {
+	'img': ('src', 'srcset'),
+	'source': ('src', 'srcset'),
+	'script': ('src',),
+	'link': ('href',),
+	'iframe': ('src',),
+	'video': ('src', 'poster'),
+	'audio': ('src',),
+	'track': ('src',),
+	'embed': ('src',),
+	'object': ('data',)
+}
+
+# <link rel> values whose href is an asset (canonical, alternate, preconnect, etc. are not)
+ASSET_LINK_RELS = frozenset(['stylesheet', 'icon', 'apple-touch-icon', 'mask-icon', 'manifest', 'preload',
+							 'modulepreload', 'prefetch'])
+
+_CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+_CSS_URL_RE = re.compile(r'url\(\s*(?:"([^"]*)"|\'([^\']*)\'|([^)\s]*))\s*\)|@import\s+(?:"([^"]*)"|\'([^\']*)\')', re.I)
+
+
+def parse_asset_attributes(specs: list) -> dict:
+	"""
+	Parses asset attribute specifications such as 'img:src,srcset' into a {tag: attributes} dictionary.
+	"""
+	asset_attributes = {}
+	for spec in specs:
+		tag, separator, attributes = spec.partition(':')
+		attributes = tuple(attribute.strip().lower() for attribute in attributes.split(',') if attribute.strip())
+		if not separator or not tag.strip() or not attributes:
+			raise ValueError(f"Invalid asset attribute specification '{spec}' (expected TAG:ATTRIBUTE[,ATTRIBUTE...])")
+		tag = tag.strip().lower()
+		asset_attributes[tag] = asset_attributes.get(tag, ()) + attributes
+	return asset_attributes
+
+
+def _parse_srcset(srcset: str) -> list:
+	"""
+	Returns the URLs of the image candidates of a srcset attribute ('a.png 1x, b.png 2x').
+	"""
+	urls = []
+	position, length = 0, len(srcset)
+	while position < length:
+		while position < length and (srcset[position].isspace() or srcset[position] == ','):
+			position += 1
+		start = position
+		while position < length and not srcset[position].isspace():
+			position += 1
+		url = srcset[start:position]
+		if url.endswith(','):
+			url = url.rstrip(',')  # A candidate without descriptors
+		else:
+			# Skip the descriptors; a comma inside parentheses does not end the candidate
+			depth = 0
+			while position < length and (srcset[position] != ',' or depth):
+				if srcset[position] == '(':
+					depth += 1
+				elif srcset[position] == ')':
+					depth = max(0, depth - 1)
+				position += 1
+		if url:
+			urls.append(url)
+	return urls
+
+
+def extract_css_urls(css: str, base_url: str) -> list:
+	"""
+	Returns the absolute http(s) URLs referenced by url() and @import in a stylesheet, in order.
+	Relative references are resolved against `base_url`, the stylesheet's own URL.
+	"""
+	urls = []
+	for match in _CSS_URL_RE.finditer(_CSS_COMMENT_RE.sub('', css)):
+		reference = next((group for group in match.groups() if group is not None), '').strip()
+		full_url = _resolve_url(base_url, reference) if reference else None
+		if full_url is not None:
+			urls.append(full_url)
+	return urls
+
+
+class _LinkCollector:
+	"""
+	Collects <a href> values and the first <base href> from start tag events, and with
+	`asset_attributes` also asset URLs ((URL, is stylesheet) pairs) and <style> contents.
+	Also serves as the parser target of the lxml backend.
+	"""
+
+	def __init__(self, asset_attributes: dict | None = None):
+		self.hrefs = []
+		self.base_href = None
+		self.asset_attributes = asset_attributes or {}
+		self.assets = []
+		self.styles = []
+		self.in_style = False
+
+	def start(self, tag: str, attrs: dict):
+		if tag == 'a':
+			href = attrs.get('href')
+			if href is not None:
+				self.hrefs.append(href)
+		elif tag == 'base' and self.base_href is None:
+			self.base_href = attrs.get('href')
+
+		if not self.asset_attributes:
+			return
+		if tag == 'style':
+			self.in_style = True
+		attributes = self.asset_attributes.get(tag)
+		if attributes is None:
+			return
+		is_stylesheet = False
+		if tag == 'link':
+			rels = set((attrs.get('rel') or '').lower().split())
+			if not rels & ASSET_LINK_RELS:
+				return
+			is_stylesheet = 'stylesheet' in rels
+		for attribute in attributes:
+			value = attrs.get(attribute)
+			if not value:
+				continue
+			if attribute.endswith('srcset'):
+				self.assets.extend((url, False) for url in _parse_srcset(value))
+			else:
+				self.assets.append((value.strip(), is_stylesheet and attribute == 'href'))
+
+	def end(self, tag: str):
+		if tag == 'style':
+			self.in_style = False
+
+	def data(self, data: str):
+		if self.in_style:
+			self.styles.append(data)
+
+	def close(self):
+		return None
+
+
+class _StreamLinkParser(HTMLParser):
+	"""
+	Incremental tokenizer passing start tags to a _LinkCollector.
+	"""
+
+	def __init__(self, collector: _LinkCollector):
+		super().__init__(convert_charrefs=True)
+		self.collector = collector
+
+	def handle_starttag(self, tag, attrs):
+		if tag == 'a' or tag == 'base':
+			# Valueless attributes (<a href>) are reported as None; a repeated attribute keeps its last value
+			self.collector.start(tag, {name: value if value is not None else '' for name, value in attrs})
+
+
+class _StreamAssetParser(_StreamLinkParser):
+	"""
+	_StreamLinkParser also passing asset tags and <style> contents, used when assets are extracted.
+	"""
+
+	def __init__(self, collector: _LinkCollector):
+		super().__init__(collector)
+		self.tags = frozenset(['a', 'base', 'style']) | frozenset(collector.asset_attributes)
+
+	def handle_starttag(self, tag, attrs):
+		if tag in self.tags:
+			self.collector.start(tag, {name: value if value is not None else '' for name, value in attrs})
+
+	def handle_endtag(self, tag):
+		if tag == 'style':
+			self.collector.end(tag)
+
+	def handle_data(self, data):
+		if self.collector.in_style:
+			self.collector.data(data)
+
+
+def _collect_stream(content: str, asset_attributes: dict | None = None) -> _LinkCollector:
+	collector = _LinkCollector(asset_attributes)
+	parser = _StreamAssetParser(collector) if asset_attributes else _StreamLinkParser(collector)
+	parser.feed(content)
+	parser.close()
+	return collector
+
+
+def _collect_lxml(content: str, asset_attributes: dict | None = None) -> _LinkCollector:
+	if etree is None:
+		raise ValueError("The 'lxml' link extraction backend requires the lxml package.")
+	collector = _LinkCollector(asset_attributes)
+	parser = etree.HTMLParser(target=collector)
+	parser.feed(content)
+	parser.close()
+	return collector
+
+
+def _collect_bs4(content: str, asset_attributes: dict | None = None) -> _LinkCollector:
+	collector = _LinkCollector(asset_attributes)
+	soup = BeautifulSoup(content, 'html.parser')
+	base_tag = soup.find('base', href=True)
+	if base_tag is not None:
+		collector.base_href = base_tag['href']
+	collector.hrefs = [a_tag['href'] for a_tag in soup.find_all('a', href=True)]
+	if asset_attributes:
+		for tag in soup.find_all(['style'] + list(asset_attributes)):
+			# Multi-valued attributes such as rel are lists in BeautifulSoup
+			attrs = {name: ' '.join(value) if isinstance(value, list) else value for name, value in tag.attrs.items()}
+			if tag.name != 'a' and tag.name != 'base':
+				collector.start(tag.name, attrs)
+			if tag.name == 'style':
+				collector.data(tag.get_text())
+				collector.end('style')
+	return collector
+
+
+_COLLECTORS = {
+	'stream': _collect_stream,
+	'lxml': _collect_lxml,
+	'bs4': _collect_bs4
+}
+
+
+def _resolve_url(base_url: str, href: str) -> str | None:
+	# Absolute http(s) URL of a reference, or None for other schemes (mailto:, data:, ...) and invalid URLs
+	if href.startswith('http://') or href.startswith('https://'):
+		return href
+	try:
+		full_url = urljoin(base_url, href)
+	except ValueError:
+		return None
+	return full_url if full_url.startswith(('http://', 'https://')) else None
+
+
+def extract_page_urls(content: str, page_url: str, backend: str = DEFAULT_EXTRACTOR_BACKEND,
+					  asset_attributes: dict | None = None) -> tuple:
+	"""
+	Returns (links, assets) for an HTML document: the absolute http(s) URLs of all <a href>
+	links in page order, and with `asset_attributes` ({tag: attributes}, see
+	DEFAULT_ASSET_ATTRIBUTES) the (URL, is stylesheet) pairs of its assets, including the url()
+	references of its <style> elements. Without `asset_attributes`, assets is empty.
+	Relative URLs are resolved against the document's <base href> if present, else `page_url`.
+	"""
+	try:
+		collect = _COLLECTORS[backend]
+	except KeyError:
+		raise ValueError(f"Unknown link extraction backend: {backend}")
+
+	collector = collect(content, asset_attributes)
+
+	base_url = page_url
+	if collector.base_href:
+		try:
+			base_url = urljoin(page_url, collector.base_href)
+		except ValueError:
+			pass
+
+	links = []
+	for href in collector.hrefs:
+		full_url = _resolve_url(base_url, href)
+		if full_url is not None:
+			links.append(full_url)
+
+	assets = []
+	for href, is_stylesheet in collector.assets:
+		full_url = _resolve_url(base_url, href)
+		if full_url is not None:
+			assets.append((full_url, is_stylesheet))
+	for style in collector.styles:
+		assets.extend((url, False) for url in extract_css_urls(style, base_url))
+
+	return links, assets
+
+
+def extract_links(content: str, page_url: str, backend: str = DEFAULT_EXTRACTOR_BACKEND) -> list:
+	"""
+	Returns the absolute http(s) URLs of all <a href> links in an HTML document, in page order.
+	Relative links are resolved against the document's <base href> if present, else `page_url`.
+	"""
+	return extract_page_urls(content, page_url, backend)[0]
+
+
+def extract_and_normalize_links(content: str, page_url: str, backend: str = DEFAULT_EXTRACTOR_BACKEND,
+								asset_attributes: dict | None = None) -> tuple:
+	"""
+	Returns (links, normalized links, assets, (parse seconds, normalize seconds)) for an HTML
+	document; the links are two parallel lists in page order, and assets are the (URL, is
+	stylesheet) pairs of extract_page_urls.
+	This is the unit of work of the parsing process pool, so it only returns compact string lists,
+	and its timings travel back with the result.
+	"""
+	start = time.perf_counter()
+	links, assets = extract_page_urls(content, page_url, backend, asset_attributes)
+	parsed_at = time.perf_counter()
+	normalized_links = [normalize_url(link) for link in links]
+	return links, normalized_links, assets, (parsed_at - start, time.perf_counter() - parsed_at)
\ No newline at end of file
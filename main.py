@@ -1,11 +1,22 @@
 
 import argparse
+import logging
 import sys
 import json
 import os
 from datetime import datetime
 from colorama import init, Fore, Style
-from audit import check_broken_links, crawl_site_for_broken_links
+from audit import check_broken_links, crawl_site_for_broken_links, DEFAULT_PAGE_WORKERS
+from utils import DEFAULT_CONCURRENCY, DEFAULT_POOL_CONNECTIONS, DEFAULT_POOL_MAXSIZE, \
+	DEFAULT_RETRIES, configure_http_client, configure_host_scheduler, configure_timeout_policy
+from scheduler import DEFAULT_HOST_RATE, DEFAULT_HOST_CONCURRENCY
+from cache import PersistentStatusCache, PageCache, DEFAULT_CACHE_PATH
+from checkpoint import load_checkpoint, DEFAULT_CHECKPOINT_INTERVAL
+from extractor import EXTRACTOR_BACKENDS, DEFAULT_EXTRACTOR_BACKEND, DEFAULT_ASSET_ATTRIBUTES, parse_asset_attributes
+from reports import NdjsonReportWriter, CsvBrokenLinkWriter
+from distributed import SharedCrawlStore, run_coordinator, run_worker
+from metrics import get_metrics, start_metrics_server
+from batch import read_url_file, run_batch, DEFAULT_PARALLEL_SITES
 
 # Initialize colorama for colored terminal output (especially for Windows)
 init()
@@ -14,6 +25,142 @@ init()
 REPORT_DIR = "reports"  # Changed from 'report' to 'reports' for better naming
 
 
+def ensure_report_dir():
+	# Create reports directory if it doesn't exist
+	if not os.path.exists(REPORT_DIR):
+		os.makedirs(REPORT_DIR)
+		print(f"{Fore.GREEN}Directory '{REPORT_DIR}' created.{Style.RESET_ALL}")
+
+
+def get_report_basename(target_url: str, scan_type: int, current_time: str) -> str:
+	# Sanitize URL for filename and add timestamp
+	# Removes scheme, replaces special chars with underscores, removes trailing underscore
+	sanitized_url = target_url.replace("https://", "").replace("http://", "").replace("/", "_").replace(":",
+																										"_").replace(
+		".", "_").strip('_')
+
+	# Add scan type to filename for clarity
+	scan_type_name = "single_page" if scan_type == 0 else "deep_crawl"
+	return f"{sanitized_url}-{scan_type_name}-{current_time}"
+
+
+def open_caches(args) -> tuple:
+	"""
+	Opens the link status cache and, with --incremental, the page cache; returns (status cache, page cache).
+	A cache that cannot be opened is reported and replaced by None.
+	"""
+	persistent_cache = None
+	if not args.no_cache:
+		try:
+			persistent_cache = PersistentStatusCache(args.cache_path)
+		except Exception as e:
+			print(f"{Fore.YELLOW}Warning: Unable to open link status cache '{args.cache_path}': {e}. Continuing without it.{Style.RESET_ALL}")
+
+	page_cache = None
+	if args.incremental:
+		try:
+			page_cache = PageCache(args.cache_path)
+		except Exception as e:
+			print(f"{Fore.YELLOW}Warning: Unable to open page cache '{args.cache_path}': {e}. Crawling all pages in full.{Style.RESET_ALL}")
+	return persistent_cache, page_cache
+
+
+def run_batch_mode(args, asset_attributes: dict | None = None):
+	"""
+	Audits every site listed in --url-file, then saves one report per site and a combined summary.
+	"""
+	try:
+		urls = read_url_file(args.url_file)
+	except OSError as e:
+		print(f"{Fore.RED}Error: Unable to read URL file '{args.url_file}': {e}{Style.RESET_ALL}")
+		sys.exit(1)
+	if not urls:
+		print(f"{Fore.RED}Error: '{args.url_file}' does not list any URL.{Style.RESET_ALL}")
+		sys.exit(1)
+
+	scan_type = 1 if args.scan_type is None else args.scan_type  # Batches never prompt
+	current_time = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+	persistent_cache, page_cache = open_caches(args)
+	ensure_report_dir()
+
+	# URLs differing only in their scheme or punctuation sanitize to the same name: later ones get their position
+	report_basenames = {}
+	used_basenames = set()
+	for site_number, url in enumerate(urls, 1):
+		report_basename = get_report_basename(url, scan_type, current_time)
+		if report_basename in used_basenames:
+			report_basename = f"{report_basename}-{site_number}"
+		used_basenames.add(report_basename)
+		report_basenames[url] = report_basename
+
+	def open_report_sinks(url):
+		report_basename = report_basenames[url]
+		report_sinks = []
+		if args.output_format == 'ndjson':
+			report_sinks.append(NdjsonReportWriter(os.path.join(REPORT_DIR, f"{report_basename}.ndjson")))
+		if args.csv_report:
+			report_sinks.append(CsvBrokenLinkWriter(os.path.join(REPORT_DIR, f"{report_basename}.csv")))
+		return report_sinks
+
+	def save_report(url, report):
+		if args.output_format == 'ndjson':
+			return None  # The records were streamed to the site's NDJSON file
+		report_filepath = os.path.join(REPORT_DIR, f"{report_basenames[url]}.json")
+		try:
+			with open(report_filepath, 'w', encoding='utf-8') as f:
+				json.dump(report, f, indent=4, ensure_ascii=False)
+		except Exception as e:
+			print(f"{Fore.RED}Error saving report of {url}: {e}{Style.RESET_ALL}")
+			return None
+		return report_filepath
+
+	try:
+		summary = run_batch(
+			urls,
+			scan_type=scan_type,
+			max_depth=5,  # Same fixed maximum depth as single deep crawls
+			max_pages=args.max_pages,
+			timeout=args.timeout,
+			concurrency=args.concurrency,
+			page_workers=args.page_workers,
+			parallel_sites=args.parallel_sites,
+			persistent_cache=persistent_cache,
+			extractor_backend=args.link_extractor,
+			asset_attributes=asset_attributes,
+			open_report_sinks=open_report_sinks,
+			save_report=save_report,
+			page_cache=page_cache,
+			parse_workers=args.parse_workers,
+			keep_results=args.output_format != 'ndjson',
+			seed_sitemaps=args.sitemaps,
+			respect_robots=not args.ignore_robots,
+			bloom_capacity=args.bloom_capacity
+		)
+	finally:
+		if persistent_cache is not None:
+			persistent_cache.close()
+		if page_cache is not None:
+			page_cache.close()
+
+	summary_filepath = os.path.join(REPORT_DIR, f"batch-summary-{current_time}.json")
+	try:
+		with open(summary_filepath, 'w', encoding='utf-8') as f:
+			json.dump(summary, f, indent=4, ensure_ascii=False)
+		print(f"{Fore.GREEN}Batch summary saved to '{summary_filepath}'.{Style.RESET_ALL}")
+	except Exception as e:
+		print(f"{Fore.RED}Error saving batch summary: {e}{Style.RESET_ALL}")
+
+	print(f"\n{Fore.YELLOW}Batch summary:{Style.RESET_ALL}")
+	for site in summary["sites"]:
+		if "broken_links" in site:
+			print(f"- {site['url']}: {site['pages_crawled']} pages, {site['links_checked']} links checked, "
+				  f"{site['broken_links']} broken. {site['status']}")
+		else:
+			print(f"- {site['url']}: {Fore.RED}{site['status']}{Style.RESET_ALL}")
+	print(f"{Fore.MAGENTA}{summary['total_sites_completed']} of {summary['total_sites']} sites audited, "
+		  f"{summary['total_broken_links']} broken links found.{Style.RESET_ALL}")
+
+
 def main():
 	parser = argparse.ArgumentParser(
 		description="A simple Python Command-Line Interface (CLI) tool for Technical SEO audits."
@@ -25,6 +172,23 @@ def main():
 		help='The URL of the website to audit (e.g., https://www.example.com/). If not provided, the tool will prompt for it.'
 	)
 
+	parser.add_argument(
+		'--url-file',
+		type=str,
+		metavar='FILE',
+		help='Batch mode: audit every start URL listed in this file (one per line, # for comments) in one process, '
+			 'sharing connections and link statuses between sites. Writes one report per site and a combined '
+			 'summary. Scans are deep crawls unless --scan-type 0 is given.'
+	)
+
+	parser.add_argument(
+		'--parallel-sites',
+		type=int,
+		default=DEFAULT_PARALLEL_SITES,
+		help=f'Batch mode: number of sites audited at the same time. --concurrency and --page-workers are split '
+			 f'evenly between them. (Default: {DEFAULT_PARALLEL_SITES})'
+	)
+
 	parser.add_argument(
 		'--scan-type',
 		type=int,
@@ -55,13 +219,297 @@ def main():
 	parser.add_argument(
 		'--output-format',
 		type=str,
-		choices=['text', 'json'],
+		choices=['text', 'json', 'ndjson'],
 		default='json',
-		help='Specify the output format: "text" for terminal display or "json" for JSON output. (Default: json)'
+		help='Specify the output format: "text" for terminal display, "json" for JSON output, or "ndjson" to stream '
+			 'one JSON record per page and broken link to the report file while crawling, with constant memory use. '
+			 '(Default: json)'
+	)
+
+	parser.add_argument(
+		'--csv-report',
+		action='store_true',
+		help='Also write broken links to a CSV file in the reports directory, streamed as they are found.'
+	)
+
+	parser.add_argument(
+		'--concurrency',
+		type=int,
+		default=DEFAULT_CONCURRENCY,
+		help=f'Maximum number of link status checks running at the same time. (Default: {DEFAULT_CONCURRENCY})'
+	)
+
+	parser.add_argument(
+		'--per-host-limit',
+		type=int,
+		default=DEFAULT_HOST_CONCURRENCY,
+		help=f'Maximum number of requests running at the same time against a single host. (Default: {DEFAULT_HOST_CONCURRENCY})'
+	)
+
+	parser.add_argument(
+		'--host-rate',
+		type=float,
+		default=DEFAULT_HOST_RATE,
+		help=f'Maximum number of requests per second sent to a single host. Slowed down automatically on 429/503 responses and by robots.txt Crawl-delay. (Default: {DEFAULT_HOST_RATE})'
+	)
+
+	parser.add_argument(
+		'--fixed-timeouts',
+		action='store_true',
+		help='Use fixed request timeouts (15 seconds for pages, 10 for links) instead of adaptive ones. Disables the '
+			 'per-host circuit breaker, the sharing of DNS failures between links to the same host, and the final '
+			 'pass that checks links with connection errors again.'
+	)
+
+	parser.add_argument(
+		'--page-workers',
+		type=int,
+		default=DEFAULT_PAGE_WORKERS,
+		help=f'Number of pages fetched at the same time during a deep site crawl. (Default: {DEFAULT_PAGE_WORKERS})'
+	)
+
+	parser.add_argument(
+		'--cache-path',
+		type=str,
+		default=DEFAULT_CACHE_PATH,
+		help=f'Path of the on-disk cache used to reuse link statuses between runs. (Default: {DEFAULT_CACHE_PATH})'
+	)
+
+	parser.add_argument(
+		'--no-cache',
+		action='store_true',
+		help='Do not read or write the on-disk link status cache; every link is checked again.'
+	)
+
+	parser.add_argument(
+		'--incremental',
+		action='store_true',
+		help='Deep crawl only: request pages with ETag/Last-Modified from the previous run (stored in --cache-path) '
+			 'and reuse their stored links when they have not changed.'
+	)
+
+	parser.add_argument(
+		'--sitemaps',
+		action='store_true',
+		help='Deep crawl only: queue the pages listed in the site\'s sitemaps (from robots.txt, or /sitemap.xml) '
+			 'before crawling, so pages without incoming links are found too.'
+	)
+
+	parser.add_argument(
+		'--bloom-capacity',
+		type=int,
+		metavar='PAGES',
+		help='Deep crawl only: keep the visited pages in a Bloom filter sized for this many pages instead of an exact '
+			 'set. Memory stays flat on crawls of millions of URLs, but about 1 in 10,000 pages may be skipped.'
+	)
+
+	parser.add_argument(
+		'--ignore-robots',
+		action='store_true',
+		help='Deep crawl only: also crawl pages disallowed by the site\'s robots.txt.'
+	)
+
+	parser.add_argument(
+		'--link-extractor',
+		type=str,
+		choices=EXTRACTOR_BACKENDS,
+		default=DEFAULT_EXTRACTOR_BACKEND,
+		help=f'Backend used to extract links from HTML: "stream" (single pass, standard library), "lxml" (single pass, '
+			 f'requires lxml) or "bs4" (full BeautifulSoup tree). (Default: {DEFAULT_EXTRACTOR_BACKEND})'
+	)
+
+	parser.add_argument(
+		'--check-assets',
+		action='store_true',
+		help='Also check the assets of each page (images and srcset candidates, scripts, stylesheets, icons, '
+			 'iframes, media) and the url() references of its stylesheets. Assets are checked, never crawled.'
+	)
+
+	parser.add_argument(
+		'--asset-attributes',
+		nargs='+',
+		metavar='TAG:ATTRIBUTE[,ATTRIBUTE]',
+		help='Tags and attributes holding asset URLs, replacing the default set (e.g. img:src,srcset,data-src '
+			 'script:src). Implies --check-assets.'
+	)
+
+	parser.add_argument(
+		'--parse-workers',
+		type=int,
+		default=0,
+		help='Deep crawl only: number of processes used to extract and normalize links, so parsing uses several '
+			 'CPU cores. 0 parses in the crawling process. (Default: 0)'
+	)
+
+	parser.add_argument(
+		'--pool-connections',
+		type=int,
+		default=DEFAULT_POOL_CONNECTIONS,
+		help=f'Number of per-host HTTP connection pools kept alive. (Default: {DEFAULT_POOL_CONNECTIONS})'
+	)
+
+	parser.add_argument(
+		'--pool-maxsize',
+		type=int,
+		default=DEFAULT_POOL_MAXSIZE,
+		help=f'Maximum number of keep-alive connections per host. (Default: {DEFAULT_POOL_MAXSIZE})'
+	)
+
+	parser.add_argument(
+		'--retries',
+		type=int,
+		default=DEFAULT_RETRIES,
+		help=f'Number of retries, with exponential backoff, for connection errors and 502/504 responses. 429/503 responses are retried by the per-host scheduler. (Default: {DEFAULT_RETRIES})'
+	)
+
+	parser.add_argument(
+		'--checkpoint',
+		type=str,
+		help='Path of a checkpoint file where the deep crawl state is saved periodically and when the crawl stops.'
+	)
+
+	parser.add_argument(
+		'--checkpoint-interval',
+		type=int,
+		default=DEFAULT_CHECKPOINT_INTERVAL,
+		help=f'Seconds between two checkpoints of a deep crawl. (Default: {DEFAULT_CHECKPOINT_INTERVAL})'
+	)
+
+	parser.add_argument(
+		'--resume',
+		type=str,
+		metavar='CHECKPOINT',
+		help='Resume the deep crawl saved in a checkpoint file. The URL, max depth and max pages are taken from the checkpoint.'
+	)
+
+	parser.add_argument(
+		'--distributed',
+		type=str,
+		metavar='STORE',
+		help='Deep crawl only: coordinate a distributed crawl whose frontier and link statuses are shared through '
+			 'this SQLite file. The coordinator crawls too, waits for all workers to finish and writes the report. '
+			 'Running it again on the same file continues an unfinished crawl.'
+	)
+
+	parser.add_argument(
+		'--worker',
+		type=str,
+		metavar='STORE',
+		help='Join the distributed crawl shared through this SQLite file as a worker (see --distributed), '
+			 'then exit when the crawl is complete. The URL and limits are taken from the file.'
+	)
+
+	parser.add_argument(
+		'--log-level',
+		choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+		default='WARNING',
+		help='Level of the diagnostic log written to stderr. DEBUG traces every link of the crawl. (Default: WARNING)'
+	)
+
+	parser.add_argument(
+		'--metrics-port',
+		type=int,
+		metavar='PORT',
+		help='Serve live crawl metrics (phase latencies, queue depth, throughput) in the Prometheus format '
+			 'at http://127.0.0.1:PORT/metrics while the program runs.'
 	)
 
 	args = parser.parse_args()
 
+	logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+	if args.concurrency < 1 or args.per_host_limit < 1 or args.page_workers < 1:
+		print(f"{Fore.RED}Error: --concurrency, --per-host-limit and --page-workers must be at least 1.{Style.RESET_ALL}")
+		sys.exit(1)
+
+	if args.host_rate <= 0:
+		print(f"{Fore.RED}Error: --host-rate must be greater than 0.{Style.RESET_ALL}")
+		sys.exit(1)
+
+	if args.parse_workers < 0:
+		print(f"{Fore.RED}Error: --parse-workers cannot be negative.{Style.RESET_ALL}")
+		sys.exit(1)
+
+	if args.parallel_sites < 1:
+		print(f"{Fore.RED}Error: --parallel-sites must be at least 1.{Style.RESET_ALL}")
+		sys.exit(1)
+
+	if args.url_file and (args.url or args.resume or args.checkpoint or args.distributed or args.worker):
+		print(f"{Fore.RED}Error: --url-file cannot be combined with --url, --resume, --checkpoint, --distributed or --worker.{Style.RESET_ALL}")
+		sys.exit(1)
+
+	asset_attributes = None
+	if args.asset_attributes:
+		try:
+			asset_attributes = parse_asset_attributes(args.asset_attributes)
+		except ValueError as e:
+			print(f"{Fore.RED}Error: {e}{Style.RESET_ALL}")
+			sys.exit(1)
+	elif args.check_assets:
+		asset_attributes = dict(DEFAULT_ASSET_ATTRIBUTES)
+
+	if asset_attributes and (args.distributed or args.worker):
+		print(f"{Fore.RED}Error: Asset checking is not available for --distributed crawls.{Style.RESET_ALL}")
+		sys.exit(1)
+
+	if args.distributed and args.resume:
+		print(f"{Fore.RED}Error: --distributed crawls are continued by running the coordinator again, not with --resume.{Style.RESET_ALL}")
+		sys.exit(1)
+
+	# Shared HTTP client (connection pools) for both the single-page audit and the deep crawl.
+	# Pools should be at least as large as the per-host concurrency to keep connections alive.
+	configure_http_client(pool_connections=args.pool_connections,
+						  pool_maxsize=max(args.pool_maxsize, args.per_host_limit),
+						  retries=args.retries)
+	# Per-host politeness: request rate and concurrency limits for every host contacted
+	configure_host_scheduler(rate=args.host_rate, max_concurrency=args.per_host_limit)
+	# Per-host timeouts from observed latencies; fails fast on unreachable hosts
+	configure_timeout_policy(enabled=not args.fixed_timeouts)
+
+	if args.metrics_port is not None:
+		try:
+			start_metrics_server(args.metrics_port)
+		except OSError as e:
+			print(f"{Fore.RED}Error: Unable to serve metrics on port {args.metrics_port}: {e}{Style.RESET_ALL}")
+			sys.exit(1)
+		print(f"{Fore.CYAN}Serving crawl metrics at http://127.0.0.1:{args.metrics_port}/metrics{Style.RESET_ALL}")
+
+	get_metrics().reset()  # The metrics cover the scan, not the startup
+
+	if args.url_file:
+		run_batch_mode(args, asset_attributes)
+		return
+
+	if args.worker:
+		if not os.path.exists(args.worker):
+			print(f"{Fore.RED}Error: '{args.worker}' does not exist; start the coordinator with --distributed first.{Style.RESET_ALL}")
+			sys.exit(1)
+		store = SharedCrawlStore(args.worker)
+		try:
+			run_worker(store, page_workers=args.page_workers, concurrency=args.concurrency,
+					   extractor_backend=args.link_extractor)
+		except ValueError as e:
+			print(f"{Fore.RED}Error: {e}{Style.RESET_ALL}")
+			sys.exit(1)
+		except KeyboardInterrupt:
+			print(f"\n{Fore.YELLOW}Worker stopped by user (Ctrl+C). Its pages go back to the pool when their leases expire.{Style.RESET_ALL}")
+		finally:
+			store.close()
+		return
+
+	resume_state = None
+	if args.resume:
+		try:
+			resume_state = load_checkpoint(args.resume)
+		except (OSError, ValueError, KeyError, TypeError) as e:
+			print(f"{Fore.RED}Error: Unable to load checkpoint '{args.resume}': {e}{Style.RESET_ALL}")
+			sys.exit(1)
+		args.url = resume_state["start_url"]
+		args.scan_type = 1  # Only deep crawls can be resumed
+		args.max_pages = resume_state["max_pages"]
+		if not args.checkpoint:
+			args.checkpoint = args.resume  # Keep updating the same checkpoint
+
 	# --- 1. Get Target URL ---
 	target_url = args.url
 	if not target_url:
@@ -86,27 +534,86 @@ def main():
 			except ValueError:
 				print(f"{Fore.YELLOW}Invalid input. Please enter a number.{Style.RESET_ALL}")
 
+	current_time = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+	report_basename = get_report_basename(target_url, scan_type, current_time)
+
 	results = None
+	distributed_store = None
+
+	persistent_cache, page_cache = open_caches(args)
+
+	# Streaming report sinks receive records while the scan runs instead of after it
+	report_sinks = []
+	if args.output_format == 'ndjson' or args.csv_report:
+		ensure_report_dir()
+		if args.output_format == 'ndjson':
+			report_sinks.append(NdjsonReportWriter(os.path.join(REPORT_DIR, f"{report_basename}.ndjson")))
+		if args.csv_report:
+			report_sinks.append(CsvBrokenLinkWriter(os.path.join(REPORT_DIR, f"{report_basename}.csv")))
 
 	# --- Try-Except block for KeyboardInterrupt ---
 	try:
 		# --- 3. Execute Scan Based on Type ---
 		if scan_type == 0:  # Single-page audit
 			print(f"{Fore.CYAN}Performing single-page broken link check for: {target_url}{Style.RESET_ALL}")
-			results = check_broken_links(target_url, output_format=args.output_format)
+			results = check_broken_links(target_url, output_format='json' if report_sinks else args.output_format,
+										 concurrency=args.concurrency,
+										 persistent_cache=persistent_cache, extractor_backend=args.link_extractor,
+										 asset_attributes=asset_attributes)
+			if results and report_sinks:
+				summary = {key: value for key, value in results.items() if key != "broken_links"}
+				for sink in report_sinks:
+					for broken_link in results["broken_links"]:
+						sink.write_broken_link(broken_link)
+					sink.write_summary(summary)
 
 		elif scan_type == 1:  # Deep site crawl
-			MAX_DEPTH = 5  # Fixed maximum crawl depth
+			MAX_DEPTH = resume_state["max_depth"] if resume_state else 5  # Fixed maximum crawl depth
 			print(
 				f"{Fore.CYAN}Performing deep site crawl for: {target_url} (Max Depth: {MAX_DEPTH}, Max Pages: {args.max_pages}, Max Time: {args.timeout} seconds){Style.RESET_ALL}")
 
-			results = crawl_site_for_broken_links(
-				start_url=target_url,
-				max_depth=MAX_DEPTH,
-				max_pages=args.max_pages,
-				timeout=args.timeout,
-				output_format='json'  # Deep crawl always returns JSON output
-			)
+			if args.distributed:
+				distributed_store = SharedCrawlStore(args.distributed)
+				try:
+					results = run_coordinator(
+						distributed_store,
+						start_url=target_url,
+						max_depth=MAX_DEPTH,
+						max_pages=args.max_pages,
+						timeout=args.timeout,
+						page_workers=args.page_workers,
+						concurrency=args.concurrency,
+						extractor_backend=args.link_extractor,
+						seed_sitemaps=args.sitemaps,
+						respect_robots=not args.ignore_robots,
+						report_sinks=report_sinks,
+						keep_results=args.output_format != 'ndjson'
+					)
+				except ValueError as e:
+					print(f"{Fore.RED}Error: {e}{Style.RESET_ALL}")
+			else:
+				results = crawl_site_for_broken_links(
+					start_url=target_url,
+					max_depth=MAX_DEPTH,
+					max_pages=args.max_pages,
+					timeout=args.timeout,
+					output_format='json',  # Deep crawl always returns JSON output
+					concurrency=args.concurrency,
+					page_workers=args.page_workers,
+					persistent_cache=persistent_cache,
+					checkpoint_path=args.checkpoint,
+					checkpoint_interval=args.checkpoint_interval,
+					resume_state=resume_state,
+					page_cache=page_cache,
+					extractor_backend=args.link_extractor,
+					parse_workers=args.parse_workers,
+					report_sinks=report_sinks,
+					keep_results=args.output_format != 'ndjson',
+					seed_sitemaps=args.sitemaps,
+					respect_robots=not args.ignore_robots,
+					bloom_capacity=args.bloom_capacity,
+					asset_attributes=asset_attributes
+				)
 
 	except KeyboardInterrupt:
 		print(
@@ -115,29 +622,34 @@ def main():
 		if results is None:
 			print(f"{Fore.RED}Error: No temporary results available to save.{Style.RESET_ALL}")
 			sys.exit(1)
+	finally:
+		if persistent_cache is not None:
+			persistent_cache.close()
+		if page_cache is not None:
+			page_cache.close()
+		if distributed_store is not None:
+			distributed_store.close()
+		for sink in report_sinks:
+			sink.close()
 
 	# --- 4. Handle Results (Display and Save) ---
-	if results:
-		# Create reports directory if it doesn't exist
-		if not os.path.exists(REPORT_DIR):
-			os.makedirs(REPORT_DIR)
-			print(f"{Fore.GREEN}Directory '{REPORT_DIR}' created.{Style.RESET_ALL}")
-
-		# Sanitize URL for filename and add timestamp
-		# Removes scheme, replaces special chars with underscores, removes trailing underscore
-		sanitized_url = target_url.replace("https://", "").replace("http://", "").replace("/", "_").replace(":",
-																											"_").replace(
-			".", "_").strip('_')
-		current_time = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
-
-		# Add scan type to filename for clarity
-		scan_type_name = "single_page" if scan_type == 0 else "deep_crawl"
+	for sink in report_sinks:
+		print(f"{Fore.GREEN}Report streamed to '{sink.filename}'.{Style.RESET_ALL}")
+
+	if results and args.output_format == 'ndjson':
+		# Records were streamed to the NDJSON file; only the totals are left to display
+		print(f"\n{Fore.YELLOW}Totals (full records in the NDJSON file):{Style.RESET_ALL}")
+		print(json.dumps({key: value for key, value in results.items() if key != "broken_links"}, indent=4,
+						 ensure_ascii=False))
+
+	elif results:
+		ensure_report_dir()
 
 		# Append '-interrupted' to filename if crawl was interrupted
 		interrupted_suffix = "-interrupted" if "interrupted" in results.get("crawl_completion_status",
 																			"").lower() else ""
 
-		report_filename = f"{sanitized_url}-{scan_type_name}-{current_time}{interrupted_suffix}.json"
+		report_filename = f"{report_basename}{interrupted_suffix}.json"
 		report_filepath = os.path.join(REPORT_DIR, report_filename)
 
 		try:
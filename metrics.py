@@ -0,0 +1,199 @@
+import threading
+import time
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Phases of the crawl that are timed
+PHASES = ('connect', 'fetch', 'parse', 'normalize', 'status_check')
+# Phases also timed per host
+HOST_PHASES = ('connect', 'fetch', 'status_check')
+
+# Upper bounds (in seconds) of the latency histogram buckets, Prometheus style
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+	"""
+	Latency histogram with fixed buckets; keeps counts only, so its size does not grow.
+	Not thread-safe on its own: CrawlMetrics serializes access.
+	"""
+	__slots__ = ('bucket_counts', 'count', 'total', 'max')
+
+	def __init__(self):
+		self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)  # The last bucket is +Inf
+		self.count = 0
+		self.total = 0.0
+		self.max = 0.0
+
+	def observe(self, seconds: float):
+		index = 0
+		while index < len(LATENCY_BUCKETS) and seconds > LATENCY_BUCKETS[index]:
+			index += 1
+		self.bucket_counts[index] += 1
+		self.count += 1
+		self.total += seconds
+		self.max = max(self.max, seconds)
+
+	def quantile(self, q: float) -> float:
+		"""
+		Returns the upper bound of the bucket holding the `q` quantile (the maximum for the +Inf bucket).
+		"""
+		if not self.count:
+			return 0.0
+		rank = q * self.count
+		seen = 0
+		for index, bucket_count in enumerate(self.bucket_counts):
+			seen += bucket_count
+			if seen >= rank:
+				return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else self.max
+		return self.max
+
+	def summary(self) -> dict:
+		return {
+			"count": self.count,
+			"total_seconds": round(self.total, 6),
+			"mean_seconds": round(self.total / self.count, 6) if self.count else 0.0,
+			"p50_seconds": self.quantile(0.5),
+			"p95_seconds": self.quantile(0.95),
+			"p99_seconds": self.quantile(0.99),
+			"max_seconds": round(self.max, 6)
+		}
+
+
+class CrawlMetrics:
+	"""
+	Thread-safe timings and counters of a crawl: a latency histogram per phase (and per host
+	for network phases), queue depth, and page and link throughput.
+	"""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self.reset()
+
+	def reset(self):
+		with self._lock:
+			self.started_at = time.monotonic()
+			self.phases = {phase: Histogram() for phase in PHASES}
+			self.hosts = {}  # host -> {phase: Histogram}
+			self.pages = 0
+			self.links = 0
+			self.queue_depth = 0
+
+	def observe(self, phase: str, seconds: float, host: str | None = None):
+		with self._lock:
+			self.phases[phase].observe(seconds)
+			if host is not None and phase in HOST_PHASES:
+				host_phases = self.hosts.get(host)
+				if host_phases is None:
+					host_phases = self.hosts[host] = {}
+				histogram = host_phases.get(phase)
+				if histogram is None:
+					histogram = host_phases[phase] = Histogram()
+				histogram.observe(seconds)
+
+	@contextmanager
+	def timer(self, phase: str, host: str | None = None):
+		"""
+		Times the `with` block as one observation of `phase`, also when it raises.
+		"""
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.observe(phase, time.perf_counter() - start, host)
+
+	def count_page(self, links: int = 0):
+		with self._lock:
+			self.pages += 1
+			self.links += links
+
+	def set_queue_depth(self, queue_depth: int):
+		self.queue_depth = queue_depth
+
+	def snapshot(self) -> dict:
+		"""
+		Returns the metrics as a JSON-serializable dictionary for the report.
+		"""
+		with self._lock:
+			elapsed = time.monotonic() - self.started_at
+			return {
+				"elapsed_seconds": round(elapsed, 3),
+				"pages": self.pages,
+				"links": self.links,
+				"pages_per_second": round(self.pages / elapsed, 3) if elapsed > 0 else 0.0,
+				"links_per_second": round(self.links / elapsed, 3) if elapsed > 0 else 0.0,
+				"queue_depth": self.queue_depth,
+				"phases": {phase: histogram.summary() for phase, histogram in self.phases.items()},
+				"hosts": {host: {phase: histogram.summary() for phase, histogram in host_phases.items()}
+						  for host, host_phases in sorted(self.hosts.items())}
+			}
+
+	def to_prometheus(self) -> str:
+		"""
+		Returns the metrics in the Prometheus text exposition format.
+		"""
+		lines = []
+
+		def add_histogram(histogram, labels):
+			cumulative = 0
+			for bound, bucket_count in zip(LATENCY_BUCKETS + ('+Inf',), histogram.bucket_counts):
+				cumulative += bucket_count
+				lines.append(f'brokenlinkfinder_latency_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+			lines.append(f'brokenlinkfinder_latency_seconds_sum{{{labels}}} {histogram.total}')
+			lines.append(f'brokenlinkfinder_latency_seconds_count{{{labels}}} {histogram.count}')
+
+		with self._lock:
+			elapsed = time.monotonic() - self.started_at
+			lines.append('# TYPE brokenlinkfinder_pages_total counter')
+			lines.append(f'brokenlinkfinder_pages_total {self.pages}')
+			lines.append('# TYPE brokenlinkfinder_links_total counter')
+			lines.append(f'brokenlinkfinder_links_total {self.links}')
+			lines.append('# TYPE brokenlinkfinder_queue_depth gauge')
+			lines.append(f'brokenlinkfinder_queue_depth {self.queue_depth}')
+			lines.append('# TYPE brokenlinkfinder_elapsed_seconds gauge')
+			lines.append(f'brokenlinkfinder_elapsed_seconds {elapsed}')
+			lines.append('# TYPE brokenlinkfinder_latency_seconds histogram')
+			for phase, histogram in self.phases.items():
+				add_histogram(histogram, f'phase="{phase}",host=""')
+			for host, host_phases in sorted(self.hosts.items()):
+				escaped_host = host.replace('\\', '\\\\').replace('"', '\\"')
+				for phase, histogram in host_phases.items():
+					add_histogram(histogram, f'phase="{phase}",host="{escaped_host}"')
+		return "\n".join(lines) + "\n"
+
+
+_metrics = CrawlMetrics()
+
+
+def get_metrics() -> CrawlMetrics:
+	"""
+	Returns the process-wide metrics that fetching, parsing and link checking report to.
+	"""
+	return _metrics
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+	def do_GET(self):
+		if self.path.split('?')[0] != '/metrics':
+			self.send_error(404)
+			return
+		body = get_metrics().to_prometheus().encode('utf-8')
+		self.send_response(200)
+		self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):
+		pass  # Scrapes are not worth a log line each
+
+
+def start_metrics_server(port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+	"""
+	Serves the metrics at http://host:port/metrics from a background thread.
+	Call shutdown() on the returned server to stop it.
+	"""
+	server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+	server.daemon_threads = True
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	return server
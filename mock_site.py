@@ -0,0 +1,206 @@
+import random
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, urlunsplit
+from requests.adapters import BaseAdapter
+
+# Host names of the synthetic site. Each has its own base domain, so only SITE_HOST is crawled;
+# the others only receive link checks.
+SITE_HOST = 'bench-site.test'
+EXTERNAL_HOST = 'bench-ext.test'
+HEAD_HOSTILE_HOST = 'bench-cdn.test'  # Answers 405 to HEAD, like some CDNs
+SLOW_HOST_TEMPLATE = 'bench-slow-{}.test'
+
+# Internal links every page repeats, like a site header
+NAV_LINKS = 5
+
+
+class SyntheticSite:
+	"""
+	Deterministic synthetic website: the same parameters and seed always produce the same pages.
+	Pages form a binary tree (so every page is reachable from the start page) plus `fan_out`
+	random internal links, of which `duplicate_ratio` repeat a link already on the page and
+	`broken_ratio` point to missing pages. `external_links` per page go to other hosts: a share
+	of `head_hostile_ratio` to a host rejecting HEAD, and about half of the rest to one of the
+	`slow_hosts`, which answer after `slow_latency` seconds. Every other response is delayed
+	by `latency` seconds.
+	"""
+
+	def __init__(self, pages: int = 200, fan_out: int = 10, duplicate_ratio: float = 0.3, broken_ratio: float = 0.05,
+				 external_links: int = 2, latency: float = 0.0, slow_hosts: int = 0, slow_latency: float = 0.5,
+				 head_hostile_ratio: float = 0.0, seed: int = 0):
+		self.pages = pages
+		self.fan_out = fan_out
+		self.duplicate_ratio = duplicate_ratio
+		self.broken_ratio = broken_ratio
+		self.external_links = external_links
+		self.latency = latency
+		self.slow_hosts = slow_hosts
+		self.slow_latency = slow_latency
+		self.head_hostile_ratio = head_hostile_ratio
+		self.seed = seed
+		self.slow_host_names = frozenset(SLOW_HOST_TEMPLATE.format(i) for i in range(slow_hosts))
+		self.hosts = frozenset([SITE_HOST, EXTERNAL_HOST, HEAD_HOSTILE_HOST]) | self.slow_host_names
+
+	@property
+	def start_url(self) -> str:
+		return f"https://{SITE_HOST}/"
+
+	def to_dict(self) -> dict:
+		return {key: getattr(self, key) for key in (
+			'pages', 'fan_out', 'duplicate_ratio', 'broken_ratio', 'external_links', 'latency', 'slow_hosts',
+			'slow_latency', 'head_hostile_ratio', 'seed')}
+
+	def page_links(self, index: int) -> list:
+		"""
+		Returns the hrefs of page `index`, in page order.
+		"""
+		rng = random.Random(self.seed * 1000003 + index)
+		links = [f"/page/{i}" for i in range(min(NAV_LINKS, self.pages))]
+		links += [f"/page/{child}" for child in (index * 2 + 1, index * 2 + 2) if child < self.pages]
+
+		for link_index in range(self.fan_out):
+			if rng.random() < self.duplicate_ratio:
+				links.append(rng.choice(links))
+			elif rng.random() < self.broken_ratio:
+				links.append(f"/missing/{index}/{link_index}")
+			else:
+				links.append(f"/page/{rng.randrange(self.pages)}")
+
+		for link_index in range(self.external_links):
+			if rng.random() < self.head_hostile_ratio:
+				host = HEAD_HOSTILE_HOST
+			elif self.slow_hosts and rng.random() < 0.5:
+				host = SLOW_HOST_TEMPLATE.format(rng.randrange(self.slow_hosts))
+			else:
+				host = EXTERNAL_HOST
+			# External assets are shared between pages, as on real sites
+			if rng.random() < self.broken_ratio:
+				links.append(f"https://{host}/missing/{rng.randrange(self.pages)}")
+			else:
+				links.append(f"https://{host}/asset/{rng.randrange(self.pages)}")
+		return links
+
+	def render_page(self, index: int) -> bytes:
+		anchors = "".join(f'<a href="{link}">Link {i}</a>\n' for i, link in enumerate(self.page_links(index)))
+		return (f"<!DOCTYPE html>\n<html><head><title>Page {index}</title></head>\n"
+				f"<body><h1>Page {index}</h1>\n{anchors}</body></html>\n").encode('utf-8')
+
+	def respond(self, host: str, method: str, path: str) -> tuple:
+		"""
+		Returns (status code, body, delay in seconds) of a request to the site.
+		"""
+		delay = self.slow_latency if host in self.slow_host_names else self.latency
+		parts = path.split('?')[0].strip('/').split('/')
+
+		if host == SITE_HOST:
+			if parts == ['robots.txt']:
+				return 200, b"User-agent: *\nAllow: /\n", delay
+			if parts == ['']:
+				return 200, self.render_page(0), delay
+			if len(parts) == 2 and parts[0] == 'page' and parts[1].isdigit() and int(parts[1]) < self.pages:
+				return 200, self.render_page(int(parts[1])), delay
+			return 404, b"Not found", delay
+
+		if host in self.hosts and parts[0] == 'asset':
+			if host == HEAD_HOSTILE_HOST and method == 'HEAD':
+				return 405, b"", delay
+			return 200, b"asset", delay
+		return 404, b"Not found", delay
+
+
+class _SyntheticSiteRequestHandler(BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1'  # Keep-alive, like real servers
+
+	def _respond(self, method: str):
+		host = (self.headers.get('Host') or '').split(':')[0].lower()
+		status_code, body, delay = self.server.site.respond(host, method, self.path)
+		self.server.count_request()
+		if delay:
+			time.sleep(delay)
+		self.send_response(status_code)
+		self.send_header('Content-Type', 'text/plain' if self.path.startswith('/robots.txt') else 'text/html')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		if method == 'GET':
+			self.wfile.write(body)
+
+	def do_GET(self):
+		self._respond('GET')
+
+	def do_HEAD(self):
+		self._respond('HEAD')
+
+	def log_message(self, format, *args):
+		pass  # One line per request would drown the benchmark output
+
+
+class SyntheticSiteServer(ThreadingHTTPServer):
+	"""
+	Serves a SyntheticSite on 127.0.0.1 from a background thread. The site's hosts are told
+	apart by the Host header; see install_loopback to route requests to them.
+	"""
+	daemon_threads = True
+	request_queue_size = 256  # The crawler opens many connections at once
+
+	def __init__(self, site: SyntheticSite, port: int = 0):
+		super().__init__(('127.0.0.1', port), _SyntheticSiteRequestHandler)
+		self.site = site
+		self.requests_served = 0
+		self._requests_lock = threading.Lock()
+		threading.Thread(target=self.serve_forever, daemon=True).start()
+
+	@property
+	def port(self) -> int:
+		return self.server_address[1]
+
+	def handle_error(self, request, client_address):
+		# The crawler closes ranged GET streams and pooled keep-alive connections before reading to the end
+		if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+			super().handle_error(request, client_address)
+
+	def count_request(self):
+		with self._requests_lock:
+			self.requests_served += 1
+
+	def reset_request_count(self) -> int:
+		"""
+		Returns the number of requests served since the last reset.
+		"""
+		with self._requests_lock:
+			requests_served, self.requests_served = self.requests_served, 0
+		return requests_served
+
+
+class _LoopbackAdapter(BaseAdapter):
+	"""
+	Sends requests for the synthetic hosts to the local server over plain HTTP, keeping the
+	original host in the Host header. Everything else goes through the wrapped adapter too,
+	so connection pooling, retries and timing stay those of the crawler.
+	"""
+
+	def __init__(self, adapter, hosts: frozenset, port: int):
+		super().__init__()
+		self.adapter = adapter
+		self.hosts = hosts
+		self.port = port
+
+	def send(self, request, **kwargs):
+		parts = urlsplit(request.url)
+		if parts.hostname in self.hosts:
+			request.headers['Host'] = parts.hostname
+			request.url = urlunsplit(('http', f"127.0.0.1:{self.port}", parts.path, parts.query, ''))
+		return self.adapter.send(request, **kwargs)
+
+	def close(self):
+		self.adapter.close()
+
+
+def install_loopback(session, site: SyntheticSite, port: int):
+	"""
+	Routes the requests `session` makes to the hosts of `site` to the local server on `port`.
+	"""
+	for prefix in ('https://', 'http://'):
+		session.mount(prefix, _LoopbackAdapter(session.get_adapter(prefix), site.hosts, port))
@@ -0,0 +1,139 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from urllib.parse import urljoin
+
+# Redirects followed for one link before it is reported as broken
+MAX_REDIRECTS = 10
+
+REDIRECT_STATUS_CODES = frozenset([301, 302, 303, 307, 308])
+
+# Hops kept by the redirect cache (least recently used are evicted)
+REDIRECT_CACHE_SIZE = 100000
+
+# Errors of chains that do not end, with their report status message
+REDIRECT_ERROR_MESSAGES = {
+	"redirect_loop": "Redirect Loop",
+	"too_many_redirects": "Too Many Redirects"
+}
+
+
+def _is_cacheable(status_code: int) -> bool:
+	# Connection errors, throttling and server errors may not happen again
+	return 0 < status_code < 500 and status_code != 429
+
+
+class RedirectCache:
+	"""
+	Redirect hops (URL -> status code and target URL) seen while checking links, and the
+	final status codes of URLs reached through a redirect.
+	Links sharing part of a chain (shortener domains, http -> https redirects, moved
+	directories) only request the hops not seen yet; concurrent lookups of the same hop wait
+	on a single request. The chain of a checked link can be read back for the report without
+	any request. Thread-safe.
+	"""
+
+	def __init__(self, max_size: int = REDIRECT_CACHE_SIZE, max_redirects: int = MAX_REDIRECTS):
+		self.max_size = max_size
+		self.max_redirects = max_redirects
+		self._hops = OrderedDict()  # URL -> (status code, absolute target URL or None)
+		self._pending = {}  # URL -> Future holding the (status code, target) of a hop being requested
+		self._lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+
+	def _get(self, url: str) -> tuple | None:
+		with self._lock:
+			hop = self._hops.get(url)
+			if hop is not None:
+				self._hops.move_to_end(url)
+			return hop
+
+	def _fetch(self, url: str, fetch_hop, is_first_hop: bool) -> tuple:
+		# Returns the (status code, target) of a hop, requesting it unless it is cached or being requested
+		with self._lock:
+			hop = self._hops.get(url)
+			if hop is not None:
+				self._hops.move_to_end(url)
+				self.hits += 1
+				return hop
+			future = self._pending.get(url)
+			is_owner = future is None
+			if is_owner:
+				future = self._pending[url] = Future()
+				self.misses += 1
+			else:
+				self.hits += 1
+		if not is_owner:
+			return future.result()
+
+		try:
+			status_code, location = fetch_hop(url)
+		except Exception as e:
+			with self._lock:
+				del self._pending[url]
+			future.set_exception(e)
+			raise
+		target = urljoin(url, location) if status_code in REDIRECT_STATUS_CODES and location else None
+		with self._lock:
+			del self._pending[url]
+			# Links that do not redirect are cached by the link status cache
+			if (target or not is_first_hop) and _is_cacheable(status_code):
+				self._hops[url] = (status_code, target)
+				self._hops.move_to_end(url)
+				if len(self._hops) > self.max_size:
+					self._hops.popitem(last=False)
+		future.set_result((status_code, target))
+		return status_code, target
+
+	def resolve(self, url: str, fetch_hop=None) -> tuple:
+		"""
+		Follows the redirect chain starting at `url`. `fetch_hop(url)` returns the (status code,
+		Location header) of a single request without following redirects, and is only called
+		for hops not in the cache; without it, only cached hops are followed.
+		A redirect to a URL already in the chain stops it at once, as does a redirect beyond
+		the first `max_redirects`; both end the chain with status code 0.
+		Returns (status code, chain): the status code of the end of the chain (None if it is
+		not cached), and a dictionary with the chain's "hops" (URL and status code of each
+		redirect), "final_url", "status_code" and, for loops and overlong chains, "error".
+		The chain is None if `url` does not redirect.
+		"""
+		hops = []
+		seen = {url}
+		current = url
+		error = None
+		while True:
+			if fetch_hop is not None:
+				status_code, target = self._fetch(current, fetch_hop, not hops)
+			else:
+				status_code, target = self._get(current) or (None, None)
+			if target is None:
+				break
+			if len(hops) >= self.max_redirects:
+				error = "too_many_redirects"
+			elif target in seen:
+				error = "redirect_loop"
+			hops.append({"url": current, "status_code": status_code})
+			if error:
+				current, status_code = target, 0
+				break
+			seen.add(target)
+			current = target
+
+		if not hops:
+			return status_code, None
+		chain = {"hops": hops, "final_url": current, "status_code": status_code}
+		if error:
+			chain["error"] = error
+		return status_code, chain
+
+	def stats(self) -> dict:
+		"""
+		Returns hit and miss counts for the JSON report.
+		"""
+		with self._lock:
+			return {
+				"hits": self.hits,
+				"misses": self.misses,
+				"cached_hops": len(self._hops)
+			}
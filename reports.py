@@ -1,6 +1,78 @@
+import csv
+import json
+
+# Columns of the broken links CSV report
+CSV_FIELDS = ["link", "status_code", "status_message", "source_page", "depth_found", "asset"]
+
+
+class NdjsonReportWriter:
+    """
+    Streams a deep crawl report as NDJSON: one JSON record per line, written as soon as it is known.
+    Records have a "type" of "page" (one per crawled page), "broken_link" (one per unique
+    broken link, with the first page it was found on), "redirect_chain" (one per unique
+    redirected link, likewise) and a final "summary" with the totals.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._file = open(filename, 'w', encoding='utf-8')
+
+    def _write(self, record: dict):
+        self._file.write(json.dumps(record, ensure_ascii=False))
+        self._file.write('\n')
+
+    def write_page(self, page_summary: dict):
+        self._write(dict(type="page", **page_summary))
+
+    def write_broken_link(self, broken_link: dict):
+        self._write(dict(type="broken_link", **broken_link))
+
+    def write_redirect_chain(self, redirect_chain: dict):
+        self._write(dict(type="redirect_chain", **redirect_chain))
+
+    def write_summary(self, summary: dict):
+        self._write(dict(type="summary", **summary))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class CsvBrokenLinkWriter:
+    """
+    Streams broken links to a CSV file, one row per unique broken link, as they are found.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._file = open(filename, 'w', encoding='utf-8', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=CSV_FIELDS, restval='', extrasaction='ignore')
+        self._writer.writeheader()
+
+    def write_page(self, page_summary: dict):
+        pass
+
+    def write_broken_link(self, broken_link: dict):
+        # Only broken assets carry the "asset" key
+        self._writer.writerow(dict(broken_link, asset=broken_link.get("asset", False)))
+
+    def write_redirect_chain(self, redirect_chain: dict):
+        pass
+
+    def write_summary(self, summary: dict):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
 def save_broken_links_to_csv(broken_links: list, filename: str = "broken_links_report.csv"):
     """
     لینک‌های شکسته را در یک فایل CSV ذخیره می‌کند.
     """
-    # کد برای ذخیره در CSV اینجا اضافه می‌شود
-    pass
\ No newline at end of file
+    writer = CsvBrokenLinkWriter(filename)
+    try:
+        for broken_link in broken_links:
+            writer.write_broken_link(broken_link)
+    finally:
+        writer.close()
@@ -0,0 +1,146 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Default politeness settings, applied to every host separately
+DEFAULT_HOST_RATE = 10.0  # Requests per second
+DEFAULT_HOST_CONCURRENCY = 4  # Requests in flight at the same time
+
+# Responses asking the client to slow down
+THROTTLE_STATUS_CODES = frozenset([429, 503])
+
+INITIAL_BACKOFF = 1.0  # Seconds a host is paused after its first throttling response
+MAX_BACKOFF = 120.0  # Upper bound for pauses, including those requested with Retry-After
+
+
+def parse_retry_after(value: str | None) -> float | None:
+	"""
+	Returns the delay in seconds requested by a Retry-After header (seconds or HTTP date), or None.
+	"""
+	if not value:
+		return None
+	value = value.strip()
+	if value.isdigit():
+		return float(value)
+	try:
+		retry_at = parsedate_to_datetime(value)
+	except (TypeError, ValueError):
+		return None
+	if retry_at.tzinfo is None:
+		retry_at = retry_at.replace(tzinfo=timezone.utc)
+	return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class HostPausedError(Exception):
+	"""
+	Raised instead of waiting for a host whose throttling pause outlasts the request's deadline.
+	`status_code` is the throttling status code (429 or 503) that paused the host.
+	"""
+
+	def __init__(self, url: str, status_code: int, paused_for: float):
+		super().__init__(f"{url}: the host answered {status_code} and is paused for {paused_for:.1f} more seconds")
+		self.status_code = status_code
+
+
+class _HostState:
+	def __init__(self, rate: float, max_concurrency: int):
+		self.lock = threading.Lock()
+		self.semaphore = threading.BoundedSemaphore(max_concurrency)
+		self.rate = rate
+		self.burst = max(1.0, rate)
+		self.tokens = self.burst
+		self.updated_at = time.monotonic()
+		self.paused_until = 0.0
+		self.backoff = 0.0  # Current pause length; doubles with each consecutive throttling response
+		self.throttle_status = 0  # Status code of the latest throttling response
+
+
+class HostScheduler:
+	"""
+	Per-host politeness for all outgoing requests.
+	Each host has its own token bucket (`rate` requests per second) and concurrency cap, so
+	different hosts proceed in parallel while each stays within its limits. 429/503 responses
+	pause the host for the Retry-After delay or an exponential backoff, and a robots.txt
+	Crawl-delay lowers the host's rate.
+	"""
+
+	def __init__(self, rate: float = DEFAULT_HOST_RATE, max_concurrency: int = DEFAULT_HOST_CONCURRENCY):
+		self.rate = rate
+		self.max_concurrency = max_concurrency
+		self._hosts = {}
+		self._lock = threading.Lock()
+
+	def _get_host_state(self, url: str) -> _HostState:
+		host = urlsplit(url).netloc.lower()
+		with self._lock:
+			state = self._hosts.get(host)
+			if state is None:
+				state = _HostState(self.rate, self.max_concurrency)
+				self._hosts[host] = state
+		return state
+
+	@contextmanager
+	def slot(self, url: str, deadline: float | None = None):
+		"""
+		Waits until a request to the host of `url` is allowed, and holds one of its
+		concurrency slots while the `with` block runs.
+		Raises HostPausedError instead of waiting if the host is paused beyond `deadline`
+		(a time.monotonic() value).
+		"""
+		state = self._get_host_state(url)
+		with state.semaphore:
+			self._wait_for_token(url, state, deadline)
+			yield
+
+	def _wait_for_token(self, url: str, state: _HostState, deadline: float | None):
+		while True:
+			with state.lock:
+				now = time.monotonic()
+				if now < state.paused_until:
+					if deadline is not None and state.paused_until > deadline:
+						raise HostPausedError(url, state.throttle_status, state.paused_until - now)
+					wait = state.paused_until - now
+				else:
+					state.tokens = min(state.burst, state.tokens + (now - state.updated_at) * state.rate)
+					state.updated_at = now
+					if state.tokens >= 1:
+						state.tokens -= 1
+						return
+					wait = (1 - state.tokens) / state.rate
+			time.sleep(wait)
+
+	def report_response(self, url: str, status_code: int, headers=None):
+		"""
+		Adapts the host's pacing to a response: throttling responses pause the host,
+		any other response resets its backoff.
+		"""
+		state = self._get_host_state(url)
+		with state.lock:
+			if status_code not in THROTTLE_STATUS_CODES:
+				state.backoff = 0.0
+				return
+			state.backoff = min(MAX_BACKOFF, state.backoff * 2 if state.backoff else INITIAL_BACKOFF)
+			state.throttle_status = status_code
+			retry_after = parse_retry_after(headers.get('Retry-After') if headers else None)
+			delay = min(MAX_BACKOFF, retry_after) if retry_after is not None else state.backoff
+			state.paused_until = max(state.paused_until, time.monotonic() + delay)
+			state.tokens = 0.0
+		logger.info("%s answered %s, pausing its host for %.1f seconds.", url, status_code, delay)
+
+	def set_crawl_delay(self, url: str, crawl_delay: float):
+		"""
+		Applies a robots.txt Crawl-delay (seconds between requests) to the host of `url`.
+		"""
+		if crawl_delay <= 0:
+			return
+		state = self._get_host_state(url)
+		with state.lock:
+			state.rate = min(state.rate, 1.0 / crawl_delay)
+			state.burst = 1.0
+			state.tokens = min(state.tokens, state.burst)
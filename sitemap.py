@@ -0,0 +1,103 @@
+import logging
+import zlib
+import xml.etree.ElementTree as ElementTree
+from urllib.parse import urlsplit
+import requests
+from utils import open_url_stream
+
+logger = logging.getLogger(__name__)
+
+# Limits protecting the crawl from huge or cyclic sitemap trees
+MAX_SITEMAP_FILES = 1000  # Sitemap files (including nested indexes) read per crawl
+MAX_SITEMAP_DEPTH = 5  # Nesting levels of sitemap indexes followed
+
+GZIP_MAGIC = b'\x1f\x8b'
+CHUNK_SIZE = 64 * 1024
+
+
+def get_sitemap_urls(start_url: str, robots=None) -> list:
+	"""
+	Returns the sitemaps of the site `start_url` belongs to: the Sitemap entries of its
+	robots.txt, or /sitemap.xml if robots.txt lists none.
+	"""
+	sitemap_urls = robots.site_maps() if robots else None
+	if sitemap_urls:
+		return list(dict.fromkeys(sitemap_urls))
+	parsed_url = urlsplit(start_url)
+	return [f"{parsed_url.scheme}://{parsed_url.netloc}/sitemap.xml"]
+
+
+def _local_name(tag: str) -> str:
+	# '{http://www.sitemaps.org/schemas/sitemap/0.9}loc' -> 'loc'
+	return tag.rsplit('}', 1)[-1]
+
+
+def _namespace(tag: str) -> str:
+	# '{http://www.sitemaps.org/schemas/sitemap/0.9}loc' -> '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+	return tag[:tag.index('}') + 1] if tag.startswith('{') else ''
+
+
+def _iter_sitemap_locs(chunks):
+	"""
+	Parses a sitemap from an iterable of byte chunks and yields ('url' | 'sitemap', loc) pairs.
+	Only <loc> children of <url> and <sitemap> entries count: the <image:loc> of image
+	sitemaps and other extensions' elements are skipped.
+	Parsed elements are discarded right away, so memory use does not grow with the file.
+	"""
+	parser = ElementTree.XMLPullParser(events=('start', 'end'))
+	decompressor = None
+	root = None
+	open_tags = []  # Tags of the elements enclosing the current one
+	for chunk in chunks:
+		if root is None and decompressor is None and chunk[:2] == GZIP_MAGIC:
+			# Gzipped sitemap file (e.g. sitemap.xml.gz)
+			decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+		parser.feed(decompressor.decompress(chunk) if decompressor else chunk)
+		for event, element in parser.read_events():
+			if event == 'start':
+				if root is None:
+					root = element
+				open_tags.append(element.tag)
+				continue
+			open_tags.pop()
+			name = _local_name(element.tag)
+			parent_tag = open_tags[-1] if open_tags else ''
+			if (name == 'loc' and _local_name(parent_tag) in ('url', 'sitemap')
+					and _namespace(parent_tag) == _namespace(element.tag) and element.text and element.text.strip()):
+				yield 'sitemap' if _local_name(root.tag) == 'sitemapindex' else 'url', element.text.strip()
+			elif name in ('url', 'sitemap'):
+				root.clear()  # Drop finished entries; the root keeps no children
+	parser.close()
+
+
+def iter_sitemap_page_urls(sitemap_urls: list):
+	"""
+	Yields the page URLs listed in the given sitemaps, following nested sitemap indexes.
+	Sitemaps are fetched and parsed as streams, one at a time, and only as far as the
+	caller consumes the generator.
+	"""
+	pending = [(sitemap_url, 0) for sitemap_url in reversed(sitemap_urls)]
+	seen_sitemaps = set()
+	while pending and len(seen_sitemaps) < MAX_SITEMAP_FILES:
+		sitemap_url, nesting = pending.pop()
+		if sitemap_url in seen_sitemaps:
+			continue
+		seen_sitemaps.add(sitemap_url)
+
+		response = open_url_stream(sitemap_url)
+		if response is None:
+			continue
+		logger.debug("Reading sitemap %s", sitemap_url)
+		nested_sitemaps = []
+		try:
+			for kind, loc in _iter_sitemap_locs(response.iter_content(CHUNK_SIZE)):
+				if kind == 'url':
+					yield loc
+				elif nesting < MAX_SITEMAP_DEPTH:
+					nested_sitemaps.append((loc, nesting + 1))
+		except (ElementTree.ParseError, zlib.error, requests.exceptions.RequestException) as e:
+			logger.info("Unable to parse sitemap %s: %s", sitemap_url, e)
+		finally:
+			response.close()
+		# Nested sitemaps are read depth-first, in the order their index lists them
+		pending.extend(reversed(nested_sitemaps))
@@ -0,0 +1,41 @@
+import contextlib
+import os
+import time
+import unittest
+from audit import crawl_site_for_broken_links, RETRY_PASS_GRACE
+from mock_site import SyntheticSite, SyntheticSiteServer, install_loopback
+from utils import configure_http_client, configure_host_scheduler, configure_timeout_policy
+
+# Crawl budget of the tests, in seconds
+CRAWL_TIMEOUT = 20
+# Slack for the work done around the requests (parsing, thread start-up, the report)
+ELAPSED_MARGIN = 3.0
+
+
+class CrawlDeadlineTest(unittest.TestCase):
+	"""
+	Crawls of a local synthetic site whose pages link to a host that accepts connections but never answers.
+	"""
+
+	def setUp(self):
+		self.site = SyntheticSite(pages=15, external_links=4, slow_hosts=1, slow_latency=3600)
+		self.server = SyntheticSiteServer(self.site)
+		self.addCleanup(self.server.server_close)
+		self.addCleanup(self.server.shutdown)
+		install_loopback(configure_http_client(), self.site, self.server.port)
+		configure_host_scheduler()
+		configure_timeout_policy()
+
+	def test_hanging_host_does_not_outlast_the_budget(self):
+		start = time.monotonic()
+		with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+			report = crawl_site_for_broken_links(self.site.start_url, max_depth=5, max_pages=self.site.pages,
+												 timeout=CRAWL_TIMEOUT)
+		elapsed = time.monotonic() - start
+
+		self.assertIn("retry_pass", report)  # The hanging host's links were checked again
+		self.assertLessEqual(elapsed, CRAWL_TIMEOUT + RETRY_PASS_GRACE + ELAPSED_MARGIN)
+
+
+if __name__ == '__main__':
+	unittest.main()
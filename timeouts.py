@@ -0,0 +1,204 @@
+import logging
+import math
+import socket
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Request timeouts (in seconds) by kind of request, used until a host has enough latency samples.
+# Page fetches and link checks are timed apart: a page may take much longer to generate than a HEAD.
+DEFAULT_TIMEOUTS = {'fetch': 15.0, 'check': 10.0}
+
+# Adaptive timeouts: TIMEOUT_MULTIPLIER times the host's p95 latency, never below MIN_TIMEOUT
+MIN_TIMEOUT = 2.0
+TIMEOUT_MULTIPLIER = 4.0
+LATENCY_WINDOW = 50  # Latest successful requests kept per host
+MIN_LATENCY_SAMPLES = 5
+
+# Circuit breaker: after FAILURE_THRESHOLD timeouts or connection errors in a row, requests to
+# the host fail at once for CIRCUIT_COOLDOWN seconds, then a single probe request is let through
+FAILURE_THRESHOLD = 3
+CIRCUIT_COOLDOWN = 30.0
+
+# Seconds a failed DNS lookup answers every request to the host
+DNS_FAILURE_TTL = 300.0
+
+
+class HostUnavailableError(requests.exceptions.ConnectionError):
+	"""
+	Raised instead of sending a request to a host whose name did not resolve or whose circuit is open.
+	"""
+
+
+class DeadlineExceededError(requests.exceptions.Timeout):
+	"""
+	Raised instead of sending a request whose deadline has passed.
+	"""
+
+
+def _is_dns_failure(error: BaseException) -> bool:
+	# requests wraps the resolver error a few levels deep (MaxRetryError, NameResolutionError...)
+	seen = set()
+	pending = [error]
+	while pending:
+		error = pending.pop()
+		if error is None or id(error) in seen:
+			continue
+		seen.add(id(error))
+		if isinstance(error, socket.gaierror) or type(error).__name__ == 'NameResolutionError':
+			return True
+		pending.extend(cause for cause in (error.__cause__, error.__context__, getattr(error, 'reason', None), *error.args)
+					   if isinstance(cause, BaseException))
+	return False
+
+
+class _HostTimeouts:
+	__slots__ = ('latencies', 'timeouts', 'failures', 'open_until', 'probing', 'dns_failed_until', 'circuit_opened')
+
+	def __init__(self):
+		self.latencies = {}  # Kind of request -> latest latencies
+		self.timeouts = {}  # Kind of request -> adaptive timeout, once there are enough samples
+		self.failures = 0  # Timeouts and connection errors in a row
+		self.open_until = 0.0
+		self.probing = False
+		self.dns_failed_until = 0.0
+		self.circuit_opened = 0  # Times the circuit opened, for the report
+
+
+class TimeoutPolicy:
+	"""
+	Per-host request deadlines shared by every request of the process.
+	A host's timeout follows its observed latency (TIMEOUT_MULTIPLIER times its p95), so a
+	fast host that stops answering is given up on in seconds instead of the default timeout.
+	Hosts that keep timing out are failed fast by a circuit breaker, and a failed DNS lookup
+	fails every request to the host for DNS_FAILURE_TTL seconds.
+	When disabled, requests use the default timeouts and are always sent.
+	"""
+
+	def __init__(self, enabled: bool = True):
+		self.enabled = enabled
+		self._hosts = {}
+		self._lock = threading.Lock()
+
+	def _get_host(self, url: str) -> _HostTimeouts:
+		host = (urlsplit(url).hostname or '').lower()
+		with self._lock:
+			host_timeouts = self._hosts.get(host)
+			if host_timeouts is None:
+				host_timeouts = self._hosts[host] = _HostTimeouts()
+		return host_timeouts
+
+	def get_timeout(self, url: str, kind: str, deadline: float | None = None) -> float:
+		"""
+		Returns the timeout of a `kind` request ('fetch' or 'check') to `url`: the host's
+		adaptive timeout (at most the default one), capped at what is left until `deadline`
+		(a time.monotonic() value).
+		Raises HostUnavailableError if the host is known to be unreachable, and
+		DeadlineExceededError if `deadline` has passed.
+		"""
+		default = DEFAULT_TIMEOUTS[kind]
+		if not self.enabled:
+			return default
+		host_timeouts = self._get_host(url)
+		now = time.monotonic()
+		if deadline is not None and now >= deadline:
+			# Checked first: a skipped request must not take the half-open circuit's probe
+			raise DeadlineExceededError(f"{url}: no time left before the deadline")
+		with self._lock:
+			if now < host_timeouts.dns_failed_until:
+				raise HostUnavailableError(f"{url}: the host name did not resolve")
+			if host_timeouts.failures >= FAILURE_THRESHOLD:
+				if now < host_timeouts.open_until or host_timeouts.probing:
+					raise HostUnavailableError(f"{url}: the host keeps timing out")
+				host_timeouts.probing = True  # Half-open: this request tells whether the host is back
+			timeout = min(default, host_timeouts.timeouts.get(kind, default))
+		if deadline is not None:
+			timeout = min(timeout, deadline - now)
+		return timeout
+
+	def record_success(self, url: str, kind: str, seconds: float):
+		"""
+		Records the time a `kind` request to `url` took to get its response headers.
+		"""
+		if not self.enabled:
+			return
+		host_timeouts = self._get_host(url)
+		with self._lock:
+			host_timeouts.failures = 0
+			host_timeouts.probing = False
+			latencies = host_timeouts.latencies.get(kind)
+			if latencies is None:
+				latencies = host_timeouts.latencies[kind] = deque(maxlen=LATENCY_WINDOW)
+			latencies.append(seconds)
+			if len(latencies) >= MIN_LATENCY_SAMPLES:
+				sorted_latencies = sorted(latencies)
+				p95 = sorted_latencies[math.ceil(0.95 * len(sorted_latencies)) - 1]
+				host_timeouts.timeouts[kind] = max(MIN_TIMEOUT, TIMEOUT_MULTIPLIER * p95)
+
+	def record_failure(self, url: str, error: BaseException, timeout: float | None = None):
+		"""
+		Records a request to `url` that raised `error`. DNS failures mark the host as
+		unreachable at once; timeouts and connection errors count towards its circuit breaker,
+		except timeouts of requests whose deadline left them less than MIN_TIMEOUT (`timeout`).
+		"""
+		if not self.enabled or isinstance(error, HostUnavailableError):
+			return
+		host_timeouts = self._get_host(url)
+		host = urlsplit(url).hostname
+		with self._lock:
+			was_probing, host_timeouts.probing = host_timeouts.probing, False
+			if not isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+				return
+			if timeout is not None and timeout < MIN_TIMEOUT and isinstance(error, requests.exceptions.Timeout):
+				return  # Too short to tell whether the host answers
+			dns_failed = _is_dns_failure(error)
+			if dns_failed:
+				host_timeouts.dns_failed_until = time.monotonic() + DNS_FAILURE_TTL
+			else:
+				host_timeouts.failures += 1
+				# Requests sent before the circuit opened may still fail; only the threshold or a failed probe reopens it
+				if host_timeouts.failures != FAILURE_THRESHOLD and not was_probing:
+					return
+				host_timeouts.open_until = time.monotonic() + CIRCUIT_COOLDOWN
+				host_timeouts.circuit_opened += 1
+		if dns_failed:
+			logger.info("%s did not resolve, failing its other links without a request.", host)
+		else:
+			logger.info("%s keeps failing, failing its links for %.0f seconds.", host, CIRCUIT_COOLDOWN)
+
+	def is_dns_failed(self, url: str) -> bool:
+		if not self.enabled:
+			return False
+		host_timeouts = self._get_host(url)
+		with self._lock:
+			return time.monotonic() < host_timeouts.dns_failed_until
+
+	def close_circuits(self, urls):
+		"""
+		Lets requests through to the hosts of `urls` again, e.g. for a final retry pass.
+		Circuits of other hosts, which other crawls of the process may rely on, stay as they are.
+		"""
+		hosts = [self._get_host(url) for url in urls]
+		with self._lock:
+			for host_timeouts in hosts:
+				host_timeouts.failures = 0
+				host_timeouts.open_until = 0.0
+				host_timeouts.probing = False
+
+	def stats(self) -> dict:
+		"""
+		Returns the hosts that failed DNS or had their circuit opened, for the report.
+		"""
+		now = time.monotonic()
+		with self._lock:
+			return {
+				"dns_failed_hosts": sorted(host for host, host_timeouts in self._hosts.items()
+										   if now < host_timeouts.dns_failed_until),
+				"circuit_opened_hosts": {host: host_timeouts.circuit_opened
+										 for host, host_timeouts in sorted(self._hosts.items())
+										 if host_timeouts.circuit_opened}
+			}
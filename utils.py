@@ -1,57 +1,476 @@
+import logging
 import requests
-from urllib.parse import urlparse, urlunparse, parse_qs, urlencode
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from functools import lru_cache
+from urllib.parse import urlparse, urlsplit, urlunparse, parse_qs, urlencode
+from urllib.robotparser import RobotFileParser
+from scheduler import HostScheduler, HostPausedError, THROTTLE_STATUS_CODES, DEFAULT_HOST_RATE, DEFAULT_HOST_CONCURRENCY, \
+	parse_retry_after
+from timeouts import TimeoutPolicy, DeadlineExceededError
+from redirects import RedirectCache
+from metrics import get_metrics
 
+logger = logging.getLogger(__name__)
 
-def fetch_page_content(url: str) -> str | None:
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# Default settings of the shared HTTP client
+DEFAULT_POOL_CONNECTIONS = 100  # Number of per-host connection pools kept alive
+DEFAULT_POOL_MAXSIZE = 20  # Maximum number of keep-alive connections per host
+DEFAULT_RETRIES = 2  # Retries for connection errors and 502/504 responses (429/503 go to the host scheduler)
+DEFAULT_BACKOFF_FACTOR = 0.5  # Sleep between retries: backoff_factor * 2 ** (retry - 1) seconds
+
+# Responses retried like connection errors (429/503 go to the host scheduler, which pauses the whole host)
+RETRY_STATUS_CODES = frozenset([502, 504])
+
+# Query parameters removed by normalize_url
+TRACKING_QUERY_PARAMS = frozenset(['utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content', 'gclid',
+								   'fbclid', 'ref', '_ga'])
+
+# Maximum number of URLs whose normalized form / base domain is memoized (least recently used are evicted)
+NORMALIZE_CACHE_SIZE = 100000
+
+# Default limit for concurrent link checking (per-host limits are applied by the HostScheduler)
+DEFAULT_CONCURRENCY = 20  # Maximum number of status checks in flight at once
+
+# Times a request answered with 429/503 is sent again, after the host's pause
+MAX_THROTTLE_RETRIES = 2
+
+_http_session = None
+_http_session_lock = threading.Lock()
+_http_retries = (DEFAULT_RETRIES, DEFAULT_BACKOFF_FACTOR)  # Retries of each request and their backoff factor
+
+_host_scheduler = None
+_host_scheduler_lock = threading.Lock()
+
+_timeout_policy = None
+_timeout_policy_lock = threading.Lock()
+
+# Status codes some servers return for HEAD requests even though the link works with GET
+HEAD_REJECTED_STATUS_CODES = frozenset([403, 405, 501])
+
+_get_only_hosts = set()  # Hosts known to reject HEAD requests
+_get_only_hosts_lock = threading.Lock()
+
+_redirect_cache = RedirectCache()  # Redirect hops seen by link checks, shared by all crawls
+
+
+class _TimedHTTPConnection(HTTPConnection):
+	def connect(self):
+		# DNS lookup and TCP connect
+		with get_metrics().timer('connect', self.host):
+			super().connect()
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+	def connect(self):
+		# DNS lookup, TCP connect and TLS handshake
+		with get_metrics().timer('connect', self.host):
+			super().connect()
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+	ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+	ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedHTTPAdapter(HTTPAdapter):
+	"""
+	HTTPAdapter whose new connections report their connect time to the crawl metrics.
+	"""
+
+	def init_poolmanager(self, *args, **kwargs):
+		super().init_poolmanager(*args, **kwargs)
+		self.poolmanager.pool_classes_by_scheme = {'http': _TimedHTTPConnectionPool, 'https': _TimedHTTPSConnectionPool}
+
+
+def get_hostname(url: str) -> str | None:
+	# Host label of the per-host metrics and retries
+	try:
+		return urlsplit(url).hostname
+	except ValueError:
+		return None
+
+
+def _build_http_session(pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+						pool_maxsize: int = DEFAULT_POOL_MAXSIZE) -> requests.Session:
+	# Requests are retried by _send_request, which can stop at their deadline; urllib3 would not
+	adapter = _TimedHTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0,
+								pool_block=False)
+
+	session = requests.Session()
+	session.headers['User-Agent'] = USER_AGENT
+	session.mount('http://', adapter)
+	session.mount('https://', adapter)
+	return session
+
+
+def configure_http_client(pool_connections: int = DEFAULT_POOL_CONNECTIONS, pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+						  retries: int = DEFAULT_RETRIES,
+						  backoff_factor: float = DEFAULT_BACKOFF_FACTOR) -> requests.Session:
+	"""
+	Creates the HTTP session shared by page fetching and link checking.
+	Connections are kept alive in per-host pools, so links to the same host
+	reuse TCP/TLS connections instead of handshaking for every request.
+	Requests failing with a connection error, a timeout or a 502/504 response are sent up to
+	`retries` more times, after backoff_factor * 2 ** (retry - 1) seconds.
+	"""
+	global _http_session, _http_retries
+	session = _build_http_session(pool_connections, pool_maxsize)
+	with _http_session_lock:
+		previous_session = _http_session
+		_http_session = session
+		_http_retries = (retries, backoff_factor)
+	if previous_session is not None:
+		previous_session.close()
+	return session
+
+
+def get_http_session() -> requests.Session:
+	"""
+	Returns the shared HTTP session, creating it with default settings if needed.
+	"""
+	global _http_session
+	with _http_session_lock:
+		if _http_session is None:
+			_http_session = _build_http_session()
+		return _http_session
+
+
+def configure_host_scheduler(rate: float = DEFAULT_HOST_RATE,
+							 max_concurrency: int = DEFAULT_HOST_CONCURRENCY) -> HostScheduler:
+	"""
+	Creates the per-host politeness scheduler applied to every outgoing request.
+	"""
+	global _host_scheduler
+	with _host_scheduler_lock:
+		_host_scheduler = HostScheduler(rate, max_concurrency)
+		return _host_scheduler
+
+
+def get_host_scheduler() -> HostScheduler:
+	"""
+	Returns the shared per-host scheduler, creating it with default settings if needed.
+	"""
+	global _host_scheduler
+	with _host_scheduler_lock:
+		if _host_scheduler is None:
+			_host_scheduler = HostScheduler()
+		return _host_scheduler
+
+
+def configure_timeout_policy(enabled: bool = True) -> TimeoutPolicy:
+	"""
+	Creates the per-host timeout policy (adaptive timeouts, circuit breaker, DNS failures)
+	applied to every outgoing request. With `enabled` set to False, fixed timeouts are used.
+	"""
+	global _timeout_policy
+	with _timeout_policy_lock:
+		_timeout_policy = TimeoutPolicy(enabled)
+		return _timeout_policy
+
+
+def get_timeout_policy() -> TimeoutPolicy:
+	"""
+	Returns the shared timeout policy, creating it with default settings if needed.
+	"""
+	global _timeout_policy
+	with _timeout_policy_lock:
+		if _timeout_policy is None:
+			_timeout_policy = TimeoutPolicy()
+		return _timeout_policy
+
+
+def _send_request(method: str, url: str, kind: str = 'fetch', deadline: float | None = None,
+				  **kwargs) -> requests.Response:
+	"""
+	Sends a request through the shared session once the host scheduler allows it.
+	Requests answered with 429/503 are sent again after the host's pause, unless the pause
+	outlasts `deadline` (a time.monotonic() value): the last 429/503 response is then returned as is.
+	See _send_attempts for the timeouts and retries of each request.
+	Raises timeouts.HostUnavailableError without sending anything if the host is known to be
+	unreachable, timeouts.DeadlineExceededError if `deadline` passed before anything was sent,
+	and scheduler.HostPausedError if the host is already paused beyond `deadline`.
 	"""
-	Retrieves the HTML content of a web page.
+	scheduler = get_host_scheduler()
+	throttled_response = None
+	for attempt in range(MAX_THROTTLE_RETRIES + 1):
+		try:
+			with scheduler.slot(url, deadline):
+				response = _send_attempts(method, url, kind, deadline, **kwargs)
+		except HostPausedError:
+			if throttled_response is None:
+				raise
+			return throttled_response
+		if throttled_response is not None:
+			throttled_response.close()
+		scheduler.report_response(url, response.status_code, response.headers)
+		if response.status_code not in THROTTLE_STATUS_CODES or attempt == MAX_THROTTLE_RETRIES:
+			return response
+		throttled_response = response
+
+
+def _send_attempts(method: str, url: str, kind: str, deadline: float | None, **kwargs) -> requests.Response:
+	"""
+	Sends a request, and sends it again after a connection error, a timeout or a 502/504
+	response, up to the configured number of retries (see configure_http_client).
+	Each attempt's timeout comes from the timeout policy for this `kind` of request, capped at
+	what is left until `deadline`; no attempt or backoff starts that would end past it, and
+	the last error or 502/504 response is then the result.
+	"""
+	session = get_http_session()
+	policy = get_timeout_policy()
+	retries, backoff_factor = _http_retries
+	response = error = None
+	for retry in range(retries + 1):
+		if retry:
+			retry_after = parse_retry_after(response.headers.get('Retry-After')) if response is not None else None
+			delay = retry_after if retry_after is not None else backoff_factor * 2 ** (retry - 1)
+			if policy.enabled and deadline is not None and time.monotonic() + delay >= deadline:
+				break
+			if response is not None:
+				response.close()
+			time.sleep(delay)
+		# Taken once the host's slot is free, so time spent waiting for it counts against the deadline
+		try:
+			timeout = policy.get_timeout(url, kind, deadline)
+		except DeadlineExceededError:
+			if not retry:
+				raise
+			break
+		start = time.monotonic()
+		try:
+			response = session.request(method, url, timeout=timeout, **kwargs)
+		except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+			policy.record_failure(url, e, timeout)
+			response, error = None, e
+			continue
+		except requests.exceptions.RequestException as e:
+			policy.record_failure(url, e)
+			raise
+		policy.record_success(url, kind, time.monotonic() - start)
+		if response.status_code not in RETRY_STATUS_CODES:
+			return response
+	if response is None:
+		raise error
+	return response
+
+
+def open_url_stream(url: str) -> requests.Response | None:
+	"""
+	Sends a streaming GET request, so large bodies can be read incrementally (e.g. with `iter_content`).
+	Returns the open response (to be closed by the caller), or None on errors.
+	"""
+	try:
+		response = _send_request('GET', url, stream=True)
+		if response.status_code != 200:
+			logger.info("%s returned status code %s", url, response.status_code)
+			response.close()
+			return None
+		return response
+	except requests.exceptions.RequestException as e:
+		logger.info("Error fetching %s: %s", url, e)
+		return None
+
+
+def fetch_robots_txt(url: str) -> RobotFileParser | None:
+	"""
+	Retrieves and parses the robots.txt of the site a URL belongs to.
+	Returns None if the site has no robots.txt or it cannot be fetched.
+	"""
+	parsed_url = urlsplit(url)
+	robots_url = f"{parsed_url.scheme}://{parsed_url.netloc}/robots.txt"
+	try:
+		response = _send_request('GET', robots_url)
+		if response.status_code != 200:
+			logger.debug("No robots.txt at %s (Status Code: %s)", robots_url, response.status_code)
+			return None
+		robots = RobotFileParser(robots_url)
+		robots.parse(response.text.splitlines())
+		return robots
+	except requests.exceptions.RequestException as e:
+		logger.info("Error fetching %s: %s", robots_url, e)
+		return None
+
+
+def fetch_page_content(url: str, deadline: float | None = None) -> str | None:
+	"""
+	Retrieves the HTML content of a web page, giving up at `deadline` (see _send_request).
 	Returns None on error.
 	"""
+	response = _get_page_response(url, deadline=deadline)
+	return response.text if response is not None else None
+
+
+def fetch_page_if_modified(url: str, etag: str | None = None, last_modified: str | None = None,
+						   deadline: float | None = None) -> tuple:
+	"""
+	Retrieves a web page with a conditional request based on validators from a previous fetch.
+	Returns (status_code, content, etag, last_modified). When the server answers
+	304 Not Modified, content is None; on error, status_code is 0 and content is None.
+	"""
+	headers = {}
+	if etag:
+		headers['If-None-Match'] = etag
+	if last_modified:
+		headers['If-Modified-Since'] = last_modified
+
+	response = _get_page_response(url, headers, deadline)
+	if response is None:
+		return 0, None, None, None
+	if response.status_code == 304:
+		return 304, None, etag, last_modified
+	return response.status_code, response.text, response.headers.get('ETag'), response.headers.get('Last-Modified')
+
+
+def _get_page_response(url: str, headers: dict | None = None,
+					   deadline: float | None = None) -> requests.Response | None:
+	"""
+	Sends a GET request for a web page and returns the response.
+	Returns None on error or for status codes of 400 and above.
+	"""
 	try:
-		headers = {
-			'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-		}
-		response = requests.get(url, headers=headers, timeout=15)
+		with get_metrics().timer('fetch', get_hostname(url)):
+			response = _send_request('GET', url, deadline=deadline, headers=headers)
 		response.raise_for_status()
-		print(f"DEBUG_FETCH: Successfully fetched {url}. Status Code: {response.status_code}")
-		return response.text
+		logger.debug("Successfully fetched %s. Status Code: %s", url, response.status_code)
+		return response
 	except requests.exceptions.HTTPError as e:
-		print(f"DEBUG_FETCH: HTTP Error fetching {url}: {e.response.status_code} - {e.response.reason}")
+		logger.info("HTTP Error fetching %s: %s - %s", url, e.response.status_code, e.response.reason)
 		if e.response.status_code == 403:
-			print("DEBUG_FETCH: Access Denied (403 Forbidden). The server might be blocking automated requests.")
+			logger.info("Access Denied (403 Forbidden). The server might be blocking automated requests.")
 		return None
 	except requests.exceptions.ConnectionError as e:
-		print(f"DEBUG_FETCH: Connection Error fetching {url}: {e}")
-		print("DEBUG_FETCH: Check your internet connection or if the URL is accessible.")
+		logger.info("Connection Error fetching %s: %s", url, e)
+		logger.info("Check your internet connection or if the URL is accessible.")
 		return None
 	except requests.exceptions.Timeout as e:
-		print(f"DEBUG_FETCH: Timeout Error fetching {url}: {e}")
-		print("DEBUG_FETCH: The server took too long to respond.")
+		logger.info("Timeout Error fetching %s: %s", url, e)
+		logger.info("The server took too long to respond.")
 		return None
 	except requests.exceptions.RequestException as e:
-		print(f"DEBUG_FETCH: General Request Error fetching {url}: {e}")
+		logger.info("General Request Error fetching %s: %s", url, e)
+		return None
+	except HostPausedError as e:
+		logger.info("Giving up on %s: %s", url, e)
 		return None
 	except Exception as e:
-		print(f"DEBUG_FETCH: An unexpected error occurred while fetching {url}: {e}")
+		logger.warning("An unexpected error occurred while fetching %s: %s", url, e)
 		return None
 
 
-def check_link_status(url: str) -> int:
+def check_link_status(url: str, deadline: float | None = None) -> int:
 	"""
-	Checks the HTTP status code of a link.
+	Checks the HTTP status code of a link, giving up at `deadline` (see _send_request).
+	Redirects are followed one hop at a time through the shared redirect cache (see
+	redirects.RedirectCache), so hops already seen by other links are not requested again,
+	and loops or chains of more than redirects.MAX_REDIRECTS hops end with status code 0.
+	For each hop, a HEAD request is sent first. If the server rejects HEAD (403, 405 or 501),
+	the hop is checked again with a GET for its first byte only. Hosts where that GET succeeds
+	are remembered, so later links to them skip the HEAD request.
+	Returns 0 on connection errors and timeouts, and for hosts the timeout policy knows to be unreachable.
+	A host still throttling at `deadline` gives the link its last throttling status code (429 or 503).
 	"""
+	with get_metrics().timer('status_check', get_hostname(url)):
+		return _check_link_status(url, deadline)
+
+
+def _check_link_status(url: str, deadline: float | None) -> int:
 	try:
-		headers = {
-			'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-		}
-		response = requests.head(url, headers=headers, timeout=10, allow_redirects=True)
-		return response.status_code
+		status_code, _ = _redirect_cache.resolve(url, lambda hop_url: _check_hop(hop_url, deadline))
+		return status_code
+	except HostPausedError as e:
+		return e.status_code
 	except requests.exceptions.RequestException as e:
 		return 0
 	except Exception as e:
 		return 0
 
 
+def _check_hop(url: str, deadline: float | None) -> tuple:
+	"""
+	Returns the (status code, Location header) of a URL, without following redirects.
+	"""
+	host = urlparse(url).netloc.lower()
+	if host in _get_only_hosts:
+		return _check_hop_with_get(url, deadline)
+
+	response = _send_request('HEAD', url, kind='check', deadline=deadline, allow_redirects=False)
+	if response.status_code not in HEAD_REJECTED_STATUS_CODES:
+		return response.status_code, response.headers.get('Location')
+
+	status_code, location = _check_hop_with_get(url, deadline)
+	if 0 < status_code < 400:
+		with _get_only_hosts_lock:
+			_get_only_hosts.add(host)
+		logger.info("%s rejects HEAD requests, using GET for its links from now on.", host)
+	return status_code, location
+
+
+def _check_hop_with_get(url: str, deadline: float | None) -> tuple:
+	"""
+	Returns the (status code, Location header) of a URL from a GET request limited to the
+	first byte, without following redirects.
+	The response is streamed and closed without downloading the body.
+	"""
+	with _send_request('GET', url, kind='check', deadline=deadline, headers={'Range': 'bytes=0-0'},
+					   allow_redirects=False, stream=True) as response:
+		# 206 Partial Content and 416 Range Not Satisfiable (e.g. an empty file) are answers to our
+		# Range header; the link itself works.
+		if response.status_code in (206, 416):
+			return 200, None
+		return response.status_code, response.headers.get('Location')
+
+
+def get_redirect_chain(url: str) -> dict | None:
+	"""
+	Returns the redirect chain of a link checked by check_link_status (see
+	redirects.RedirectCache.resolve), read from the redirect cache without any request.
+	Returns None if the link does not redirect or was not checked in this process.
+	"""
+	return _redirect_cache.resolve(url)[1]
+
+
+def get_redirect_cache_stats() -> dict:
+	return _redirect_cache.stats()
+
+
+def check_links_status(urls: list, concurrency: int = DEFAULT_CONCURRENCY, status_cache=None,
+					   deadline: float | None = None) -> dict:
+	"""
+	Checks the HTTP status codes of several links concurrently, giving up on each at `deadline`
+	(see _send_request).
+	At most `concurrency` checks run at once; per-host rate and concurrency limits are
+	applied by the host scheduler.
+	If a `status_cache` (see cache.LinkStatusCache) is given, URLs already checked
+	or being checked elsewhere are answered from it.
+	Returns a dictionary mapping each URL to its status code.
+	"""
+	def _check_with_deadline(url):
+		return check_link_status(url, deadline)
+
+	def _check(url):
+		if status_cache is None:
+			return _check_with_deadline(url)
+		return status_cache.get_status(url, _check_with_deadline)
+
+	unique_urls = list(dict.fromkeys(urls))
+	if not unique_urls:
+		return {}
+
+	with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(unique_urls)))) as executor:
+		return dict(zip(unique_urls, executor.map(_check, unique_urls)))
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def normalize_url(url: str) -> str:
 	"""
 	Normalizes a URL to a consistent format for comparison.
@@ -62,6 +481,7 @@ def normalize_url(url: str) -> str:
 	- Sorts remaining query parameters.
 	- Removes fragment (e.g., #section).
 	- Converts domain to lowercase.
+	Results are memoized, since the same links appear on many pages of a site.
 	"""
 	try:
 		parsed_url = urlparse(url)
@@ -81,17 +501,13 @@ def normalize_url(url: str) -> str:
 		if not path.endswith('/'):  # Always add trailing slash if not present
 			path += '/'
 
-		# 4. Query - remove common tracking parameters and sort remaining
-		query_params = parse_qs(parsed_url.query, keep_blank_values=True)
-		tracking_params = ['utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content', 'gclid', 'fbclid',
-						   'ref', '_ga']
-
-		filtered_query_params = {}
-		for key, value in query_params.items():
-			if key not in tracking_params:
-				filtered_query_params[key] = value
-
-		sorted_query = urlencode(sorted(filtered_query_params.items(), key=lambda x: x[0]), doseq=True)
+		# 4. Query - remove common tracking parameters and sort remaining (most links have no query at all)
+		sorted_query = parsed_url.query
+		if sorted_query:
+			query_params = parse_qs(sorted_query, keep_blank_values=True)
+			# Keys are unique, so sorting the (key, values) pairs sorts by key
+			sorted_query = urlencode(
+				sorted(item for item in query_params.items() if item[0] not in TRACKING_QUERY_PARAMS), doseq=True)
 
 		# 5. Fragment - remove (e.g., #section)
 		fragment = ''
@@ -101,19 +517,20 @@ def normalize_url(url: str) -> str:
 
 		return normalized_url
 	except Exception as e:
-		print(f"DEBUG_NORM_ERROR: Error normalizing URL {url}: {e}")
+		logger.warning("Error normalizing URL %s: %s", url, e)
 		return url
 
 
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def get_base_domain(url: str) -> str | None:
 	"""
 	Extracts the base domain (e.g., 'example.com' from 'www.example.com' or 'blog.example.com')
 	without relying on external libraries.
 	This is a simplified approach and might not handle all complex TLDs perfectly (e.g., co.uk).
+	Results are memoized like those of normalize_url.
 	"""
 	try:
-		parsed_url = urlparse(url)
-		netloc = parsed_url.netloc
+		netloc = urlsplit(url).netloc
 
 		if ':' in netloc:
 			netloc = netloc.split(':')[0]
@@ -126,5 +543,5 @@ def get_base_domain(url: str) -> str | None:
 
 		return base_domain if base_domain else None
 	except Exception as e:
-		print(f"DEBUG_BASE_DOMAIN_ERROR: Error extracting base domain from {url} (manual method): {e}")
+		logger.warning("Error extracting base domain from %s (manual method): %s", url, e)
 		return None
\ No newline at end of file